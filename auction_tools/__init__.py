@@ -0,0 +1,12 @@
+from .engine import Account, AuctionError, AuctionResult, Bid, Claim, IncrementalEngine
+from .hints import ListNode, OrderBook, place_bid_with_retry
+from .indexer import AuctionIndexer, AuctionState, fixture_blocks, rpc_blocks
+from .merkle import Leaf, MerkleTree, Settlement, build_settlement, leaf_hash, verify_proof
+from .snapshot import load_snapshot
+from .sorted_log import chunks, sort_log
+
+try:
+    from .vectorized import BatchResult, clear_batch
+except ImportError:
+    # NumPy is only needed for the vectorized engine
+    pass
@@ -0,0 +1,421 @@
+import heapq
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Error messages, identical to the ones in smart_contracts/types/errors.py
+BID_PRICE_TOO_LOW = "BID_PRICE_TOO_LOW"
+BID_PRICE_BELOW_MINIMUM = "BID_PRICE_BELOW_MINIMUM"
+CANNOT_CLAIM = "CANNOT_CLAIM"
+NOTHING_TO_SETTLE = "NOTHING_TO_SETTLE"
+NO_PROCEEDS = "NO_PROCEEDS"
+INVALID_HINT = "INVALID_HINT"
+NOT_AUTHORIZED = "NOT_AUTHORIZED"
+BID_NOT_IN_QUEUE = "BID_NOT_IN_QUEUE"
+PRICE_NOT_INCREASED = "PRICE_NOT_INCREASED"
+
+# linked_list_auction.py fails when a bid asks for more than the total supply and the list runs empty
+# while popping (see hints.py). BatchAuction fills such a bid with the whole supply instead.
+EMPTY_QUEUE = "EMPTY_QUEUE"
+
+# Default capacity of the outbid queue, as in smart_contracts/batch_auction.py
+OUTBID_CAPACITY = 50
+
+
+class AuctionError(Exception):
+    """Raised wherever the contract would fail the operation. `message` is the contract's error."""
+
+    def __init__(self, message: str):
+        super().__init__(message)
+        self.message = message
+
+
+@dataclass
+class Bid:
+    # price    : The price of each NFT in mutez
+    # quantity : Quantity currently held in the queue (reduced by evictions)
+    # bidder   : Wallet address of the bidder
+    # requested: Quantity asked for when the bid was placed
+    price: int
+    quantity: int
+    bidder: str
+    requested: int
+
+
+@dataclass
+class Account:
+    # balance          : Total mutez locked by the bidder
+    # winning_quantity : Quantity currently won across the bidder's bids
+    # minted           : Quantity already minted by partial claims
+    balance: int = 0
+    winning_quantity: int = 0
+    minted: int = 0
+
+
+@dataclass
+class Claim:
+    # NFTs minted by the call. Cost and refund are only paid out by the call that mints the last NFT
+    # of the account, and are zero before that.
+    quantity: int
+    cost: int
+    refund: int
+
+
+@dataclass
+class AuctionResult:
+    clearing_price: Optional[int]
+    # bid_id -> NFTs received
+    fills: Dict[int, int] = field(default_factory=dict)
+    # bidder -> (NFTs received, cost, refund), as paid out by `claim`
+    claims: Dict[str, Claim] = field(default_factory=dict)
+
+
+def heap_key(price: int, quantity: int, bid_id: int) -> Tuple[int, int, int]:
+    # Lowest price goes first, then lowest quantity, as in MinPriorityQueue.insert. Exact ties evict
+    # the most recent bid first.
+    return (price, quantity, -bid_id)
+
+
+class OutbidQueue:
+    """
+    Mirror of the bounded max heap of `smart_contracts/utilities/outbid_queue.py`. Which node is dropped
+    once the queue is full depends on the heap layout, so the sifts are the contract's ones rather than
+    `heapq`'s. Entries are heap_key tuples, the greatest one at the root.
+    """
+
+    def __init__(self, capacity: int = OUTBID_CAPACITY):
+        self.capacity = capacity
+        self.nodes: List[Tuple[int, int, int]] = []
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def push(self, node: Tuple[int, int, int]) -> Optional[Tuple[int, int, int]]:
+        """Push a node and return the node dropped to keep the queue bounded, if any."""
+        dropped = None
+        if len(self.nodes) < self.capacity:
+            self.nodes.append(node)
+        elif node > self.nodes[-1]:
+            # The last leaf makes room for a better node
+            dropped, self.nodes[-1] = self.nodes[-1], node
+        else:
+            return node
+
+        hole = len(self.nodes) - 1
+        while hole > 0 and node > self.nodes[(hole - 1) // 2]:
+            self.nodes[hole] = self.nodes[(hole - 1) // 2]
+            hole = (hole - 1) // 2
+        self.nodes[hole] = node
+        return dropped
+
+    def pop(self) -> Tuple[int, int, int]:
+        root, last = self.nodes[0], self.nodes.pop()
+        if self.nodes:
+            hole = 0
+            while 2 * hole + 1 < len(self.nodes):
+                child = 2 * hole + 1
+                if child + 1 < len(self.nodes) and self.nodes[child + 1] > self.nodes[child]:
+                    child += 1
+                if not self.nodes[child] > last:
+                    break
+                self.nodes[hole] = self.nodes[child]
+                hole = child
+            self.nodes[hole] = last
+        return root
+
+
+class IncrementalEngine:
+    """
+    Replays `BatchAuction.place_bid` / `claim` bid by bid on a `heapq` min heap.
+
+    Prices and balances are in mutez. Bidding window and tez amount checks are left to the caller,
+    since the engine has no notion of time or of the transferred amount.
+
+    Evictions are never deferred: the state matches the contract's once `process_evictions` has
+    completed the evictions beyond its per-operation budget.
+    """
+
+    def __init__(self, total_supply: int, min_bid_price: int = 0, outbid_capacity: int = OUTBID_CAPACITY):
+        self.total_supply = total_supply
+        self.min_bid_price = min_bid_price
+        self.next_bid_id = 0
+        self.bids: Dict[int, Bid] = {}
+        self.accounts: Dict[str, Account] = {}
+        # Bidders in account creation order, walked by `settle`
+        self.account_addresses: List[str] = []
+        self.settlement_cursor = 0
+        self.quantity_under_bid = 0
+        self.mint_index = 0
+        # Sale income collected by claims, until `withdraw_proceeds`
+        self.proceeds = 0
+
+        # Entries are mutable [price, quantity, -bid_id] lists so that the root can be reduced in place
+        self._queue: List[List[int]] = []
+        # Quantities cut from the queue, handed back to freed supply by `cancel_bid`
+        self.outbid = OutbidQueue(outbid_capacity)
+        # Evicted bids whose record the contract removed from `bids` when the outbid queue dropped their
+        # last node. They are kept in `self.bids` for `result`, but can no longer be promoted.
+        self.released: Set[int] = set()
+
+    @classmethod
+    def replay(cls, bids: Iterable[Tuple[str, int, int]], total_supply: int, min_bid_price: int = 0):
+        """Build an engine from (bidder, price, quantity) tuples in placement order."""
+        engine = cls(total_supply, min_bid_price)
+        for bidder, price, quantity in bids:
+            engine.place_bid(bidder, price, quantity)
+        return engine
+
+    @property
+    def clearing_price(self) -> Optional[int]:
+        return self._queue[0][0] if self._queue else None
+
+    def place_bid(self, bidder: str, price: int, quantity: int) -> int:
+        """Place a bid and return its id. Raises AuctionError where the contract would fail."""
+        if price < self.min_bid_price:
+            raise AuctionError(BID_PRICE_BELOW_MINIMUM)
+        self._check_fillable(price, quantity)
+
+        self._lock_funds(bidder, price * quantity)
+
+        unfilled = self._make_room(price, quantity)
+        bid_id = self._add_bid(bidder, price, quantity - unfilled, quantity)
+        if unfilled > 0:
+            self._push_outbid(heap_key(price, unfilled, bid_id))
+        return bid_id
+
+    def place_bids(self, bidder: str, bids: Iterable[Tuple[int, int]]) -> List[int]:
+        """
+        Mirror of `place_bids` for (price, quantity) pairs: bids at the same price are merged and
+        inserted from the highest price down. Returns the ids of the bids that entered the queue.
+        """
+        levels: Dict[int, int] = {}
+        for price, quantity in bids:
+            if price < self.min_bid_price:
+                raise AuctionError(BID_PRICE_BELOW_MINIMUM)
+            levels[price] = levels.get(price, 0) + quantity
+
+        # Bids of the list never evict each other, so the whole list fails exactly when the highest
+        # bid with a non-zero quantity would fail on its own
+        top = max((price for price, quantity in levels.items() if quantity > 0), default=None)
+        if top is None:
+            raise AuctionError(BID_PRICE_TOO_LOW)
+        self._check_fillable(top, levels[top])
+
+        self._lock_funds(bidder, sum(p * q for p, q in levels.items()))
+
+        bid_ids = []
+        for price in sorted(levels, reverse=True):
+            unfilled = self._make_room(price, levels[price])
+            if levels[price] > unfilled:
+                bid_ids.append(self._add_bid(bidder, price, levels[price] - unfilled, levels[price]))
+                if unfilled > 0:
+                    self._push_outbid(heap_key(price, unfilled, bid_ids[-1]))
+            if unfilled > 0:
+                # Every lower bid of the list would be left unfilled too
+                break
+
+        return bid_ids
+
+    def cancel_bid(self, bidder: str, bid_id: int) -> int:
+        """Mirror of `cancel_bid`: removes a bid from the queue and returns the refunded mutez."""
+        entry = self._queue_entry(bidder, bid_id)
+        self._queue.remove(entry)
+        heapq.heapify(self._queue)
+
+        refund = entry[0] * entry[1]
+        account = self.accounts[bidder]
+        account.winning_quantity -= entry[1]
+        account.balance -= refund
+        self.quantity_under_bid -= entry[1]
+        del self.bids[bid_id]
+
+        self._refill()
+        return refund
+
+    def increase_bid(self, bidder: str, bid_id: int, price: int) -> int:
+        """Mirror of `increase_bid`: raises the price of a bid and returns the mutez to top up."""
+        entry = self._queue_entry(bidder, bid_id)
+        if price <= entry[0]:
+            raise AuctionError(PRICE_NOT_INCREASED)
+
+        top_up = (price - entry[0]) * entry[1]
+        entry[0] = price
+        heapq.heapify(self._queue)
+
+        self.bids[bid_id].price = price
+        self.accounts[bidder].balance += top_up
+
+        return top_up
+
+    def _push_outbid(self, node: Tuple[int, int, int]):
+        # Mirror of `release_outbid`: a dropped node frees its bid unless the bid is still in the queue or
+        # has another node in the outbid queue
+        dropped = self.outbid.push(node)
+        if (
+            dropped is not None
+            and all(entry[2] != dropped[2] for entry in self._queue)
+            and all(other[2] != dropped[2] for other in self.outbid.nodes)
+        ):
+            self.released.add(-dropped[2])
+
+    def _refill(self):
+        """Hand the supply that is not under bid to the best outbid quantities, as `refill` does."""
+        available = self.total_supply - self.quantity_under_bid
+        while available > 0 and self.outbid:
+            price, quantity, neg_id = self.outbid.pop()
+            bid = self.bids.get(-neg_id)
+            if bid is None or -neg_id in self.released or bid.price != price:
+                # Quantities of cancelled or freed bids are dropped, and so are the ones of raised bids,
+                # which were paid for at the old price
+                continue
+
+            promoted = min(quantity, available)
+            entry = next((entry for entry in self._queue if entry[2] == neg_id), None)
+            if entry is not None:
+                entry[1] += promoted
+                bid.quantity += promoted
+                heapq.heapify(self._queue)
+            else:
+                bid.quantity = promoted
+                heapq.heappush(self._queue, list(heap_key(price, promoted, -neg_id)))
+
+            self.accounts[bid.bidder].winning_quantity += promoted
+            self.quantity_under_bid += promoted
+            available -= promoted
+            if promoted < quantity:
+                self._push_outbid(heap_key(price, quantity - promoted, -neg_id))
+
+    def _queue_entry(self, bidder: str, bid_id: int) -> List[int]:
+        if bid_id not in self.bids:
+            raise AuctionError(BID_NOT_IN_QUEUE)
+        if self.bids[bid_id].bidder != bidder:
+            raise AuctionError(NOT_AUTHORIZED)
+
+        # The contract finds the node through `heap_positions`, the engine just scans the queue
+        for entry in self._queue:
+            if -entry[2] == bid_id:
+                return entry
+        raise AuctionError(BID_NOT_IN_QUEUE)
+
+    def _lock_funds(self, bidder: str, amount: int):
+        if bidder not in self.accounts:
+            self.accounts[bidder] = Account()
+            self.account_addresses.append(bidder)
+        self.accounts[bidder].balance += amount
+
+    def _check_fillable(self, price: int, quantity: int):
+        available_for_bid = self.total_supply - self.quantity_under_bid
+        unfilled = max(quantity - available_for_bid, 0)
+
+        # Verify that at least one bid slot is fillable i.e unfilled != quantity. With no free supply,
+        # the bid has to be priced above the lowest bid.
+        if unfilled == quantity and (quantity == 0 or not self._queue or self._queue[0][0] >= price):
+            raise AuctionError(BID_PRICE_TOO_LOW)
+
+    def _make_room(self, price: int, quantity: int) -> int:
+        """Evict (or reduce) the lowest bids priced below `price`, returning the unfilled quantity."""
+        unfilled = max(quantity - (self.total_supply - self.quantity_under_bid), 0)
+
+        # The queue can only run empty if the bid asks for more than the total supply, the rest of which is
+        # left unfilled
+        while unfilled > 0 and self._queue and self._queue[0][0] < price:
+            min_entry = self._queue[0]
+            min_id = -min_entry[2]
+            if min_entry[1] <= unfilled:
+                unfilled -= min_entry[1]
+                self.quantity_under_bid -= min_entry[1]
+                heapq.heappop(self._queue)
+                self.accounts[self.bids[min_id].bidder].winning_quantity -= min_entry[1]
+                self._push_outbid(tuple(min_entry))
+            else:
+                # Reducing the root's quantity keeps the heap ordered
+                self._push_outbid(heap_key(min_entry[0], unfilled, min_id))
+                min_entry[1] -= unfilled
+                self.bids[min_id].quantity -= unfilled
+                self.accounts[self.bids[min_id].bidder].winning_quantity -= unfilled
+                self.quantity_under_bid -= unfilled
+                unfilled = 0
+
+        return unfilled
+
+    def _add_bid(self, bidder: str, price: int, filled: int, requested: int) -> int:
+        self.next_bid_id += 1
+        bid_id = self.next_bid_id
+        self.bids[bid_id] = Bid(price=price, quantity=filled, bidder=bidder, requested=requested)
+        heapq.heappush(self._queue, list(heap_key(price, filled, bid_id)))
+        self.accounts[bidder].winning_quantity += filled
+        self.quantity_under_bid += filled
+
+        return bid_id
+
+    def claim(self, bidder: str, max_mints: Optional[int] = None) -> Claim:
+        """
+        Mirror of `claim`: NFTs minted for the bidder, cost paid to the admin and refund. `None` mints
+        every remaining NFT of the account.
+        """
+        if bidder not in self.accounts:
+            raise AuctionError(CANNOT_CLAIM)
+
+        return self._settle_account(bidder, max_mints)
+
+    def settle(self, max_accounts: int, max_mints: Optional[int] = None) -> Dict[str, Claim]:
+        """
+        Mirror of `settle`: claims for up to `max_accounts` accounts in account creation order, minting
+        at most `max_mints` NFTs overall. An account left partly minted is resumed by the next call.
+        """
+        if self.settlement_cursor >= len(self.account_addresses):
+            raise AuctionError(NOTHING_TO_SETTLE)
+
+        claims = {}
+        processed = 0
+        while processed < max_accounts and self.settlement_cursor < len(self.account_addresses):
+            bidder = self.account_addresses[self.settlement_cursor]
+
+            # Accounts that have already been claimed are skipped
+            if bidder in self.accounts:
+                claims[bidder] = self._settle_account(bidder, max_mints)
+                if max_mints is not None:
+                    max_mints -= claims[bidder].quantity
+                if bidder in self.accounts:
+                    break
+
+            self.settlement_cursor += 1
+            processed += 1
+
+        return claims
+
+    def _settle_account(self, bidder: str, max_mints: Optional[int]) -> Claim:
+        account = self.accounts[bidder]
+        remaining = account.winning_quantity - account.minted
+        count = remaining if max_mints is None else min(remaining, max_mints)
+        account.minted += count
+        self.mint_index += count
+
+        if count < remaining:
+            return Claim(quantity=count, cost=0, refund=0)
+
+        del self.accounts[bidder]
+        cost = account.winning_quantity * self.clearing_price if account.winning_quantity > 0 else 0
+        self.proceeds += cost
+        return Claim(quantity=count, cost=cost, refund=account.balance - cost)
+
+    def withdraw_proceeds(self) -> int:
+        """Mirror of `withdraw_proceeds`: returns the amount transferred to the admin."""
+        if self.proceeds == 0:
+            raise AuctionError(NO_PROCEEDS)
+
+        amount, self.proceeds = self.proceeds, 0
+        return amount
+
+    def result(self) -> AuctionResult:
+        """Outcome of the auction if every bidder claimed now, without mutating the engine."""
+        live = {-entry[2] for entry in self._queue}
+        fills = {bid_id: (bid.quantity if bid_id in live else 0) for bid_id, bid in self.bids.items()}
+
+        claims = {}
+        clearing_price = self.clearing_price
+        for bidder, account in self.accounts.items():
+            quantity = account.winning_quantity
+            cost = quantity * clearing_price if quantity > 0 else 0
+            claims[bidder] = Claim(quantity=quantity, cost=cost, refund=account.balance - cost)
+
+        return AuctionResult(clearing_price=clearing_price, fills=fills, claims=claims)
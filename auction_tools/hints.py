@@ -0,0 +1,123 @@
+"""
+Insertion hints for `smart_contracts/linked_list_auction.py`.
+
+`place_bid` takes the id of the bid that the new bid must follow in the sorted list (0 for the head)
+and only checks the two neighbours. `OrderBook` rebuilds the list from a storage snapshot (the
+`bid_list` big_map along with `list_head`, `total_supply`, `quantity_under_bid` and `next_bid_id`),
+replays the evictions the bid will cause and finds its predecessor in what is left.
+
+A hint goes stale when another bid lands first, in which case the contract fails with INVALID_HINT.
+`place_bid_with_retry` then takes a fresh snapshot and tries again.
+"""
+
+from dataclasses import dataclass
+from typing import Callable, Dict, List
+
+from .engine import BID_PRICE_TOO_LOW, EMPTY_QUEUE, INVALID_HINT, AuctionError, heap_key
+from .snapshot import big_map_items
+
+# Snapshots taken before giving up on a bid
+MAX_ATTEMPTS = 3
+
+
+@dataclass
+class ListNode:
+    # price    : The price of each NFT in mutez
+    # quantity : Quantity of NFTs currently held by the bid
+    # prev     : Bid id of the previous node (0 at the head)
+    # next     : Bid id of the next node (0 at the tail)
+    price: int
+    quantity: int
+    prev: int
+    next: int
+
+
+class OrderBook:
+    def __init__(
+        self, nodes: Dict[int, ListNode], head: int, total_supply: int, quantity_under_bid: int, next_bid_id: int
+    ):
+        self.nodes = nodes
+        self.head = head
+        self.total_supply = total_supply
+        self.quantity_under_bid = quantity_under_bid
+        self.next_bid_id = next_bid_id
+
+    @classmethod
+    def from_storage(cls, storage: dict) -> "OrderBook":
+        nodes = {
+            bid_id: ListNode(int(node["price"]), int(node["quantity"]), int(node["prev"]), int(node["next"]))
+            for bid_id, node in big_map_items(storage["bid_list"])
+        }
+        return cls(
+            nodes,
+            int(storage["list_head"]),
+            int(storage["total_supply"]),
+            int(storage["quantity_under_bid"]),
+            int(storage["next_bid_id"]),
+        )
+
+    def ranked(self) -> List[int]:
+        """Bid ids from the head of the list, i.e in eviction order."""
+        bid_ids = []
+        bid_id = self.head
+        while bid_id:
+            bid_ids.append(bid_id)
+            bid_id = self.nodes[bid_id].next
+        return bid_ids
+
+    def hint(self, price: int, quantity: int) -> int:
+        """Predecessor of a new bid once it has evicted what it needs. Raises where place_bid fails."""
+        ranked = self.ranked()
+        unfilled = max(quantity - (self.total_supply - self.quantity_under_bid), 0)
+
+        # Pop whole bids from the head, the last one being possibly reduced instead
+        popped = 0
+        head_cut = 0
+        while unfilled > 0:
+            if popped == len(ranked):
+                raise AuctionError(EMPTY_QUEUE)
+            node = self.nodes[ranked[popped]]
+            if node.price >= price:
+                break
+            if node.quantity <= unfilled:
+                unfilled -= node.quantity
+                popped += 1
+            else:
+                head_cut = unfilled
+                unfilled = 0
+
+        filled = quantity - unfilled
+        if filled == 0:
+            raise AuctionError(BID_PRICE_TOO_LOW)
+
+        # The new bid follows every remaining bid that ranks before it
+        key = heap_key(price, filled, self.next_bid_id + 1)
+        hint = 0
+        for position, bid_id in enumerate(ranked[popped:]):
+            node = self.nodes[bid_id]
+            node_quantity = node.quantity - (head_cut if position == 0 else 0)
+            if heap_key(node.price, node_quantity, bid_id) > key:
+                break
+            hint = bid_id
+        return hint
+
+
+def place_bid_with_retry(
+    fetch_storage: Callable[[], dict],
+    submit: Callable[[int], object],
+    price: int,
+    quantity: int,
+    max_attempts: int = MAX_ATTEMPTS,
+):
+    """
+    Compute a hint from `fetch_storage()` and call `submit(hint)`, which sends `place_bid` and raises
+    an exception mentioning INVALID_HINT when the contract rejects the hint. Returns what `submit`
+    returns.
+    """
+    for attempt in range(max_attempts):
+        hint = OrderBook.from_storage(fetch_storage()).hint(price, quantity)
+        try:
+            return submit(hint)
+        except Exception as error:
+            if INVALID_HINT not in str(error) or attempt == max_attempts - 1:
+                raise
@@ -0,0 +1,3 @@
+from .blocks import Call, Event, contract_updates, fixture_blocks, load_blocks, rpc_blocks
+from .service import AuctionIndexer, LRUCache
+from .state import AuctionState, IndexedBid, Position, Quote
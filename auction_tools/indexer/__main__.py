@@ -0,0 +1,48 @@
+"""
+Replay recorded blocks, or follow a node, and print the indexed state of a `BatchAuction`:
+
+    $ python3 -m auction_tools.indexer KT1... --total-supply 100 --min-bid-price 100000 blocks/*.json
+    $ python3 -m auction_tools.indexer KT1... --total-supply 100 --rpc http://localhost:8732 --from 120 --to 180
+"""
+
+import argparse
+import asyncio
+import json
+
+from .blocks import fixture_blocks, rpc_blocks
+from .service import AuctionIndexer
+
+
+async def run(args):
+    indexer = AuctionIndexer(args.contract, args.total_supply, args.min_bid_price)
+    if args.rpc:
+        await indexer.follow(rpc_blocks(args.rpc, args.start_level, args.until_level))
+    else:
+        await indexer.follow(fixture_blocks(args.blocks))
+
+    state = indexer.state
+    return {
+        "level": state.level,
+        "clearing_price": await indexer.clearing_price(),
+        "quantity_under_bid": state.quantity_under_bid,
+        "levels": {str(price): state.levels[price] for price in state.prices},
+        "positions": {bidder: vars(await indexer.position_of(bidder)) for bidder in state.positions},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Index the operations of a BatchAuction")
+    parser.add_argument("contract", help="address of the BatchAuction contract")
+    parser.add_argument("blocks", nargs="*", help="JSON files of recorded RPC blocks")
+    parser.add_argument("--total-supply", type=int, required=True, help="total supply of the auction")
+    parser.add_argument("--min-bid-price", type=int, default=0, help="minimum bid price in mutez")
+    parser.add_argument("--rpc", help="RPC URL to fetch the blocks from instead of files")
+    parser.add_argument("--from", dest="start_level", type=int, default=0, help="first level fetched from the RPC")
+    parser.add_argument("--to", dest="until_level", type=int, help="last level fetched from the RPC")
+    args = parser.parse_intermixed_args(argv)
+
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+Operation streams of `BatchAuction`, as blocks in the JSON format of the Tezos RPC
+(`/chains/main/blocks/<level>`).
+
+`contract_updates` extracts the applied calls to the contract and the events it emitted, in execution
+order. Blocks come either from recorded JSON files (`fixture_blocks`) or from a node's RPC
+(`rpc_blocks`), which can be a local mock server serving recorded blocks.
+"""
+
+import asyncio
+import http.client
+import json
+import urllib.request
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Union
+
+from ..merkle import decode_address
+
+# Fields of the events of smart_contracts/types/auction.py, in layout order
+EVENT_FIELDS = {
+    "bid_placed": ("bid_id", "bidder", "price", "quantity"),
+    "bid_reduced": ("bid_id", "quantity"),
+    "bid_evicted": ("bid_id", "quantity"),
+    "bid_refilled": ("bid_id", "quantity"),
+    "bid_cancelled": ("bid_id", "quantity"),
+    "bid_increased": ("bid_id", "price"),
+    "claimed": ("bidder", "quantity", "refund"),
+}
+
+# Blocks behind the head before `rpc_blocks` indexes them, so that reorganisations are not followed
+CONFIRMATIONS = 2
+
+# Seconds between two head requests of `rpc_blocks`
+POLL_INTERVAL = 5.0
+
+# Seconds before an RPC request of `rpc_blocks` is given up
+RPC_TIMEOUT = 10.0
+
+# Seconds before `rpc_blocks` requests a block again after a network error, doubled after every failed
+# attempt up to MAX_RETRY_DELAY
+RETRY_DELAY = 1.0
+MAX_RETRY_DELAY = 60.0
+
+# Network errors of a request: connection failures, timeouts, HTTP errors (e.g a block not served yet by
+# a node behind a load balancer), truncated responses and unparsable JSON
+RPC_ERRORS = (OSError, http.client.HTTPException, ValueError)
+
+
+@dataclass
+class Call:
+    # entrypoint : Entrypoint called
+    # sender     : Immediate caller, i.e `sp.sender` in the contract
+    # amount     : Mutez sent along
+    entrypoint: str
+    sender: str
+    amount: int
+
+
+@dataclass
+class Event:
+    # tag    : Tag of the event, a key of EVENT_FIELDS
+    # fields : Payload decoded into a dict
+    tag: str
+    fields: Dict[str, Union[int, str]]
+
+
+def _comb(node: dict) -> List[dict]:
+    # Right comb pairs may be unparsed nested or flattened
+    values = []
+    while node.get("prim") == "Pair":
+        values.extend(node["args"][:-1])
+        node = node["args"][-1]
+    values.append(node)
+    return values
+
+
+def _value(node: dict) -> Union[int, str]:
+    if "int" in node:
+        return int(node["int"])
+    if "bytes" in node:
+        return decode_address(bytes.fromhex(node["bytes"]))
+    return node["string"]
+
+
+def decode_event(tag: str, payload: dict) -> Event:
+    return Event(tag, dict(zip(EVENT_FIELDS[tag], map(_value, _comb(payload)))))
+
+
+def _applied(result: Optional[dict]) -> bool:
+    return result is not None and result.get("status") == "applied"
+
+
+def contract_updates(block: dict, contract: str) -> Iterator[Union[Call, Event]]:
+    """Applied calls to `contract` and events emitted by it, in execution order."""
+    for group in block.get("operations", []):
+        for operation in group:
+            for content in operation.get("contents", []):
+                metadata = content.get("metadata", {})
+                if content.get("kind") == "transaction" and content.get("destination") == contract:
+                    if _applied(metadata.get("operation_result")):
+                        yield _call(content)
+
+                # Contracts calling the auction, and the auction's own events, show up as internal results
+                for internal in metadata.get("internal_operation_results", []):
+                    if not _applied(internal.get("result")):
+                        continue
+                    if internal["kind"] == "transaction" and internal.get("destination") == contract:
+                        yield _call(internal)
+                    elif internal["kind"] == "event" and internal["source"] == contract:
+                        if internal.get("tag") in EVENT_FIELDS:
+                            yield decode_event(internal["tag"], internal["payload"])
+
+
+def _call(transaction: dict) -> Call:
+    parameters = transaction.get("parameters", {})
+    return Call(
+        entrypoint=parameters.get("entrypoint", "default"),
+        sender=transaction["source"],
+        amount=int(transaction.get("amount", 0)),
+    )
+
+
+def load_blocks(paths: Iterable[str]) -> List[dict]:
+    """Blocks recorded in JSON files, each holding a block or a list of blocks, sorted by level."""
+    blocks = []
+    for path in paths:
+        with open(path) as f:
+            recorded = json.load(f)
+        blocks.extend(recorded if isinstance(recorded, list) else [recorded])
+    return sorted(blocks, key=lambda block: int(block["header"]["level"]))
+
+
+async def fixture_blocks(paths: Iterable[str]) -> AsyncIterator[dict]:
+    for block in load_blocks(paths):
+        yield block
+        # Let queries run between blocks, as they would between two polls of a node
+        await asyncio.sleep(0)
+
+
+def _get_json(url: str, timeout: float = RPC_TIMEOUT) -> Any:
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return json.load(response)
+
+
+async def rpc_blocks(
+    rpc_url: str,
+    start_level: int,
+    until_level: Optional[int] = None,
+    confirmations: int = CONFIRMATIONS,
+    poll_interval: float = POLL_INTERVAL,
+) -> AsyncIterator[dict]:
+    """
+    Blocks from `start_level` onwards, fetched from the RPC at `rpc_url` once `confirmations` blocks
+    deep. Stops after `until_level`, or follows the chain forever.
+
+    Network errors never end the stream: a block that can't be fetched is requested again with an
+    exponential backoff, and the stream resumes from the level after the last block yielded.
+    """
+    loop = asyncio.get_running_loop()
+    rpc_url = rpc_url.rstrip("/")
+
+    level = start_level
+    while until_level is None or level <= until_level:
+        try:
+            header = await loop.run_in_executor(None, _get_json, rpc_url + "/chains/main/blocks/head/header")
+        except RPC_ERRORS:
+            # The node may be restarting, try again with the next poll
+            header = None
+
+        head = int(header["level"]) - confirmations if header is not None else level - 1
+        retry_delay = RETRY_DELAY
+        while level <= head and (until_level is None or level <= until_level):
+            try:
+                block = await loop.run_in_executor(None, _get_json, "%s/chains/main/blocks/%d" % (rpc_url, level))
+            except RPC_ERRORS:
+                await asyncio.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, MAX_RETRY_DELAY)
+                continue
+
+            retry_delay = RETRY_DELAY
+            yield block
+            level += 1
+
+        if until_level is None or level <= until_level:
+            await asyncio.sleep(poll_interval)
@@ -0,0 +1,91 @@
+"""
+Asyncio query API over an `AuctionState` kept up to date from a block stream.
+
+Frontends query the indexer instead of the node: every query is answered from memory, and quotes are
+cached until the next block that touches the auction, as drop-day traffic asks for the same few
+(price, quantity) pairs over and over.
+"""
+
+import asyncio
+from collections import OrderedDict
+from typing import AsyncIterable, Generic, Hashable, Optional, TypeVar
+
+from .state import AuctionState, Position, Quote
+
+# Quotes kept by the cache
+QUOTE_CACHE_SIZE = 1024
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class LRUCache(Generic[K, V]):
+    """Bounded mapping evicting the least recently used entry once full."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._entries: "OrderedDict[K, V]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: K) -> Optional[V]:
+        if key not in self._entries:
+            return None
+        self._entries.move_to_end(key)
+        return self._entries[key]
+
+    def put(self, key: K, value: V):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
+class AuctionIndexer:
+    """
+    Follows the blocks of a source (`fixture_blocks` or `rpc_blocks`) with `follow`, while the query
+    coroutines answer from the state reached so far. Queries can wait for a level with `wait_for_level`.
+    """
+
+    def __init__(self, contract: str, total_supply: int, min_bid_price: int = 0, cache_size: int = QUOTE_CACHE_SIZE):
+        self.contract = contract
+        self.state = AuctionState(total_supply, min_bid_price)
+        self.quotes: LRUCache = LRUCache(cache_size)
+        self._applied = asyncio.Condition()
+
+    @property
+    def level(self) -> Optional[int]:
+        return self.state.level
+
+    def apply_block(self, block: dict):
+        # Blocks are applied without yielding to the event loop, so queries never see half a block
+        if self.state.apply_block(block, self.contract):
+            self.quotes.clear()
+
+    async def follow(self, blocks: AsyncIterable[dict]):
+        """Apply the blocks of a source as they come, until it is exhausted."""
+        async for block in blocks:
+            self.apply_block(block)
+            async with self._applied:
+                self._applied.notify_all()
+
+    async def wait_for_level(self, level: int):
+        async with self._applied:
+            await self._applied.wait_for(lambda: self.level is not None and self.level >= level)
+
+    async def clearing_price(self) -> int:
+        return self.state.clearing_price
+
+    async def quote(self, price: int, quantity: int) -> Quote:
+        quote = self.quotes.get((price, quantity))
+        if quote is None:
+            quote = self.state.quote(price, quantity)
+            self.quotes.put((price, quantity), quote)
+        return quote
+
+    async def position_of(self, bidder: str) -> Position:
+        return self.state.position_of(bidder)
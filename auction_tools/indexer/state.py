@@ -0,0 +1,163 @@
+"""
+State of `smart_contracts/batch_auction.py` rebuilt from its operation stream.
+
+The contract emits an event for every change to a bid or an account (see the Events section of
+`smart_contracts/README.md`), so the order book is maintained from the events alone, without reading
+any big_map. Only the tez locked by bidders come from the calls themselves, as the amount sent with
+`place_bid`, `place_bids` and `increase_bid`, and `finalize` freezes the clearing price.
+
+The book is kept as price levels: the views only depend on the quantity under bid at each price, not
+on the order of the bids within a level.
+"""
+
+from bisect import bisect_left, insort
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from .blocks import Call, Event, contract_updates
+
+
+@dataclass
+class IndexedBid:
+    # bidder   : Wallet address of the bidder
+    # price    : The price of each NFT in mutez
+    # quantity : Quantity currently held in the queue, 0 once evicted
+    bidder: str
+    price: int
+    quantity: int
+
+
+@dataclass
+class Position:
+    # balance          : Total mutez locked by the bidder
+    # winning_quantity : Quantity of NFTs currently won across the bidder's bids
+    balance: int = 0
+    winning_quantity: int = 0
+
+
+@dataclass
+class Quote:
+    # fillable : Quantity of NFTs place_bid would fill, 0 if it would fail
+    # amount   : Mutez to send with place_bid
+    fillable: int
+    amount: int
+
+
+class AuctionState:
+    """Mirror of the storage read by the off-chain views of `BatchAuction`, updated block by block."""
+
+    def __init__(self, total_supply: int, min_bid_price: int = 0):
+        self.total_supply = total_supply
+        self.min_bid_price = min_bid_price
+        # Level of the last block applied
+        self.level: Optional[int] = None
+
+        # Evicted bids are kept, since `bid_refilled` can bring them back into the queue
+        self.bids: Dict[int, IndexedBid] = {}
+        self.positions: Dict[str, Position] = {}
+        self.quantity_under_bid = 0
+
+        # price -> quantity under bid at the price, and the prices holding a quantity in ascending order
+        self.levels: Dict[int, int] = {}
+        self.prices: List[int] = []
+
+        self.settled = False
+        self.final_clearing_price = 0
+
+    def apply_block(self, block: dict, contract: str) -> bool:
+        """Apply the calls and events of `contract` in a block. Returns whether the state changed."""
+        level = int(block["header"]["level"])
+        if self.level is not None and level <= self.level:
+            # Blocks that were already applied are skipped, so that a source can be replayed
+            return False
+        self.level = level
+
+        changed = False
+        for update in contract_updates(block, contract):
+            if isinstance(update, Call):
+                self.apply_call(update)
+            else:
+                self.apply_event(update)
+            changed = True
+        return changed
+
+    def apply_call(self, call: Call):
+        if call.entrypoint in ("place_bid", "place_bids", "increase_bid"):
+            self.position(call.sender).balance += call.amount
+        elif call.entrypoint == "finalize":
+            # The contract snapshots the lowest bid and drops the queue
+            self.final_clearing_price = self.clearing_price
+            self.settled = True
+            self.levels = {}
+            self.prices = []
+
+    def apply_event(self, event: Event):
+        fields = event.fields
+        if event.tag == "bid_placed":
+            self.bids[fields["bid_id"]] = IndexedBid(fields["bidder"], fields["price"], 0)
+            self._set_quantity(fields["bid_id"], fields["quantity"])
+        elif event.tag in ("bid_reduced", "bid_refilled"):
+            self._set_quantity(fields["bid_id"], fields["quantity"])
+        elif event.tag == "bid_evicted":
+            self._set_quantity(fields["bid_id"], 0)
+        elif event.tag == "bid_cancelled":
+            bid = self.bids[fields["bid_id"]]
+            self.position(bid.bidder).balance -= bid.price * bid.quantity
+            self._set_quantity(fields["bid_id"], 0)
+            del self.bids[fields["bid_id"]]
+        elif event.tag == "bid_increased":
+            bid = self.bids[fields["bid_id"]]
+            self._add_level(bid.price, -bid.quantity)
+            bid.price = fields["price"]
+            self._add_level(bid.price, bid.quantity)
+        elif event.tag == "claimed":
+            self.positions.pop(fields["bidder"], None)
+
+    def position(self, bidder: str) -> Position:
+        return self.positions.setdefault(bidder, Position())
+
+    def _set_quantity(self, bid_id: int, quantity: int):
+        bid = self.bids[bid_id]
+        delta = quantity - bid.quantity
+        bid.quantity = quantity
+        self.position(bid.bidder).winning_quantity += delta
+        self.quantity_under_bid += delta
+        self._add_level(bid.price, delta)
+
+    def _add_level(self, price: int, delta: int):
+        if delta == 0:
+            return
+        if price not in self.levels:
+            self.levels[price] = 0
+            insort(self.prices, price)
+
+        self.levels[price] += delta
+        if self.levels[price] == 0:
+            del self.levels[price]
+            del self.prices[bisect_left(self.prices, price)]
+
+    @property
+    def clearing_price(self) -> int:
+        """Mirror of the `current_clearing_price` view."""
+        if self.settled or not self.prices:
+            return self.final_clearing_price
+        return self.prices[0]
+
+    def quote(self, price: int, quantity: int) -> Quote:
+        """Mirror of the `quote` view: the bid takes the free supply and the bids priced below it."""
+        needed = quantity + self.quantity_under_bid
+        reachable = self.total_supply
+        for level_price in self.prices:
+            if reachable >= needed or level_price >= price:
+                break
+            reachable += self.levels[level_price]
+
+        fillable = 0
+        if price >= self.min_bid_price and reachable > self.quantity_under_bid:
+            fillable = min(quantity, reachable - self.quantity_under_bid)
+        return Quote(fillable=fillable, amount=price * quantity)
+
+    def position_of(self, bidder: str) -> Position:
+        """Mirror of the `position_of` view, zero for unknown or settled accounts."""
+        position = self.positions.get(bidder, Position())
+        return Position(position.balance, position.winning_quantity)
@@ -0,0 +1,239 @@
+"""
+Merkle settlement of `smart_contracts/merkle_auction.py`.
+
+The bid log of the contract is cleared off-chain with `IncrementalEngine`, and every bidder gets a
+leaf committing to (address, NFTs won, refund). The leaves are hashed the way `claim` hashes them,
+`blake2b(PACK(Pair address (Pair quantity refund)))`, and parent nodes hash their two children
+concatenated in ascending order. The admin posts the root with `post_root`, and each bidder claims
+with their quantity, refund and proof.
+
+Usage, with a JSON snapshot of the contract storage:
+
+    $ python3 -m auction_tools.merkle snapshot.json > settlement.json
+
+The snapshot format is described in `snapshot.py`.
+"""
+
+import hashlib
+import json
+import sys
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .engine import AuctionError, IncrementalEngine
+from .snapshot import load_snapshot
+
+BASE58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+
+# base58check prefixes of the address kinds, and the tag of their binary encoding
+ADDRESS_PREFIXES = {
+    "tz1": (bytes.fromhex("06a19f"), b"\x00\x00"),
+    "tz2": (bytes.fromhex("06a1a1"), b"\x00\x01"),
+    "tz3": (bytes.fromhex("06a1a4"), b"\x00\x02"),
+    "KT1": (bytes.fromhex("025a79"), b"\x01"),
+}
+
+
+def blake2b(data: bytes) -> bytes:
+    return hashlib.blake2b(data, digest_size=32).digest()
+
+
+def _base58check_decode(value: str) -> bytes:
+    number = 0
+    for char in value:
+        number = number * 58 + BASE58_ALPHABET.index(char)
+    decoded = number.to_bytes((number.bit_length() + 7) // 8, "big")
+    decoded = b"\x00" * (len(value) - len(value.lstrip("1"))) + decoded
+
+    payload, checksum = decoded[:-4], decoded[-4:]
+    if hashlib.sha256(hashlib.sha256(payload).digest()).digest()[:4] != checksum:
+        raise ValueError("invalid base58 checksum: %s" % value)
+    return payload
+
+
+def _base58check_encode(payload: bytes) -> str:
+    data = payload + hashlib.sha256(hashlib.sha256(payload).digest()).digest()[:4]
+    number = int.from_bytes(data, "big")
+    encoded = ""
+    while number:
+        number, digit = divmod(number, 58)
+        encoded = BASE58_ALPHABET[digit] + encoded
+    return "1" * (len(data) - len(data.lstrip(b"\x00"))) + encoded
+
+
+def encode_address(address: str) -> bytes:
+    """Binary encoding of an address, as found in packed data."""
+    if address[:3] not in ADDRESS_PREFIXES:
+        raise ValueError("unsupported address: %s" % address)
+    prefix, tag = ADDRESS_PREFIXES[address[:3]]
+    payload = _base58check_decode(address)
+    if not payload.startswith(prefix) or len(payload) != len(prefix) + 20:
+        raise ValueError("invalid address: %s" % address)
+
+    key_hash = payload[len(prefix) :]
+    # Originated addresses are padded to the size of implicit ones
+    return tag + key_hash + (b"\x00" if address.startswith("KT1") else b"")
+
+
+def decode_address(data: bytes) -> str:
+    """Inverse of `encode_address`, for addresses unparsed as bytes by the node."""
+    for prefix, tag in ADDRESS_PREFIXES.values():
+        if data.startswith(tag) and len(data) == len(tag) + 20 + (1 if tag == b"\x01" else 0):
+            return _base58check_encode(prefix + data[len(tag) : len(tag) + 20])
+    raise ValueError("unsupported address bytes: %s" % data.hex())
+
+
+def _encode_int(value: int) -> bytes:
+    # Micheline int: zarith with the sign in the 7th bit of the first byte
+    magnitude = abs(value)
+    out = bytearray([(magnitude & 0x3F) | (0x40 if value < 0 else 0)])
+    magnitude >>= 6
+    while magnitude:
+        out[-1] |= 0x80
+        out.append(magnitude & 0x7F)
+        magnitude >>= 7
+    return b"\x00" + bytes(out)
+
+
+def pack_leaf(address: str, quantity: int, refund: int) -> bytes:
+    """PACK of the MERKLE_LEAF_TYPE record `Pair address (Pair quantity refund)`."""
+    address_bytes = encode_address(address)
+    return (
+        b"\x05\x07\x07"
+        + b"\x0a"
+        + len(address_bytes).to_bytes(4, "big")
+        + address_bytes
+        + b"\x07\x07"
+        + _encode_int(quantity)
+        + _encode_int(refund)
+    )
+
+
+def leaf_hash(address: str, quantity: int, refund: int) -> bytes:
+    return blake2b(pack_leaf(address, quantity, refund))
+
+
+def hash_pair(left: bytes, right: bytes) -> bytes:
+    return blake2b(min(left, right) + max(left, right))
+
+
+def verify_proof(leaf: bytes, proof: Iterable[bytes], root: bytes) -> bool:
+    """Mirror of MerkleProof.merkle_root_of followed by the root check of `claim`."""
+    node = leaf
+    for sibling in proof:
+        node = hash_pair(node, sibling)
+    return node == root
+
+
+class MerkleTree:
+    """
+    Binary Merkle tree over leaf hashes. A node without a sibling is promoted to the next level
+    unchanged, so its proof simply skips that level.
+    """
+
+    def __init__(self, leaves: List[bytes]):
+        if not leaves:
+            raise ValueError("a Merkle tree needs at least one leaf")
+
+        self.levels = [list(leaves)]
+        while len(self.levels[-1]) > 1:
+            level = self.levels[-1]
+            parents = [hash_pair(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+            if len(level) % 2:
+                parents.append(level[-1])
+            self.levels.append(parents)
+
+    @property
+    def root(self) -> bytes:
+        return self.levels[-1][0]
+
+    def proof(self, index: int) -> List[bytes]:
+        """Sibling hashes from the leaf at `index` up to the root."""
+        proof = []
+        for level in self.levels[:-1]:
+            sibling = index ^ 1
+            if sibling < len(level):
+                proof.append(level[sibling])
+            index //= 2
+        return proof
+
+
+@dataclass
+class Leaf:
+    # address  : Wallet address of the bidder
+    # quantity : NFTs won by the bidder
+    # refund   : Part of the deposit returned by `claim`, in mutez
+    # proof    : Sibling hashes from the leaf to the root
+    address: str
+    quantity: int
+    refund: int
+    proof: List[bytes] = field(default_factory=list)
+
+
+@dataclass
+class Settlement:
+    # Arguments of `post_root`
+    root: bytes
+    clearing_price: int
+    # bidder -> leaf, in order of first bid
+    leaves: Dict[str, Leaf] = field(default_factory=dict)
+
+
+def build_settlement(bids: Iterable[Tuple[str, int, int]], total_supply: int, min_bid_price: int = 0) -> Settlement:
+    """
+    Clear the (bidder, price, quantity) bid log, in placement order, and build the settlement tree.
+
+    Bids are replayed through `IncrementalEngine`, so the allocation is the one `BatchAuction` would
+    have reached. Bids it would have rejected are still in the log, and their deposit is refunded.
+    """
+    engine = IncrementalEngine(total_supply, min_bid_price)
+    deposits: Dict[str, int] = {}
+    for bidder, price, quantity in bids:
+        deposits[bidder] = deposits.get(bidder, 0) + price * quantity
+        try:
+            engine.place_bid(bidder, price, quantity)
+        except AuctionError:
+            pass
+
+    clearing_price: Optional[int] = engine.clearing_price
+    leaves = {}
+    for bidder, deposit in deposits.items():
+        account = engine.accounts.get(bidder)
+        quantity = account.winning_quantity if account else 0
+        leaves[bidder] = Leaf(bidder, quantity, deposit - quantity * (clearing_price or 0))
+
+    tree = MerkleTree([leaf_hash(leaf.address, leaf.quantity, leaf.refund) for leaf in leaves.values()])
+    for index, leaf in enumerate(leaves.values()):
+        leaf.proof = tree.proof(index)
+
+    return Settlement(root=tree.root, clearing_price=clearing_price or 0, leaves=leaves)
+
+
+def to_json(settlement: Settlement) -> dict:
+    return {
+        "root": "0x" + settlement.root.hex(),
+        "clearing_price": settlement.clearing_price,
+        "claims": {
+            leaf.address: {
+                "quantity": leaf.quantity,
+                "refund": leaf.refund,
+                "proof": ["0x" + node.hex() for node in leaf.proof],
+            }
+            for leaf in settlement.leaves.values()
+        },
+    }
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 1:
+        sys.exit("usage: python3 -m auction_tools.merkle <snapshot.json>")
+
+    bids, total_supply, min_bid_price = load_snapshot(argv[0])
+    settlement = build_settlement(bids, total_supply, min_bid_price)
+    json.dump(to_json(settlement), sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
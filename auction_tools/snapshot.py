@@ -0,0 +1,27 @@
+"""
+Storage snapshots of the auctions that log their bids (`merkle_auction.py`, `log_auction.py`).
+
+A snapshot is a JSON object holding `total_supply`, `min_bid_price` and `bids`, either as an object
+mapping bid ids to bids or as a list of `{"key": ..., "value": ...}` big_map entries (the format of
+TzKT's big_map keys endpoint). Bids carry `bidder`, `price` (in mutez) and `quantity`.
+"""
+
+import json
+from typing import Any, Dict, List, Tuple
+
+
+def big_map_items(value) -> List[Tuple[int, Dict[str, Any]]]:
+    """(key, value) pairs of a nat keyed big_map, sorted by key, from either snapshot format."""
+    if isinstance(value, dict):
+        value = [{"key": key, "value": item} for key, item in value.items()]
+    return sorted(((int(entry["key"]), entry["value"]) for entry in value), key=lambda item: item[0])
+
+
+def load_snapshot(path: str) -> Tuple[List[Tuple[str, int, int]], int, int]:
+    """Read a storage snapshot into its (bidder, price, quantity) bids, total supply and minimum price."""
+    with open(path) as f:
+        snapshot = json.load(f)
+
+    # Placement order is the bid id order
+    bids = [(bid["bidder"], int(bid["price"]), int(bid["quantity"])) for _, bid in big_map_items(snapshot["bids"])]
+    return bids, int(snapshot["total_supply"]), int(snapshot.get("min_bid_price", 0))
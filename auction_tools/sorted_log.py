@@ -0,0 +1,52 @@
+"""
+Sorted submission of the bid log of `smart_contracts/log_auction.py`.
+
+After bidding ends, `submit_sorted` expects every logged bid id exactly once, ranked like the bids
+priority queue ranks them (highest price first, then highest quantity, then the oldest bid), in as
+many chunks as needed to stay within the operation gas limit. The resulting allocation is the one
+of `clear_batch`.
+
+Usage, with a JSON snapshot of the contract storage (see `snapshot.py`):
+
+    $ python3 -m auction_tools.sorted_log snapshot.json --chunk-size 200 > chunks.json
+"""
+
+import argparse
+import json
+from typing import Iterable, List, Tuple
+
+from .snapshot import load_snapshot
+
+# Bid ids per `submit_sorted` call. Each bid costs one big_map read, plus one write while the supply
+# is not exhausted.
+CHUNK_SIZE = 200
+
+
+def rank_key(bid_id: int, price: int, quantity: int) -> Tuple[int, int, int]:
+    # Best bid first, the reverse of the eviction order of heap_key
+    return (-price, -quantity, bid_id)
+
+
+def sort_log(bids: Iterable[Tuple[str, int, int]]) -> List[int]:
+    """Rank the (bidder, price, quantity) bids of the log, in placement order, and return their ids."""
+    ranked = sorted((rank_key(bid_id, price, quantity) for bid_id, (_, price, quantity) in enumerate(bids, start=1)))
+    return [bid_id for _, _, bid_id in ranked]
+
+
+def chunks(bid_ids: List[int], size: int = CHUNK_SIZE) -> List[List[int]]:
+    """Split the ranked bid ids into the arguments of successive `submit_sorted` calls."""
+    return [bid_ids[i : i + size] for i in range(0, len(bid_ids), size)] or [[]]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rank the bid log of a LogAuction into submit_sorted chunks")
+    parser.add_argument("snapshot", help="JSON snapshot of the contract storage")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="bid ids per submit_sorted call")
+    args = parser.parse_args(argv)
+
+    bids, _, _ = load_snapshot(args.snapshot)
+    print(json.dumps(chunks(sort_log(bids), args.chunk_size)))
+
+
+if __name__ == "__main__":
+    main()
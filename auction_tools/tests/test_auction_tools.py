@@ -0,0 +1,358 @@
+import asyncio
+import bisect
+import glob
+import hashlib
+import http.server
+import json
+import os
+import random
+import threading
+
+import pytest
+
+from auction_tools import (
+    AuctionError,
+    AuctionIndexer,
+    AuctionState,
+    IncrementalEngine,
+    MerkleTree,
+    OrderBook,
+    build_settlement,
+    fixture_blocks,
+    leaf_hash,
+    rpc_blocks,
+    verify_proof,
+)
+from auction_tools.engine import BID_PRICE_TOO_LOW, EMPTY_QUEUE, heap_key
+from auction_tools.indexer import blocks as blocks_module
+from auction_tools.indexer.blocks import load_blocks
+from auction_tools.merkle import decode_address, encode_address
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+# Addresses of the recorded blocks
+AUCTION = "KT1P3gvz7mBE8X7977uHkWuwvpBN62zyAamN"
+PROXY = "KT1NN5VhToq6irx9aSQVA1jp6V4cwD1AHswW"
+ALICE = "tz1VbvBX7ZzXSWxKwrNXVYW8PATiA6eT58XJ"
+BOB = "tz1UzNodwdCuy77GUUQqNzuSrt7nriFizv1R"
+
+
+def tz1(seed):
+    return decode_address(b"\x00\x00" + hashlib.blake2b(str(seed).encode(), digest_size=20).digest())
+
+
+def random_book(rng, size, max_price):
+    # Distinct prices: `clear_batch` only departs from the on-chain allocation on ties at the clearing price
+    prices = rng.sample(range(1, max_price + 1), size)
+    return [(tz1(rng.randrange(size // 2 + 1)), price * 100000, rng.randint(1, 30)) for price in prices]
+
+
+##########################################
+# Incremental engine against clear_batch
+##########################################
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_incremental_engine_matches_clear_batch(seed):
+    np = pytest.importorskip("numpy")
+    from auction_tools import clear_batch
+
+    rng = random.Random(seed)
+    total_supply = rng.randint(1, 100)
+    min_bid_price = rng.randint(0, 20) * 100000
+    bids = random_book(rng, rng.randint(1, 60), 200)
+
+    engine = IncrementalEngine(total_supply, min_bid_price)
+    # Position in the book -> id given by the engine, None for the bids it rejects
+    bid_ids = []
+    for bidder, price, quantity in bids:
+        try:
+            bid_ids.append(engine.place_bid(bidder, price, quantity))
+        except AuctionError:
+            bid_ids.append(None)
+
+    result = engine.result()
+    batch = clear_batch(
+        np.array([price for _, price, _ in bids]),
+        np.array([quantity for _, _, quantity in bids]),
+        total_supply,
+        min_bid_price,
+    )
+
+    assert batch.clearing_price == result.clearing_price
+    for index, bid_id in enumerate(bid_ids):
+        assert int(batch.filled[index]) == (result.fills[bid_id] if bid_id is not None else 0)
+
+
+##########################################
+# Merkle settlement
+##########################################
+
+
+def test_address_encoding_round_trip():
+    for address in (tz1("alice"), AUCTION, PROXY):
+        assert decode_address(encode_address(address)) == address
+
+
+@pytest.mark.parametrize("size", range(1, 10))
+def test_merkle_tree_proves_every_leaf(size):
+    leaves = [hashlib.blake2b(bytes([index]), digest_size=32).digest() for index in range(size)]
+    tree = MerkleTree(leaves)
+
+    for index, leaf in enumerate(leaves):
+        assert verify_proof(leaf, tree.proof(index), tree.root)
+        if size > 1:
+            assert not verify_proof(leaves[(index + 1) % size], tree.proof(index), tree.root)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_settlement_round_trip(seed):
+    rng = random.Random(seed)
+    total_supply = rng.randint(1, 50)
+    bids = random_book(rng, rng.randint(1, 40), 100)
+    settlement = build_settlement(bids, total_supply, min_bid_price=500000)
+
+    engine = IncrementalEngine(total_supply, 500000)
+    for bidder, price, quantity in bids:
+        try:
+            engine.place_bid(bidder, price, quantity)
+        except AuctionError:
+            pass
+
+    deposits = {}
+    for bidder, price, quantity in bids:
+        deposits[bidder] = deposits.get(bidder, 0) + price * quantity
+    assert set(settlement.leaves) == set(deposits)
+    assert settlement.clearing_price == (engine.clearing_price or 0)
+
+    for bidder, leaf in settlement.leaves.items():
+        account = engine.accounts.get(bidder)
+        assert leaf.quantity == (account.winning_quantity if account else 0)
+        assert leaf.quantity * settlement.clearing_price + leaf.refund == deposits[bidder]
+
+        assert verify_proof(leaf_hash(bidder, leaf.quantity, leaf.refund), leaf.proof, settlement.root)
+        # A leaf claiming one more NFT, or a larger refund, is rejected
+        assert not verify_proof(leaf_hash(bidder, leaf.quantity + 1, leaf.refund), leaf.proof, settlement.root)
+        assert not verify_proof(leaf_hash(bidder, leaf.quantity, leaf.refund + 1), leaf.proof, settlement.root)
+
+
+##########################################
+# Insertion hints against a list model
+##########################################
+
+
+class ListModel:
+    """Sorted list of the linked list auction, as (heap_key, price, quantity, bid_id) entries."""
+
+    def __init__(self, total_supply):
+        self.total_supply = total_supply
+        self.entries = []
+        self.next_bid_id = 0
+
+    def storage(self):
+        bid_ids = [entry[3] for entry in self.entries]
+        return {
+            "bid_list": {
+                str(bid_id): {
+                    "price": str(price),
+                    "quantity": str(quantity),
+                    "prev": str(bid_ids[index - 1] if index > 0 else 0),
+                    "next": str(bid_ids[index + 1] if index + 1 < len(bid_ids) else 0),
+                }
+                for index, (_, price, quantity, bid_id) in enumerate(self.entries)
+            },
+            "list_head": str(bid_ids[0] if bid_ids else 0),
+            "total_supply": str(self.total_supply),
+            "quantity_under_bid": str(sum(entry[2] for entry in self.entries)),
+            "next_bid_id": str(self.next_bid_id),
+        }
+
+    def place_bid(self, price, quantity):
+        """Insert a bid and return the id of the bid it follows, 0 at the head."""
+        unfilled = max(quantity - (self.total_supply - sum(entry[2] for entry in self.entries)), 0)
+        while unfilled > 0:
+            if not self.entries:
+                raise AuctionError(EMPTY_QUEUE)
+            _, head_price, head_quantity, head_id = self.entries[0]
+            if head_price >= price:
+                break
+            if head_quantity <= unfilled:
+                self.entries.pop(0)
+                unfilled -= head_quantity
+            else:
+                self.entries[0] = (
+                    heap_key(head_price, head_quantity - unfilled, head_id),
+                    head_price,
+                    head_quantity - unfilled,
+                    head_id,
+                )
+                unfilled = 0
+
+        filled = quantity - unfilled
+        if filled == 0:
+            raise AuctionError(BID_PRICE_TOO_LOW)
+
+        self.next_bid_id += 1
+        entry = (heap_key(price, filled, self.next_bid_id), price, filled, self.next_bid_id)
+        position = bisect.bisect(self.entries, entry)
+        self.entries.insert(position, entry)
+        return self.entries[position - 1][3] if position > 0 else 0
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_hint_matches_list_model(seed):
+    rng = random.Random(seed)
+    model = ListModel(total_supply=rng.randint(1, 60))
+
+    for step in range(80):
+        # A narrow price range makes for ties on price, and on price and quantity. It rises along the way
+        # so that later bids keep evicting.
+        price = rng.randint(1 + step // 10, 8 + step // 10) * 100000
+        quantity = rng.randint(1, 20)
+        book = OrderBook.from_storage(model.storage())
+
+        try:
+            expected = model.place_bid(price, quantity)
+        except AuctionError as error:
+            with pytest.raises(AuctionError) as raised:
+                book.hint(price, quantity)
+            assert raised.value.message == error.message
+        else:
+            assert book.hint(price, quantity) == expected
+
+
+##########################################
+# Indexer replay
+##########################################
+
+
+def fixture_paths():
+    return sorted(glob.glob(os.path.join(FIXTURES, "blocks_*.json")), reverse=True)
+
+
+def test_load_blocks_sorts_by_level():
+    levels = [block["header"]["level"] for block in load_blocks(fixture_paths())]
+    assert levels == list(range(1001, 1009))
+
+
+def test_state_replays_recorded_blocks():
+    # Same auction as the recorded blocks: the bid through the proxy contract is placed by the proxy
+    engine = IncrementalEngine(total_supply=10, min_bid_price=100000)
+    engine.place_bid(ALICE, 1000000, 6)
+    engine.place_bid(BOB, 2000000, 6)
+    engine.place_bid(PROXY, 1500000, 5)
+    engine.increase_bid(BOB, 2, 2500000)
+    engine.cancel_bid(BOB, 2)
+
+    state = AuctionState(total_supply=10, min_bid_price=100000)
+    blocks = load_blocks(fixture_paths())
+    for block in blocks[:6]:
+        state.apply_block(block, AUCTION)
+
+    assert state.level == 1006
+    assert state.clearing_price == engine.clearing_price == 1000000
+    assert state.quantity_under_bid == engine.quantity_under_bid == 10
+    assert {price: state.levels[price] for price in state.prices} == {1000000: 5, 1500000: 5}
+    for bidder, account in engine.accounts.items():
+        position = state.position_of(bidder)
+        assert (position.balance, position.winning_quantity) == (account.balance, account.winning_quantity)
+    # The failed bid of block 1003 is not indexed
+    assert set(state.bids) == {1, 3}
+    assert state.quote(500000, 1).fillable == 0
+    assert state.quote(1200000, 3).fillable == 3
+
+    # Blocks already applied are skipped
+    assert not state.apply_block(blocks[0], AUCTION)
+    assert state.bids[1].quantity == 5
+
+    for block in blocks[6:]:
+        state.apply_block(block, AUCTION)
+    claim = engine.claim(PROXY)
+    assert state.settled
+    assert state.clearing_price == 1000000
+    assert (claim.quantity, claim.refund) == (5, 2500000)
+    assert PROXY not in state.positions
+    assert state.position_of(ALICE).winning_quantity == 5
+
+
+def test_indexer_follows_recorded_blocks():
+    async def replay():
+        indexer = AuctionIndexer(AUCTION, total_supply=10, min_bid_price=100000)
+        follow = asyncio.ensure_future(indexer.follow(fixture_blocks(fixture_paths())))
+
+        await indexer.wait_for_level(1002)
+        assert indexer.level < 1008
+        await follow
+
+        return indexer.level, await indexer.clearing_price(), await indexer.position_of(ALICE)
+
+    level, clearing_price, position = asyncio.run(replay())
+    assert (level, clearing_price) == (1008, 1000000)
+    assert (position.balance, position.winning_quantity) == (6000000, 5)
+
+
+class FlakyNode(http.server.ThreadingHTTPServer):
+    """Local RPC serving the recorded blocks, failing the first requests of some levels."""
+
+    def __init__(self, blocks, failures):
+        super().__init__(("127.0.0.1", 0), FlakyNodeHandler)
+        self.blocks = {block["header"]["level"]: block for block in blocks}
+        # level -> failures left, as (status or None to drop the connection) lists
+        self.failures = failures
+        self.requests = []
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:%d" % self.server_address[1]
+
+
+class FlakyNodeHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        node = self.server
+        path = self.path.rsplit("/", 2)
+        if path[-2:] == ["head", "header"]:
+            body = {"level": max(node.blocks) + 2}
+        else:
+            level = int(path[-1])
+            node.requests.append(level)
+            if node.failures.get(level):
+                status = node.failures[level].pop(0)
+                if status is None:
+                    # Closing without a response makes the client fail with RemoteDisconnected
+                    self.close_connection = True
+                    return
+                self.send_error(status)
+                return
+            body = node.blocks[level]
+
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_rpc_blocks_retries_network_errors(monkeypatch):
+    monkeypatch.setattr(blocks_module, "RETRY_DELAY", 0.01)
+    node = FlakyNode(load_blocks(fixture_paths()), {1003: [503, None], 1005: [None]})
+    threading.Thread(target=node.serve_forever, daemon=True).start()
+
+    async def follow():
+        indexer = AuctionIndexer(AUCTION, total_supply=10, min_bid_price=100000)
+        await indexer.follow(rpc_blocks(node.url, start_level=1001, until_level=1008, poll_interval=0))
+        return indexer
+
+    try:
+        indexer = asyncio.run(follow())
+    finally:
+        node.shutdown()
+        node.server_close()
+
+    # Every block is indexed once, in order, the failed levels being requested again
+    assert node.requests == [1001, 1002, 1003, 1003, 1003, 1004, 1005, 1005, 1006, 1007, 1008]
+    assert indexer.level == 1008
+    assert indexer.state.position_of(ALICE).winning_quantity == 5
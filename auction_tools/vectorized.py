@@ -0,0 +1,61 @@
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+
+@dataclass
+class BatchResult:
+    clearing_price: Optional[int]
+    # Per bid arrays, aligned with the input arrays
+    filled: np.ndarray
+    cost: np.ndarray
+    refund: np.ndarray
+
+
+def clear_batch(prices, quantities, total_supply, min_bid_price=0, bid_ids=None):
+    """
+    Clear a whole order book in one sort / cumsum pass.
+
+    Bids are ranked the way the heap ranks them (highest price first, then highest quantity, then the
+    oldest bid) and the first `total_supply` NFTs are allocated down that ranking, the last winning
+    bid being cut partially. Prices are in mutez and `bid_ids` defaults to the placement order.
+
+    Unlike `IncrementalEngine`, this is a one-shot clearing: `place_bid` caps a bid against the book
+    as it stood on arrival and never lets a bid evict one at the same price, so the on-chain
+    allocation can differ when bids tie at the clearing price.
+    """
+    prices = np.asarray(prices, dtype=np.int64)
+    quantities = np.asarray(quantities, dtype=np.int64)
+    if bid_ids is None:
+        bid_ids = np.arange(1, prices.size + 1, dtype=np.int64)
+    else:
+        bid_ids = np.asarray(bid_ids, dtype=np.int64)
+
+    # Bids priced below the minimum are rejected by the contract
+    candidates = np.flatnonzero((prices >= min_bid_price) & (quantities > 0))
+
+    # Every winning bid gets at least one NFT, so the winners are among the `total_supply` highest
+    # priced bids. A linear-time partition narrows the book down to those (plus the bids tied with
+    # the lowest of them) before the ranking sort.
+    if candidates.size > total_supply > 0:
+        candidate_prices = prices[candidates]
+        threshold = np.partition(candidate_prices, candidates.size - total_supply)[candidates.size - total_supply]
+        candidates = candidates[candidate_prices >= threshold]
+
+    # np.lexsort sorts by the last key first
+    order = candidates[np.lexsort((bid_ids[candidates], -quantities[candidates], -prices[candidates]))]
+    sorted_quantities = quantities[order]
+    taken_before = np.cumsum(sorted_quantities) - sorted_quantities
+    sorted_filled = np.clip(total_supply - taken_before, 0, sorted_quantities)
+
+    filled = np.zeros_like(quantities)
+    filled[order] = sorted_filled
+
+    winners = order[sorted_filled > 0]
+    clearing_price = int(prices[winners[-1]]) if winners.size else None
+
+    cost = filled * (clearing_price or 0)
+    refund = prices * quantities - cost
+
+    return BatchResult(clearing_price=clearing_price, filled=filled, cost=cost, refund=refund)
@@ -1,7 +1,10 @@
 import smartpy as sp
 
 MinPriorityQueue = sp.io.import_script_from_url("file:utilities/min_priority_queue.py")
+OutbidQueue = sp.io.import_script_from_url("file:utilities/outbid_queue.py")
 Reveal = sp.io.import_script_from_url("file:utilities/reveal.py")
+Proceeds = sp.io.import_script_from_url("file:utilities/proceeds.py")
+Claims = sp.io.import_script_from_url("file:utilities/claims.py")
 AuctionTypes = sp.io.import_script_from_url("file:types/auction.py")
 Errors = sp.io.import_script_from_url("file:types/errors.py")
 Addresses = sp.io.import_script_from_url("file:helpers/addresses.py")
@@ -24,12 +27,83 @@ BIDDING_END = sp.timestamp(10)
 # Total supply for the NFTs
 TOTAL_SUPPLY = sp.nat(100)
 
+# Number of children per node in the bids priority queue
+HEAP_ARITY = 2
+
+# Maximum number of outbid quantities kept to re-fill freed supply
+OUTBID_CAPACITY = 50
+
+# Maximum number of bids evicted (or reduced) by a single bid placement
+MAX_EVICTIONS = 40
+
+# Whether the entrypoints used after bidding (finalize, claim, settle and the admin ones) are stored as
+# lambdas in a big_map, so that bids don't pay for deserializing their code
+LAZY_ENTRY_POINTS = False
+
+# Location of the TZIP-16 metadata (compiled to michelson/batch_auction_metadata.json)
+METADATA_URL = "https://example.com/batch_auction_metadata.json"
+
+# Storage fields in right comb order. A field is read with a single GET n (and written with UPDATE n),
+# n growing with its position, so the fields read by every place_bid come first, roughly in the order
+# they are accessed, followed by the ones of claim. The rest is only touched by admin calls.
+STORAGE_FIELDS = [
+    # place_bid and place_bids
+    "bidding_start",
+    "bidding_end",
+    "min_bid_price",
+    "accounts",
+    "evicting_bid",
+    "total_supply",
+    "quantity_under_bid",
+    "bids_priority_queue",
+    "queue_size",
+    "heap_positions",
+    "bids",
+    "next_bid_id",
+    "outbid_queue",
+    "outbid_size",
+    "outbid_counts",
+    # New bidders only
+    "account_addresses",
+    "account_count",
+    # claim
+    "settled",
+    "clearing_price",
+    "nft_contract_address",
+    "mint_index",
+    "proceeds",
+    # finalize, settle and admin entrypoints
+    "winning_quantity",
+    "settlement_cursor",
+    "admin",
+    "metadata",
+]
+
+
+def right_comb(fields):
+    # Layout of a right comb, the first field being the shallowest
+    layout = fields[-1]
+    for field in reversed(fields[:-1]):
+        layout = (field, layout)
+    return layout
+
+
+# Layout of the storage record, None for SmartPy's default one (fields sorted by name in a balanced tree)
+STORAGE_LAYOUT = right_comb(STORAGE_FIELDS)
+
 ###########
 # Contract
 ###########
 
 
-class BatchAuction(sp.Contract, MinPriorityQueue.MinPriorityQueue, Reveal.Reveal):
+class BatchAuction(
+    sp.Contract,
+    MinPriorityQueue.MinPriorityQueue,
+    OutbidQueue.OutbidQueue,
+    Reveal.Reveal,
+    Proceeds.Proceeds,
+    Claims.Claims,
+):
     def __init__(
         self,
         admin=Addresses.ADMIN,
@@ -42,26 +116,61 @@ class BatchAuction(sp.Contract, MinPriorityQueue.MinPriorityQueue, Reveal.Reveal
             tkey=sp.TNat,
             tvalue=AuctionTypes.BID_TYPE,
         ),
-        bids_priority_queue=sp.map(
+        bids_priority_queue=sp.big_map(
+            l={},
+            tkey=sp.TNat,
+            tvalue=AuctionTypes.HEAP_NODE_TYPE,
+        ),
+        heap_positions=sp.big_map(
             l={},
             tkey=sp.TNat,
             tvalue=sp.TNat,
         ),
-        owner_to_bids=sp.big_map(
+        queue_size=sp.nat(0),
+        outbid_queue=sp.big_map(
             l={},
-            tkey=sp.TAddress,
-            tvalue=sp.TSet(sp.TNat),
+            tkey=sp.TNat,
+            tvalue=AuctionTypes.HEAP_NODE_TYPE,
+        ),
+        outbid_size=sp.nat(0),
+        outbid_counts=sp.big_map(
+            l={},
+            tkey=sp.TNat,
+            tvalue=sp.TNat,
         ),
-        address_to_balance=sp.big_map(
+        evicting_bid=sp.none,
+        accounts=sp.big_map(
             l={},
             tkey=sp.TAddress,
-            tvalue=sp.TMutez,
+            tvalue=AuctionTypes.ACCOUNT_TYPE,
+        ),
+        account_addresses=sp.big_map(
+            l={},
+            tkey=sp.TNat,
+            tvalue=sp.TAddress,
         ),
+        account_count=sp.nat(0),
+        settlement_cursor=sp.nat(0),
         quantity_under_bid=sp.nat(0),
         total_supply=TOTAL_SUPPLY,
         mint_index=sp.nat(0),
         nft_contract_address=Addresses.NFT,
+        clearing_price=sp.mutez(0),
+        winning_quantity=sp.nat(0),
+        settled=False,
+        proceeds=sp.mutez(0),
+        metadata=sp.utils.metadata_of_url(METADATA_URL),
+        heap_arity=HEAP_ARITY,
+        outbid_capacity=OUTBID_CAPACITY,
+        max_evictions=MAX_EVICTIONS,
+        storage_layout=STORAGE_LAYOUT,
+        lazy_entry_points=LAZY_ENTRY_POINTS,
     ):
+        # Compile time parameters, not part of the storage
+        self.heap_arity = heap_arity
+        self.outbid_capacity = outbid_capacity
+        self.max_evictions = max_evictions
+
         self.init(
             admin=admin,
             bidding_start=bidding_start,
@@ -70,20 +179,262 @@ class BatchAuction(sp.Contract, MinPriorityQueue.MinPriorityQueue, Reveal.Reveal
             next_bid_id=next_bid_id,
             bids=bids,
             bids_priority_queue=bids_priority_queue,
-            owner_to_bids=owner_to_bids,
-            address_to_balance=address_to_balance,
+            heap_positions=heap_positions,
+            queue_size=queue_size,
+            outbid_queue=outbid_queue,
+            outbid_size=outbid_size,
+            outbid_counts=outbid_counts,
+            evicting_bid=evicting_bid,
+            accounts=accounts,
+            account_addresses=account_addresses,
+            account_count=account_count,
+            settlement_cursor=settlement_cursor,
             quantity_under_bid=quantity_under_bid,
             total_supply=total_supply,
             mint_index=mint_index,
             nft_contract_address=nft_contract_address,
+            clearing_price=clearing_price,
+            winning_quantity=winning_quantity,
+            settled=settled,
+            proceeds=proceeds,
+            metadata=metadata,
             # Other possible storage items:
             # - provenance_hash (for token metadata)
             # - oracle_contract_address (for mint index randomization)
         )
 
-        # TODO: write init_type
+        # TZIP-16 metadata, exposing the off-chain views to wallets and indexers
+        self.init_metadata(
+            "batch_auction_metadata",
+            {
+                "name": "NFT Batch Auction",
+                "description": "Batch auction selling a fixed supply of NFTs at a single clearing price",
+                "interfaces": ["TZIP-016"],
+                "views": [self.current_clearing_price, self.quote, self.position_of],
+            },
+        )
+
+        storage_type = sp.TRecord(
+            admin=sp.TAddress,
+            bidding_start=sp.TTimestamp,
+            bidding_end=sp.TTimestamp,
+            min_bid_price=sp.TMutez,
+            next_bid_id=sp.TNat,
+            bids=sp.TBigMap(sp.TNat, AuctionTypes.BID_TYPE),
+            bids_priority_queue=sp.TBigMap(sp.TNat, AuctionTypes.HEAP_NODE_TYPE),
+            heap_positions=sp.TBigMap(sp.TNat, sp.TNat),
+            queue_size=sp.TNat,
+            outbid_queue=sp.TBigMap(sp.TNat, AuctionTypes.HEAP_NODE_TYPE),
+            outbid_size=sp.TNat,
+            outbid_counts=sp.TBigMap(sp.TNat, sp.TNat),
+            evicting_bid=sp.TOption(sp.TNat),
+            accounts=sp.TBigMap(sp.TAddress, AuctionTypes.ACCOUNT_TYPE),
+            account_addresses=sp.TBigMap(sp.TNat, sp.TAddress),
+            account_count=sp.TNat,
+            settlement_cursor=sp.TNat,
+            quantity_under_bid=sp.TNat,
+            total_supply=sp.TNat,
+            mint_index=sp.TNat,
+            nft_contract_address=sp.TAddress,
+            clearing_price=sp.TMutez,
+            winning_quantity=sp.TNat,
+            settled=sp.TBool,
+            proceeds=sp.TMutez,
+            metadata=sp.TBigMap(sp.TString, sp.TBytes),
+        )
+        if storage_layout is not None:
+            storage_type = storage_type.layout(storage_layout)
+        self.init_type(storage_type)
+
+        # Entrypoints become lazy unless declared with lazify=False, which the bidding ones are
+        if lazy_entry_points:
+            self.add_flag("lazy-entry-points")
 
-    @sp.entry_point
+    def emit_event(self, tag, event_type, event):
+        # Typed contract event, so that indexers can follow the auction from the operation stream
+        # without diffing the storage
+        sp.emit(sp.set_type_expr(event, event_type), tag=tag)
+
+    def lock_funds(self):
+        # Track locked funds for the sender
+        with sp.if_(~self.data.accounts.contains(sp.sender)):
+            self.data.accounts[sp.sender] = sp.record(
+                balance=sp.mutez(0),
+                winning_quantity=sp.nat(0),
+                minted=sp.nat(0),
+            )
+
+            # Index the new account for settlement
+            self.data.account_addresses[self.data.account_count] = sp.sender
+            self.data.account_count += 1
+        self.data.accounts[sp.sender].balance += sp.amount
+
+    def make_room(self, price, quantity, budget):
+        # Evicts (or reduces) the lowest bids priced below `price` until `quantity` NFTs fit in the
+        # supply, at most `budget` of them, and returns the quantity that could not be accommodated
+
+        # Supply available for bid
+        available_for_bid = sp.as_nat(self.data.total_supply - self.data.quantity_under_bid)
+
+        # Quantity that would remain unfilled due to limited supply
+        unfilled = sp.local("unfilled", sp.nat(0))
+        with sp.if_(quantity > available_for_bid):
+            unfilled.value = sp.as_nat(quantity - available_for_bid)
+
+        # If there is unfilled bid quantity, check if lowest bids can be removed and the current bid
+        # be accomodated
+        with sp.if_(unfilled.value > 0):
+            self.evict_below(price, unfilled, budget, "")
+
+        return unfilled
+
+    def evict_below(self, price, unfilled, budget, scope):
+        # Evicts (or reduces) the lowest bids priced below `price` until `unfilled` drops to zero or
+        # `budget` runs out, one unit of budget per bid. Both locals are updated in place. The cut
+        # quantities move to the outbid queue. Local names are suffixed by `scope`, since pending and new
+        # evictions are inlined in the same entrypoint.
+
+        # Allows breaking of loop
+        break_loop = sp.local("break_loop" + scope, False)
+
+        # The queue can only run empty if the bid asks for more than the total supply, the rest of which is
+        # left unfilled. Pending evictions never empty it, as the evicting bid is not priced below itself.
+        with sp.while_((unfilled.value > 0) & (budget.value > 0) & ~break_loop.value & (self.data.queue_size > 0)):
+            # lowest bid
+            min_node = self.data.bids_priority_queue[1]
+
+            with sp.if_(min_node.price >= price):
+                break_loop.value = True
+            with sp.else_():
+                budget.value = sp.as_nat(budget.value - 1)
+
+                # The bid itself is only loaded once it is going to be reduced or evicted
+                min_bid = self.data.bids[min_node.bid_id]
+                min_account = self.data.accounts[min_bid.bidder]
+
+                # If the lowest bid's quantity is less than or equals the unfilled amount,
+                # delete the entire bid
+                with sp.if_(min_node.quantity <= unfilled.value):
+                    evicted = sp.local("evicted" + scope, min_node)
+                    unfilled.value = sp.as_nat(unfilled.value - min_node.quantity)
+                    self.data.quantity_under_bid = sp.as_nat(self.data.quantity_under_bid - min_node.quantity)
+                    min_account.winning_quantity = sp.as_nat(min_account.winning_quantity - min_node.quantity)
+                    self.remove(1)
+                    self.emit_event(
+                        "bid_evicted",
+                        AuctionTypes.BID_QUANTITY_EVENT_TYPE,
+                        sp.record(bid_id=evicted.value.bid_id, quantity=evicted.value.quantity),
+                    )
+
+                    # Pushed once out of the queue, so that the bid can be freed if the outbid queue
+                    # drops it right away
+                    self.push_outbid(evicted.value)
+                # Else reduce the quantity for the lowest bid and set unfilled to zero. The root
+                # only gets lower, so the heap stays ordered.
+                with sp.else_():
+                    self.push_outbid(sp.record(price=min_node.price, quantity=unfilled.value, bid_id=min_node.bid_id))
+                    min_node.quantity = sp.as_nat(min_node.quantity - unfilled.value)
+                    min_bid.quantity = sp.as_nat(min_bid.quantity - unfilled.value)
+                    min_account.winning_quantity = sp.as_nat(min_account.winning_quantity - unfilled.value)
+                    self.data.quantity_under_bid = sp.as_nat(self.data.quantity_under_bid - unfilled.value)
+                    unfilled.value = 0
+                    self.emit_event(
+                        "bid_reduced",
+                        AuctionTypes.BID_QUANTITY_EVENT_TYPE,
+                        sp.record(bid_id=min_node.bid_id, quantity=min_node.quantity),
+                    )
+
+    def evictions_left(self, price, unfilled, budget):
+        # Whether make_room ran out of budget while bids priced below `price` were left to evict
+        left = sp.local("evictions_left", False)
+        with sp.if_((unfilled.value > 0) & (budget.value == 0)):
+            # The budget may run out as the queue empties
+            with sp.if_(self.data.queue_size > 0):
+                left.value = self.data.bids_priority_queue[1].price < price
+        return left
+
+    def process_pending(self, budget):
+        # Carries on the evictions deferred by `evicting_bid` within `budget`. Once no bid priced below
+        # it is left, the supply still overcommitted is cut from the evicting bid itself, which is what
+        # make_room would have left unfilled.
+        with sp.if_(self.data.evicting_bid.is_some()):
+            evicting_id = sp.local("evicting_id", self.data.evicting_bid.open_some())
+            evicting_price = sp.local("evicting_price", self.data.bids[evicting_id.value].price)
+            overcommitted = sp.local("overcommitted", sp.as_nat(self.data.quantity_under_bid - self.data.total_supply))
+
+            self.evict_below(evicting_price.value, overcommitted, budget, "_pending")
+
+            # The evicting bid is never evicted by its own evictions, so the queue can't be empty here
+            with sp.if_(overcommitted.value > 0):
+                with sp.if_(self.data.bids_priority_queue[1].price >= evicting_price.value):
+                    evicting_node = sp.local(
+                        "evicting_node", self.data.bids_priority_queue[self.data.heap_positions[evicting_id.value]]
+                    )
+                    evicting_node.value.quantity = sp.as_nat(evicting_node.value.quantity - overcommitted.value)
+
+                    # A smaller quantity only moves the node up the queue
+                    self.decrease_key(evicting_node.value)
+                    self.emit_event(
+                        "bid_reduced",
+                        AuctionTypes.BID_QUANTITY_EVENT_TYPE,
+                        sp.record(bid_id=evicting_id.value, quantity=evicting_node.value.quantity),
+                    )
+
+                    evicting = self.data.bids[evicting_id.value]
+                    evicting.quantity = sp.as_nat(evicting.quantity - overcommitted.value)
+                    self.data.accounts[evicting.bidder].winning_quantity = sp.as_nat(
+                        self.data.accounts[evicting.bidder].winning_quantity - overcommitted.value
+                    )
+                    self.data.quantity_under_bid = sp.as_nat(self.data.quantity_under_bid - overcommitted.value)
+
+                    # The cut part of the bid waits for freed supply
+                    self.push_outbid(
+                        sp.record(price=evicting_price.value, quantity=overcommitted.value, bid_id=evicting_id.value)
+                    )
+                    overcommitted.value = 0
+
+            with sp.if_(overcommitted.value == 0):
+                self.data.evicting_bid = sp.none
+
+    def start_evictions(self):
+        # Evictions are capped per operation, starting with the ones left pending by an earlier bid.
+        # Returns the budget left for the sender's bids.
+        budget = sp.local("budget", sp.nat(self.max_evictions))
+        self.process_pending(budget)
+
+        # Verify that no eviction is left pending, process_evictions has to be called first otherwise
+        sp.verify(self.data.evicting_bid.is_none(), Errors.EVICTIONS_PENDING)
+
+        return budget
+
+    def add_bid(self, price, quantity):
+        # Registers a bid of the sender and inserts it in the priority queue. `quantity` must fit in the
+        # remaining supply.
+        self.data.next_bid_id += 1
+        self.data.bids[self.data.next_bid_id] = sp.record(
+            quantity=quantity,
+            price=price,
+            bidder=sp.sender,
+        )
+
+        self.insert(
+            sp.record(
+                price=price,
+                quantity=quantity,
+                bid_id=self.data.next_bid_id,
+            )
+        )
+
+        self.data.accounts[sp.sender].winning_quantity += quantity
+        self.data.quantity_under_bid += quantity
+
+        self.emit_event(
+            "bid_placed",
+            AuctionTypes.BID_PLACED_EVENT_TYPE,
+            sp.record(bid_id=self.data.next_bid_id, bidder=sp.sender, price=price, quantity=quantity),
+        )
+
+    @sp.entry_point(lazify=False)
     def place_bid(self, params):
         sp.set_type(params, sp.TRecord(price=sp.TNat, quantity=sp.TNat))
 
@@ -102,107 +453,438 @@ class BatchAuction(sp.Contract, MinPriorityQueue.MinPriorityQueue, Reveal.Reveal
             Errors.INVALID_TEZ_AMOUNT,
         )
 
-        # Track locked funds for the sender
-        with sp.if_(~self.data.address_to_balance.contains(sp.sender)):
-            self.data.address_to_balance[sp.sender] = sp.mutez(0)
-        self.data.address_to_balance[sp.sender] += sp.amount
+        self.lock_funds()
 
-        # Supply available for bid
-        available_for_bid = sp.as_nat(self.data.total_supply - self.data.quantity_under_bid)
+        budget = self.start_evictions()
+        unfilled = self.make_room(sp.utils.nat_to_mutez(params.price), params.quantity, budget)
 
-        # Quantity that would remain unfilled due to limited supply
-        unfilled = sp.local("unfilled", sp.nat(0))
-        with sp.if_(params.quantity > available_for_bid):
-            unfilled.value = sp.as_nat(params.quantity - available_for_bid)
+        with sp.if_(self.evictions_left(sp.utils.nat_to_mutez(params.price), unfilled, budget).value):
+            # The rest of the evictions is deferred: the whole bid enters the queue, and the supply it
+            # overcommits is evicted by the next operations
+            self.add_bid(sp.utils.nat_to_mutez(params.price), params.quantity)
+            self.data.evicting_bid = sp.some(self.data.next_bid_id)
+        with sp.else_():
+            # Verify that at least one bid slot is fillable i.e unfilled != quantity
+            sp.verify(unfilled.value != params.quantity, Errors.BID_PRICE_TOO_LOW)
 
-        # If there is unfilled bid quantity, check if lowest bids can be removed and the current bid
-        # be accomodated
-        with sp.if_(unfilled.value > 0):
-            # Allows breaking of loop
-            break_loop = sp.local("break_loop", False)
-            with sp.while_((unfilled.value > 0) & ~break_loop.value):
-                # lowest bid
-                min_bid = self.data.bids[self.data.bids_priority_queue[1]]
-
-                with sp.if_(min_bid.price >= sp.utils.nat_to_mutez(params.price)):
-                    break_loop.value = True
+            # Quantity of the bid that enters the queue
+            filled = sp.local("filled", sp.as_nat(params.quantity - unfilled.value))
+
+            self.add_bid(sp.utils.nat_to_mutez(params.price), filled.value)
+
+            # The unfilled part of the bid waits for freed supply
+            with sp.if_(unfilled.value > 0):
+                self.push_outbid(
+                    sp.record(
+                        price=sp.utils.nat_to_mutez(params.price),
+                        quantity=unfilled.value,
+                        bid_id=self.data.next_bid_id,
+                    )
+                )
+
+    @sp.entry_point(lazify=False)
+    def place_bids(self, params):
+        sp.set_type(params, sp.TList(sp.TRecord(price=sp.TNat, quantity=sp.TNat)))
+
+        # Verify that bidding period is on-going
+        sp.verify(
+            (sp.now >= self.data.bidding_start) & (sp.now < self.data.bidding_end),
+            Errors.BIDDING_IS_NOT_ACTIVE,
+        )
+
+        # Bids at the same price are merged into a single bid. The map keeps the prices sorted.
+        levels = sp.local("levels", sp.map(tkey=sp.TNat, tvalue=sp.TNat))
+
+        # Total cost of the bids
+        cost = sp.local("cost", sp.nat(0))
+
+        with sp.for_("bid", params) as bid:
+            # Verify that the price is greater than or equals the minimum bid price
+            sp.verify(sp.utils.nat_to_mutez(bid.price) >= self.data.min_bid_price, Errors.BID_PRICE_BELOW_MINIMUM)
+
+            levels.value[bid.price] = levels.value.get(bid.price, 0) + bid.quantity
+            cost.value += bid.price * bid.quantity
+
+        # Verify that the sent tez amount is correct
+        sp.verify(sp.amount == sp.utils.nat_to_mutez(cost.value), Errors.INVALID_TEZ_AMOUNT)
+
+        self.lock_funds()
+
+        # Shared by all the bids of the list
+        budget = self.start_evictions()
+
+        # Total quantity that enters the queue
+        total_filled = sp.local("total_filled", sp.nat(0))
+
+        # The highest bids go first, so no bid of the list can evict another one. Once a bid is left
+        # partly unfilled, the lowest bid of the queue is priced at or above it and every lower bid of
+        # the list would be left unfilled too.
+        exhausted = sp.local("exhausted", False)
+        with sp.for_("level", levels.value.rev_items()) as level:
+            with sp.if_(~exhausted.value):
+                unfilled = self.make_room(sp.utils.nat_to_mutez(level.key), level.value, budget)
+                with sp.if_(unfilled.value > 0):
+                    exhausted.value = True
+
+                with sp.if_(self.evictions_left(sp.utils.nat_to_mutez(level.key), unfilled, budget).value):
+                    # The rest of the evictions is deferred, see place_bid. Lower bids of the list are
+                    # skipped.
+                    self.add_bid(sp.utils.nat_to_mutez(level.key), level.value)
+                    self.data.evicting_bid = sp.some(self.data.next_bid_id)
+                    total_filled.value += level.value
+                with sp.else_():
+                    # Quantity of the bid that enters the queue
+                    filled = sp.local("filled", sp.as_nat(level.value - unfilled.value))
+                    with sp.if_(filled.value > 0):
+                        self.add_bid(sp.utils.nat_to_mutez(level.key), filled.value)
+                        total_filled.value += filled.value
+
+                        # The unfilled part of the bid waits for freed supply
+                        with sp.if_(unfilled.value > 0):
+                            self.push_outbid(
+                                sp.record(
+                                    price=sp.utils.nat_to_mutez(level.key),
+                                    quantity=unfilled.value,
+                                    bid_id=self.data.next_bid_id,
+                                )
+                            )
+
+        # Verify that at least one bid slot is fillable
+        sp.verify(total_filled.value > 0, Errors.BID_PRICE_TOO_LOW)
+
+    @sp.entry_point(lazify=False)
+    def process_evictions(self, max_evictions):
+        sp.set_type(max_evictions, sp.TNat)
+
+        # Verify that some evictions are pending
+        sp.verify(self.data.evicting_bid.is_some(), Errors.NO_PENDING_EVICTIONS)
+
+        # Anyone can carry on the pending evictions, `max_evictions` at a time
+        budget = sp.local("budget", max_evictions)
+        self.process_pending(budget)
+
+    def refill(self):
+        # Hands the supply that is not under bid to the best outbid quantities. A quantity of a bid still
+        # in the queue is merged back into its node, otherwise the bid re-enters the queue. Quantities of
+        # cancelled or freed bids are dropped, and so are the ones of raised bids: they were paid for at
+        # the old price, and increase_bid only tops up the quantity still in the queue.
+        available = sp.local("available", sp.as_nat(self.data.total_supply - self.data.quantity_under_bid))
+        with sp.while_((available.value > 0) & (self.data.outbid_size > 0)):
+            outbid = sp.local("outbid", self.data.outbid_queue[1])
+            self.pop_outbid()
+
+            promotable = sp.local("promotable", False)
+            with sp.if_(self.data.bids.contains(outbid.value.bid_id)):
+                promotable.value = self.data.bids[outbid.value.bid_id].price == outbid.value.price
+
+            # A quantity that can't be promoted is dropped, freeing its bid if it was the last node left
+            with sp.if_(~promotable.value):
+                self.free_bid(outbid.value.bid_id)
+
+            with sp.if_(promotable.value):
+                promoted = sp.local("promoted", sp.min(outbid.value.quantity, available.value))
+                promoted_bid = self.data.bids[outbid.value.bid_id]
+
+                with sp.if_(self.data.heap_positions.contains(outbid.value.bid_id)):
+                    queued_node = sp.local(
+                        "queued_node", self.data.bids_priority_queue[self.data.heap_positions[outbid.value.bid_id]]
+                    )
+                    queued_node.value.quantity += promoted.value
+                    promoted_bid.quantity += promoted.value
+
+                    # A larger quantity only moves the node down the queue
+                    self.increase_key(queued_node.value)
+                    self.emit_event(
+                        "bid_refilled",
+                        AuctionTypes.BID_QUANTITY_EVENT_TYPE,
+                        sp.record(bid_id=outbid.value.bid_id, quantity=queued_node.value.quantity),
+                    )
                 with sp.else_():
-                    # If the lowest bid's quantity is less than or equals the unfilled amount,
-                    # delete the entire bid
-                    with sp.if_(min_bid.quantity <= unfilled.value):
-                        unfilled.value = sp.as_nat(unfilled.value - min_bid.quantity)
-                        self.data.quantity_under_bid = sp.as_nat(self.data.quantity_under_bid - min_bid.quantity)
-                        self.delete()
-                    # Else reduce the quantity for the lowest bid and set unfilled to zero
-                    with sp.else_():
-                        min_bid.quantity = sp.as_nat(min_bid.quantity - unfilled.value)
-                        self.data.quantity_under_bid = sp.as_nat(self.data.quantity_under_bid - unfilled.value)
-                        unfilled.value = 0
-
-        # Verify that at least one bid slot is fillable i.e unfilled != quantity
-        sp.verify(unfilled.value != params.quantity, Errors.BID_PRICE_TOO_LOW)
+                    promoted_bid.quantity = promoted.value
+                    self.insert(
+                        sp.record(
+                            price=outbid.value.price,
+                            quantity=promoted.value,
+                            bid_id=outbid.value.bid_id,
+                        )
+                    )
+                    self.emit_event(
+                        "bid_refilled",
+                        AuctionTypes.BID_QUANTITY_EVENT_TYPE,
+                        sp.record(bid_id=outbid.value.bid_id, quantity=promoted.value),
+                    )
+
+                self.data.accounts[promoted_bid.bidder].winning_quantity += promoted.value
+                self.data.quantity_under_bid += promoted.value
+                available.value = sp.as_nat(available.value - promoted.value)
+
+                # The rest of a partly promoted quantity goes back to the outbid queue
+                with sp.if_(promoted.value < outbid.value.quantity):
+                    self.push_outbid(
+                        sp.record(
+                            price=outbid.value.price,
+                            quantity=sp.as_nat(outbid.value.quantity - promoted.value),
+                            bid_id=outbid.value.bid_id,
+                        )
+                    )
+
+    def free_bid(self, bid_id):
+        # A bid that is out of the priority queue and has no node left in the outbid queue can no
+        # longer be promoted, so its record is removed from `bids` rather than left to burn storage
+        # until the end of the auction. Its tez are refunded from the bidder's account on claim.
+        with sp.if_(~self.data.heap_positions.contains(bid_id) & ~self.data.outbid_counts.contains(bid_id)):
+            del self.data.bids[bid_id]
+
+    def release_outbid(self, node):
+        # Called by OutbidQueue with every node it drops, once the node is uncounted. The bid's record
+        # is kept as long as one of its other nodes is still in the outbid queue.
+        self.free_bid(node.bid_id)
+
+    def queue_position(self, bid_id):
+        # Verifies that `bid_id` is a bid of the sender still in the queue, and returns its index
+        sp.verify(
+            self.data.bids.get(bid_id, message=Errors.BID_NOT_IN_QUEUE).bidder == sp.sender,
+            Errors.NOT_AUTHORIZED,
+        )
+        return sp.local("position", self.data.heap_positions.get(bid_id, message=Errors.BID_NOT_IN_QUEUE))
 
-        self.data.next_bid_id += 1
-        self.data.bids[self.data.next_bid_id] = sp.record(
-            quantity=sp.as_nat(params.quantity - unfilled.value),
-            price=sp.utils.nat_to_mutez(params.price),
-            bidder=sp.sender,
+    @sp.entry_point(lazify=False)
+    def cancel_bid(self, bid_id):
+        sp.set_type(bid_id, sp.TNat)
+
+        # Verify that bidding period is on-going
+        sp.verify(
+            (sp.now >= self.data.bidding_start) & (sp.now < self.data.bidding_end),
+            Errors.BIDDING_IS_NOT_ACTIVE,
+        )
+
+        # Verify that no eviction is pending
+        sp.verify(self.data.evicting_bid.is_none(), Errors.EVICTIONS_PENDING)
+
+        position = self.queue_position(bid_id)
+        node = sp.local("node", self.data.bids_priority_queue[position.value])
+
+        self.remove(position.value)
+
+        # Release the bid's quantity and refund the tez locked for it
+        refund = sp.local(
+            "refund",
+            sp.utils.nat_to_mutez(node.value.quantity * sp.utils.mutez_to_nat(node.value.price)),
+        )
+        account = self.data.accounts[sp.sender]
+        account.balance -= refund.value
+        account.winning_quantity = sp.as_nat(account.winning_quantity - node.value.quantity)
+        self.data.quantity_under_bid = sp.as_nat(self.data.quantity_under_bid - node.value.quantity)
+        del self.data.bids[bid_id]
+        self.emit_event(
+            "bid_cancelled",
+            AuctionTypes.BID_QUANTITY_EVENT_TYPE,
+            sp.record(bid_id=bid_id, quantity=node.value.quantity),
+        )
+
+        # The released quantity goes to the best outbid bids
+        self.refill()
+
+        sp.send(sp.sender, refund.value)
+
+    @sp.entry_point(lazify=False)
+    def increase_bid(self, params):
+        sp.set_type(params, sp.TRecord(bid_id=sp.TNat, price=sp.TNat))
+
+        # Verify that bidding period is on-going
+        sp.verify(
+            (sp.now >= self.data.bidding_start) & (sp.now < self.data.bidding_end),
+            Errors.BIDDING_IS_NOT_ACTIVE,
+        )
+
+        # Verify that no eviction is pending
+        sp.verify(self.data.evicting_bid.is_none(), Errors.EVICTIONS_PENDING)
+
+        position = self.queue_position(params.bid_id)
+        node = sp.local("node", self.data.bids_priority_queue[position.value])
+
+        # Verify that the price goes up
+        sp.verify(sp.utils.nat_to_mutez(params.price) > node.value.price, Errors.PRICE_NOT_INCREASED)
+
+        # Verify that the sent tez amount tops up the bid's quantity to the new price
+        sp.verify(
+            sp.amount
+            == sp.utils.nat_to_mutez(
+                node.value.quantity * sp.as_nat(params.price - sp.utils.mutez_to_nat(node.value.price))
+            ),
+            Errors.INVALID_TEZ_AMOUNT,
         )
 
-        self.insert(self.data.next_bid_id)
+        self.data.accounts[sp.sender].balance += sp.amount
+        self.data.bids[params.bid_id].price = sp.utils.nat_to_mutez(params.price)
 
-        self.data.quantity_under_bid += sp.as_nat(params.quantity - unfilled.value)
+        # A higher price only moves the node down the queue
+        self.increase_key(
+            sp.record(
+                price=sp.utils.nat_to_mutez(params.price),
+                quantity=node.value.quantity,
+                bid_id=params.bid_id,
+            )
+        )
+        self.emit_event(
+            "bid_increased",
+            AuctionTypes.BID_INCREASED_EVENT_TYPE,
+            sp.record(bid_id=params.bid_id, price=sp.utils.nat_to_mutez(params.price)),
+        )
 
     @sp.entry_point
-    def claim(self):
+    def finalize(self):
         # Verify that the bidding period is over
         sp.verify(sp.now >= self.data.bidding_end, Errors.BIDDING_IS_STILL_ACTIVE)
 
-        # Verify that claiming is possible for the sender
-        sp.verify(self.data.address_to_balance.contains(sp.sender), Errors.CANNOT_CLAIM)
+        # Verify that the auction has not been finalized already
+        sp.verify(~self.data.settled, Errors.AUCTION_ALREADY_SETTLED)
+
+        # Verify that the last bid is done evicting, so that the supply is not overcommitted
+        sp.verify(self.data.evicting_bid.is_none(), Errors.EVICTIONS_PENDING)
+
+        # Snapshot the clearing price i.e the lowest bid in the priority queue
+        with sp.if_(self.data.queue_size > 0):
+            self.data.clearing_price = self.data.bids_priority_queue[1].price
+
+        self.data.winning_quantity = self.data.quantity_under_bid
+        self.data.settled = True
+
+        # The priority queue is not needed anymore, dropping it releases its storage
+        self.data.bids_priority_queue = sp.big_map(tkey=sp.TNat, tvalue=AuctionTypes.HEAP_NODE_TYPE)
+        self.data.heap_positions = sp.big_map(tkey=sp.TNat, tvalue=sp.TNat)
+        self.data.queue_size = 0
+        self.data.outbid_queue = sp.big_map(tkey=sp.TNat, tvalue=AuctionTypes.HEAP_NODE_TYPE)
+        self.data.outbid_size = 0
+        self.data.outbid_counts = sp.big_map(tkey=sp.TNat, tvalue=sp.TNat)
+
+    def account_settled(self, address, quantity, refund):
+        # Hook of Claims.settle_account, called once an account is paid out
+        self.emit_event(
+            "claimed",
+            AuctionTypes.CLAIMED_EVENT_TYPE,
+            sp.record(bidder=address, quantity=quantity, refund=refund),
+        )
 
-        # NFT contract instance
-        c = sp.contract(
-            sp.TRecord(
-                token_id=sp.TNat,
-                amount=sp.TNat,
-                address=sp.TAddress,
-                metadata=sp.TMap(sp.TString, sp.TBytes),
-            ),
-            self.data.nft_contract_address,
-            "mint",
-        ).open_some(Errors.INVALID_NFT_CONTRACT)
+    @sp.entry_point
+    def claim(self, max_mints):
+        sp.set_type(max_mints, sp.TNat)
 
-        # Total cost of bought NFTs
-        cost = sp.local("cost", sp.nat(0))
+        # Verify that the auction has been finalized
+        sp.verify(self.data.settled, Errors.AUCTION_NOT_SETTLED)
+
+        # Verify that claiming is possible for the sender
+        sp.verify(self.data.accounts.contains(sp.sender), Errors.CANNOT_CLAIM)
 
-        # Clearing price based on the priority queue
-        clearing_price = self.data.bids[self.data.bids_priority_queue[1]].price
+        self.settle_account(sp.sender, self.nft_minter(), max_mints)
 
-        # Loop through winning bids and mint the NFTs
-        with sp.for_("bid_id", self.data.owner_to_bids[sp.sender].elements()) as bid_id:
-            cost.value += self.data.bids[bid_id].quantity * sp.utils.mutez_to_nat(clearing_price)
-            with sp.for_("x", sp.range(1, self.data.bids[bid_id].quantity + 1)):
-                sp.transfer(
-                    sp.record(
-                        token_id=self.data.mint_index,
-                        amount=sp.nat(1),
-                        address=sp.sender,
-                        metadata={"": sp.utils.bytes_of_string("https://example.com")},
-                    ),
-                    sp.tez(0),
-                    c,
-                )
-                self.data.mint_index += 1
+    @sp.entry_point
+    def settle(self, params):
+        sp.set_type(params, sp.TRecord(max_accounts=sp.TNat, max_mints=sp.TNat))
+
+        # Verify that the auction has been finalized
+        sp.verify(self.data.settled, Errors.AUCTION_NOT_SETTLED)
+
+        # Verify that some accounts are left to settle
+        sp.verify(self.data.settlement_cursor < self.data.account_count, Errors.NOTHING_TO_SETTLE)
+
+        minter = sp.local("minter", self.nft_minter())
+
+        # NFTs that can still be minted by this call
+        budget = sp.local("budget", params.max_mints)
+
+        # Accounts are settled in the order they were created, up to `max_accounts` of them
+        processed = sp.local("processed", sp.nat(0))
+        running = sp.local("running", True)
+        with sp.while_(running.value):
+            with sp.if_(
+                (processed.value == params.max_accounts) | (self.data.settlement_cursor == self.data.account_count)
+            ):
+                running.value = False
+            with sp.else_():
+                address = sp.local("address", self.data.account_addresses[self.data.settlement_cursor])
+
+                # Accounts that have already been claimed are skipped
+                with sp.if_(self.data.accounts.contains(address.value)):
+                    minted = self.settle_account(address.value, minter.value, budget.value)
+                    budget.value = sp.as_nat(budget.value - minted.value)
+
+                # An account left partly minted is resumed by the next call
+                with sp.if_(self.data.accounts.contains(address.value)):
+                    running.value = False
+                with sp.else_():
+                    del self.data.account_addresses[self.data.settlement_cursor]
+                    self.data.settlement_cursor += 1
+                    processed.value += 1
+
+    ##################
+    # Off-chain views
+    ##################
+
+    @sp.offchain_view(pure=True)
+    def current_clearing_price(self):
+        """Price per NFT paid by every winner if the auction was finalized now, in mutez (0 without bids)."""
+        # Until finalize, the lowest bid of the queue. While evictions are pending it is not final yet.
+        price = sp.local("price", self.data.clearing_price)
+        with sp.if_(~self.data.settled & (self.data.queue_size > 0)):
+            price.value = self.data.bids_priority_queue[1].price
+        sp.result(price.value)
+
+    @sp.offchain_view(pure=True)
+    def quote(self, params):
+        """
+        Quantity of NFTs that place_bid would currently fill for a bid of `quantity` NFTs at `price`
+        mutez each, and the amount to send with it (the whole bid is paid upfront).
+        """
+        sp.set_type(params, sp.TRecord(price=sp.TNat, quantity=sp.TNat))
 
-        # Send price cost to admin
-        sp.send(self.data.admin, sp.utils.nat_to_mutez(cost.value))
+        # The bid can take the free supply and the quantity of every bid priced below it. Those bids form
+        # a subtree hanging from the root of the heap, walked depth first until the bid is covered.
+        # Evictions left pending by `evicting_bid` come out of the same quantity, as the supply they
+        # overcommit is counted in `quantity_under_bid`.
+        needed = sp.local("needed", params.quantity + self.data.quantity_under_bid)
+        reachable = sp.local("reachable", self.data.total_supply)
+        stack = sp.local("stack", sp.list(t=sp.TNat))
+        with sp.if_(self.data.queue_size > 0):
+            stack.value.push(1)
+
+        with sp.while_((reachable.value < needed.value) & (sp.len(stack.value) > 0)):
+            with sp.match_cons(stack.value) as top:
+                stack.value = top.tail
+                node = sp.local("node", self.data.bids_priority_queue[top.head])
+                with sp.if_(node.value.price < sp.utils.nat_to_mutez(params.price)):
+                    reachable.value += node.value.quantity
+
+                    first_child = sp.local("first_child", self.first_child_index(top.head))
+                    for offset in range(self.heap_arity):
+                        with sp.if_(first_child.value + offset <= self.data.queue_size):
+                            stack.value.push(first_child.value + offset)
+
+        # Bids below the minimum price are rejected
+        fillable = sp.local("fillable", sp.nat(0))
+        with sp.if_(
+            (sp.utils.nat_to_mutez(params.price) >= self.data.min_bid_price)
+            & (reachable.value > self.data.quantity_under_bid)
+        ):
+            fillable.value = sp.min(params.quantity, sp.as_nat(reachable.value - self.data.quantity_under_bid))
+
+        sp.result(
+            sp.record(
+                fillable=fillable.value,
+                amount=sp.utils.nat_to_mutez(params.price * params.quantity),
+            )
+        )
 
-        # Return left over funds to bid owner
-        sp.send(sp.sender, self.data.address_to_balance[sp.sender] - sp.utils.nat_to_mutez(cost.value))
+    @sp.offchain_view(pure=True)
+    def position_of(self, address):
+        """Tez locked by `address` and quantity of NFTs it currently wins (zero once claimed)."""
+        sp.set_type(address, sp.TAddress)
 
-        # Delete owner from balances big map
-        del self.data.address_to_balance[sp.sender]
+        position = sp.local("position", sp.record(balance=sp.mutez(0), winning_quantity=sp.nat(0)))
+        with sp.if_(self.data.accounts.contains(address)):
+            account = self.data.accounts[address]
+            position.value = sp.record(balance=account.balance, winning_quantity=account.winning_quantity)
+        sp.result(position.value)
 
 
 if __name__ == "__main__":
@@ -232,9 +914,10 @@ if __name__ == "__main__":
                 bidder=Addresses.ALICE,
             )
         )
-        scenario.verify(auction.data.bids_priority_queue[1] == 1)
-        scenario.verify_equal(auction.data.owner_to_bids[Addresses.ALICE], sp.set([1]))
-        scenario.verify(auction.data.address_to_balance[Addresses.ALICE] == sp.tez(20))
+        scenario.verify(auction.data.bids_priority_queue[1].bid_id == 1)
+        scenario.verify(auction.data.queue_size == 1)
+        scenario.verify(auction.data.accounts[Addresses.ALICE].balance == sp.tez(20))
+        scenario.verify(auction.data.accounts[Addresses.ALICE].winning_quantity == 20)
         scenario.verify(auction.data.quantity_under_bid == 20)
 
         # When BOB places a bid for 30 NFTs at 500000 mutez each
@@ -252,13 +935,14 @@ if __name__ == "__main__":
                 bidder=Addresses.BOB,
             )
         )
-        scenario.verify_equal(auction.data.owner_to_bids[Addresses.BOB], sp.set([2]))
-        scenario.verify(auction.data.address_to_balance[Addresses.BOB] == sp.tez(15))
+        scenario.verify(auction.data.accounts[Addresses.BOB].balance == sp.tez(15))
+        scenario.verify(auction.data.accounts[Addresses.BOB].winning_quantity == 30)
         scenario.verify(auction.data.quantity_under_bid == 50)
 
         # BOB's bid takes up the minimal position in the queue
-        scenario.verify(auction.data.bids_priority_queue[1] == 2)
-        scenario.verify(auction.data.bids_priority_queue[2] == 1)
+        scenario.verify(auction.data.bids_priority_queue[1].bid_id == 2)
+        scenario.verify(auction.data.bids_priority_queue[2].bid_id == 1)
+        scenario.verify(auction.data.queue_size == 2)
 
         scenario += auction.place_bid(price=800000, quantity=30).run(
             sender=Addresses.BOB,
@@ -281,7 +965,25 @@ if __name__ == "__main__":
                     2: sp.record(price=sp.mutez(2000000), quantity=40, bidder=Addresses.BOB),
                 }
             ),
-            bids_priority_queue=sp.map({1: 1, 2: 2}),
+            bids_priority_queue=sp.big_map(
+                {
+                    1: sp.record(price=sp.mutez(1000000), quantity=50, bid_id=1),
+                    2: sp.record(price=sp.mutez(2000000), quantity=40, bid_id=2),
+                }
+            ),
+            heap_positions=sp.big_map(
+                {
+                    1: 1,
+                    2: 2,
+                }
+            ),
+            queue_size=2,
+            accounts=sp.big_map(
+                l={
+                    Addresses.ALICE: sp.record(balance=sp.tez(50), winning_quantity=50, minted=0),
+                    Addresses.BOB: sp.record(balance=sp.tez(80), winning_quantity=40, minted=0),
+                }
+            ),
             quantity_under_bid=90,
             next_bid_id=2,
         )
@@ -295,11 +997,20 @@ if __name__ == "__main__":
 
         # Then ALICE's bid drops by 10 NFTs
         scenario.verify(auction.data.bids[1].quantity == 40)
+        scenario.verify(auction.data.bids_priority_queue[1].quantity == 40)
+        scenario.verify(auction.data.accounts[Addresses.ALICE].winning_quantity == 40)
 
         # The storage is updated correctly
-        scenario.verify_equal(auction.data.bids_priority_queue, {1: 1, 2: 2, 3: 3})
+        scenario.verify(auction.data.bids_priority_queue[1].bid_id == 1)
+        scenario.verify(auction.data.bids_priority_queue[2].bid_id == 2)
+        scenario.verify(auction.data.bids_priority_queue[3].bid_id == 3)
+        scenario.verify(auction.data.queue_size == 3)
         scenario.verify(auction.data.quantity_under_bid == 100)
 
+        # The 10 NFTs cut from ALICE's bid wait in the outbid queue
+        scenario.verify(auction.data.outbid_size == 1)
+        scenario.verify(auction.data.outbid_queue[1] == sp.record(price=sp.mutez(1000000), quantity=10, bid_id=1))
+
     @sp.add_test(name="place_bid works correctly when lowest bid is completely removed")
     def test():
         scenario = sp.test_scenario()
@@ -312,11 +1023,23 @@ if __name__ == "__main__":
                     2: sp.record(price=sp.mutez(2000000), quantity=40, bidder=Addresses.BOB),
                 }
             ),
-            bids_priority_queue=sp.map({1: 1, 2: 2}),
-            owner_to_bids=sp.big_map(
+            bids_priority_queue=sp.big_map(
+                {
+                    1: sp.record(price=sp.mutez(1000000), quantity=50, bid_id=1),
+                    2: sp.record(price=sp.mutez(2000000), quantity=40, bid_id=2),
+                }
+            ),
+            heap_positions=sp.big_map(
+                {
+                    1: 1,
+                    2: 2,
+                }
+            ),
+            queue_size=2,
+            accounts=sp.big_map(
                 l={
-                    Addresses.ALICE: sp.set([1]),
-                    Addresses.BOB: sp.set([2]),
+                    Addresses.ALICE: sp.record(balance=sp.tez(50), winning_quantity=50, minted=0),
+                    Addresses.BOB: sp.record(balance=sp.tez(80), winning_quantity=40, minted=0),
                 }
             ),
             quantity_under_bid=90,
@@ -331,11 +1054,14 @@ if __name__ == "__main__":
         )
 
         # Then ALICE's bid is removed from the priority queue
-        scenario.verify(sp.len(auction.data.owner_to_bids[Addresses.ALICE]) == 0)
-        scenario.verify_equal(auction.data.bids_priority_queue, {1: 3, 2: 2})
+        scenario.verify(auction.data.accounts[Addresses.ALICE].winning_quantity == 0)
+        scenario.verify(auction.data.bids_priority_queue[1].bid_id == 3)
+        scenario.verify(auction.data.bids_priority_queue[2].bid_id == 2)
+        scenario.verify(auction.data.queue_size == 2)
 
         # JOHN's bid is only 60 NFTs (10 unfilled at the end)
         scenario.verify(auction.data.bids[3].quantity == 60)
+        scenario.verify(auction.data.accounts[Addresses.JOHN].winning_quantity == 60)
 
         # The storage is updated correctly
         scenario.verify(auction.data.quantity_under_bid == 100)
@@ -354,11 +1080,23 @@ if __name__ == "__main__":
                     2: sp.record(price=sp.mutez(2000000), quantity=40, bidder=Addresses.BOB),
                 }
             ),
-            bids_priority_queue=sp.map({1: 1, 2: 2}),
-            owner_to_bids=sp.big_map(
+            bids_priority_queue=sp.big_map(
+                {
+                    1: sp.record(price=sp.mutez(1000000), quantity=50, bid_id=1),
+                    2: sp.record(price=sp.mutez(2000000), quantity=40, bid_id=2),
+                }
+            ),
+            heap_positions=sp.big_map(
+                {
+                    1: 1,
+                    2: 2,
+                }
+            ),
+            queue_size=2,
+            accounts=sp.big_map(
                 l={
-                    Addresses.ALICE: sp.set([1]),
-                    Addresses.BOB: sp.set([2]),
+                    Addresses.ALICE: sp.record(balance=sp.tez(50), winning_quantity=50, minted=0),
+                    Addresses.BOB: sp.record(balance=sp.tez(80), winning_quantity=40, minted=0),
                 }
             ),
             quantity_under_bid=90,
@@ -373,11 +1111,14 @@ if __name__ == "__main__":
         )
 
         # Then ALICE's bid is removed from the priority queue
-        scenario.verify(sp.len(auction.data.owner_to_bids[Addresses.ALICE]) == 0)
-        scenario.verify_equal(auction.data.bids_priority_queue, {1: 2, 2: 3})
+        scenario.verify(auction.data.accounts[Addresses.ALICE].winning_quantity == 0)
+        scenario.verify(auction.data.bids_priority_queue[1].bid_id == 2)
+        scenario.verify(auction.data.bids_priority_queue[2].bid_id == 3)
+        scenario.verify(auction.data.queue_size == 2)
 
         # and BOB's bid quantity is reduced by 10
         scenario.verify(auction.data.bids[2].quantity == 30)
+        scenario.verify(auction.data.accounts[Addresses.BOB].winning_quantity == 30)
 
         # and JOHN's bid is completely filled
         scenario.verify(auction.data.bids[3].quantity == 70)
@@ -385,126 +1126,897 @@ if __name__ == "__main__":
         # The storage is updated correctly
         scenario.verify(auction.data.quantity_under_bid == 100)
 
-    ########
-    # claim
-    ########
-
-    @sp.add_test(name="claim works properly for just one winning bid")
+    @sp.add_test(name="place_bid evicts the most recent bid first when the lowest bids are tied")
     def test():
         scenario = sp.test_scenario()
 
-        dummy1 = Dummy.Dummy()
-        dummy2 = Dummy.Dummy()
-        dummy_admin = Dummy.Dummy()
-        fa2_nft = Fa2_NFT.FA2(
-            Fa2_NFT.FA2_config(),
-            sp.utils.metadata_of_url("https://example/com"),
-            Addresses.ADMIN,
+        auction = BatchAuction()
+        scenario += auction
+
+        # When ALICE and then BOB bid for 50 NFTs each at 1000000 mutez
+        scenario += auction.place_bid(price=1000000, quantity=50).run(
+            sender=Addresses.ALICE,
+            amount=sp.tez(50),
         )
-        auction = BatchAuction(
-            admin=dummy_admin.address,
-            bids=sp.big_map(
-                l={
-                    1: sp.record(quantity=40, price=sp.mutez(1000000), bidder=dummy1.address),
-                    2: sp.record(quantity=60, price=sp.mutez(1500000), bidder=dummy2.address),
-                }
-            ),
-            bids_priority_queue=sp.map(l={1: 1, 2: 2}),
-            owner_to_bids=sp.big_map(
-                l={
-                    dummy1.address: sp.set([1]),
-                    dummy2.address: sp.set([2]),
-                }
-            ),
-            address_to_balance=sp.big_map(
-                l={
-                    dummy1.address: sp.tez(40),
-                    dummy2.address: sp.tez(90),
-                }
-            ),
-            nft_contract_address=fa2_nft.address,
+        scenario += auction.place_bid(price=1000000, quantity=50).run(
+            sender=Addresses.BOB,
+            amount=sp.tez(50),
         )
 
-        auction.set_initial_balance(sp.tez(130))
+        # BOB's bid takes up the minimal position in the queue
+        scenario.verify(auction.data.bids_priority_queue[1].bid_id == 2)
+        scenario.verify(auction.data.bids_priority_queue[2].bid_id == 1)
 
-        scenario += fa2_nft
-        scenario += dummy1
-        scenario += dummy2
-        scenario += dummy_admin
-        scenario += auction
+        # When JOHN bids for 10 NFTs at 1500000 mutez
+        scenario += auction.place_bid(price=1500000, quantity=10).run(
+            sender=Addresses.JOHN,
+            amount=sp.tez(15),
+        )
 
-        # update admin of the NFT contract for minting
-        scenario += fa2_nft.set_administrator(auction.address).run(sender=Addresses.ADMIN)
+        # Then BOB's bid is cut and ALICE's bid is left untouched
+        scenario.verify(auction.data.bids[2].quantity == 40)
+        scenario.verify(auction.data.bids[1].quantity == 50)
+        scenario.verify(auction.data.accounts[Addresses.BOB].winning_quantity == 40)
+        scenario.verify(auction.data.accounts[Addresses.ALICE].winning_quantity == 50)
 
-        # NOTICE: Clearing price is 1 tez or 1000000 mutez
+    @sp.add_test(name="place_bid trims a bid over the total supply the same way whatever the eviction budget")
+    def test():
+        scenario = sp.test_scenario()
 
-        # When Dummy 1 claims their NFTs (40)
-        scenario += auction.claim().run(sender=dummy1.address, now=sp.timestamp(10))
+        # A bid over the total supply takes the whole of it from an empty queue, the rest waits for freed
+        # supply
+        auction = BatchAuction()
+        scenario += auction
+        scenario += auction.place_bid(price=1000000, quantity=101).run(sender=Addresses.ALICE, amount=sp.tez(101))
+        scenario.verify(auction.data.bids[1].quantity == 100)
+        scenario.verify(auction.data.outbid_queue[1] == sp.record(price=sp.tez(1), quantity=1, bid_id=1))
+
+        # With a budget of a single eviction and with an unlimited one
+        capped = BatchAuction(total_supply=2, max_evictions=1)
+        uncapped = BatchAuction(total_supply=2)
+        for contract in [capped, uncapped]:
+            scenario += contract
+            scenario += contract.place_bid(price=1000000, quantity=1).run(sender=Addresses.ALICE, amount=sp.tez(1))
+            scenario += contract.place_bid(price=1000000, quantity=1).run(sender=Addresses.ALICE, amount=sp.tez(1))
+
+            # When BOB bids for twice the total supply
+            scenario += contract.place_bid(price=2000000, quantity=4).run(sender=Addresses.BOB, amount=sp.tez(8))
+
+        # The capped bid enters the queue whole and defers the second eviction
+        scenario.verify(capped.data.evicting_bid == sp.some(3))
+        scenario += capped.process_evictions(1)
+        scenario.verify(capped.data.evicting_bid.is_none())
+
+        # Either way, both lower bids are evicted and BOB's bid is trimmed to the total supply
+        for contract in [capped, uncapped]:
+            scenario.verify(contract.data.queue_size == 1)
+            scenario.verify(contract.data.bids[3].quantity == 2)
+            scenario.verify(contract.data.quantity_under_bid == 2)
+            scenario.verify(contract.data.accounts[Addresses.BOB].winning_quantity == 2)
+            scenario.verify(contract.data.accounts[Addresses.ALICE].winning_quantity == 0)
+            scenario.verify(contract.data.outbid_size == 3)
+            scenario.verify(contract.data.outbid_queue[1] == sp.record(price=sp.tez(2), quantity=2, bid_id=3))
+
+    @sp.add_test(name="place_bid sifts the evicted bid's replacement down to the bottom of the heap")
+    def test():
+        scenario = sp.test_scenario()
 
-        # Dummy admin's balance equals the cost i.e 40 tez
-        scenario.verify(dummy_admin.balance == sp.tez(40))
+        # Expected bid ids at each queue index, once the lowest bid is evicted and a new bid is inserted
+        expected_queues = {
+            2: [2, 4, 3, 7, 5, 6, 8],
+            4: [2, 6, 3, 4, 5, 7, 8],
+        }
+
+        for heap_arity, expected_queue in expected_queues.items():
+            # Seven single-NFT bids from 1 to 7 tez fill the supply, in a sorted (hence valid) heap
+            auction = BatchAuction(
+                bids=sp.big_map(
+                    {i: sp.record(price=sp.tez(i), quantity=1, bidder=Addresses.ALICE) for i in range(1, 8)}
+                ),
+                bids_priority_queue=sp.big_map(
+                    {i: sp.record(price=sp.tez(i), quantity=1, bid_id=i) for i in range(1, 8)}
+                ),
+                heap_positions=sp.big_map({i: i for i in range(1, 8)}),
+                queue_size=7,
+                accounts=sp.big_map(
+                    l={
+                        Addresses.ALICE: sp.record(balance=sp.tez(28), winning_quantity=7, minted=0),
+                    }
+                ),
+                quantity_under_bid=7,
+                total_supply=7,
+                next_bid_id=7,
+                heap_arity=heap_arity,
+            )
+            scenario += auction
 
-        # The auction contract's balance is reduced by 40 tez
-        scenario.verify(auction.balance == sp.tez(90))
+            # When JOHN bids for 1 NFT at 8 tez
+            scenario += auction.place_bid(price=8000000, quantity=1).run(
+                sender=Addresses.JOHN,
+                amount=sp.tez(8),
+            )
 
-        # Dummy 1 is removed from address_to_balance mapping
-        scenario.verify(~auction.data.address_to_balance.contains(dummy1.address))
+            # Then the bid at 1 tez is evicted, the last node sinks all the way down and the new bid
+            # stays at the bottom
+            scenario.verify(auction.data.queue_size == 7)
+            for index, bid_id in enumerate(expected_queue, 1):
+                scenario.verify(auction.data.bids_priority_queue[index].bid_id == bid_id)
 
-        # Correct number of NFTs are minted for Dummy1
-        scenario.verify(
-            fa2_nft.data.ledger.contains((dummy1.address, 0)) & fa2_nft.data.ledger.contains((dummy1.address, 39))
-        )
+    #############
+    # place_bids
+    #############
 
-        # When Dummy 2 claims their NFTs (60)
-        scenario += auction.claim().run(sender=dummy2.address, now=sp.timestamp(10))
+    @sp.add_test(name="place_bids merges bids at the same price")
+    def test():
+        scenario = sp.test_scenario()
 
-        # Dummy admin's balance equals the previous cost + current cost(60 tez) i.e 100 tez
-        scenario.verify(dummy_admin.balance == sp.tez(100))
+        auction = BatchAuction()
+        scenario += auction
 
-        # Dummy 2 get a refund of 30 tez  i.e the remaining balance
-        scenario.verify(dummy2.balance == sp.tez(30))
+        # When ALICE places three bids, two of them at 1000000 mutez
+        scenario += auction.place_bids(
+            [
+                sp.record(price=1000000, quantity=20),
+                sp.record(price=2000000, quantity=30),
+                sp.record(price=1000000, quantity=10),
+            ]
+        ).run(
+            sender=Addresses.ALICE,
+            amount=sp.tez(90),
+        )
 
-        # Correct number of NFTs are minted for Dummy2
+        # Two bids are registered, the highest one first
+        scenario.verify(auction.data.next_bid_id == 2)
         scenario.verify(
-            fa2_nft.data.ledger.contains((dummy2.address, 40)) & fa2_nft.data.ledger.contains((dummy2.address, 99))
+            auction.data.bids[1]
+            == sp.record(
+                price=sp.mutez(2000000),
+                quantity=30,
+                bidder=Addresses.ALICE,
+            )
+        )
+        scenario.verify(
+            auction.data.bids[2]
+            == sp.record(
+                price=sp.mutez(1000000),
+                quantity=30,
+                bidder=Addresses.ALICE,
+            )
         )
 
-        # The auction contract's balance is now zero
-        scenario.verify(auction.balance == sp.tez(0))
-
-        # Dummy 2 is removed from address_to_balance mapping
-        scenario.verify(~auction.data.address_to_balance.contains(dummy2.address))
-
-    @sp.add_test(name="claim works properly for zero winning bids and gives full refund")
+        # The storage is updated properly
+        scenario.verify(auction.data.bids_priority_queue[1].bid_id == 2)
+        scenario.verify(auction.data.bids_priority_queue[2].bid_id == 1)
+        scenario.verify(auction.data.queue_size == 2)
+        scenario.verify(auction.data.accounts[Addresses.ALICE].balance == sp.tez(90))
+        scenario.verify(auction.data.accounts[Addresses.ALICE].winning_quantity == 60)
+        scenario.verify(auction.data.quantity_under_bid == 60)
+
+    @sp.add_test(name="place_bids evicts the lowest bids in a single pass")
     def test():
         scenario = sp.test_scenario()
 
-        dummy1 = Dummy.Dummy()
-        dummy_admin = Dummy.Dummy()
-        fa2_nft = Fa2_NFT.FA2(
-            Fa2_NFT.FA2_config(),
-            sp.utils.metadata_of_url("https://example/com"),
-            Addresses.ADMIN,
-        )
+        # Add two bids such that they leave only 10 NFTs in remaining supply
         auction = BatchAuction(
-            admin=dummy_admin.address,
             bids=sp.big_map(
-                l={
-                    1: sp.record(quantity=40, price=sp.mutez(1000000), bidder=dummy1.address),
+                {
+                    1: sp.record(price=sp.mutez(1000000), quantity=50, bidder=Addresses.ALICE),
+                    2: sp.record(price=sp.mutez(2000000), quantity=40, bidder=Addresses.BOB),
                 }
             ),
-            owner_to_bids=sp.big_map(
-                l={
-                    dummy1.address: sp.set([]),
+            bids_priority_queue=sp.big_map(
+                {
+                    1: sp.record(price=sp.mutez(1000000), quantity=50, bid_id=1),
+                    2: sp.record(price=sp.mutez(2000000), quantity=40, bid_id=2),
+                }
+            ),
+            heap_positions=sp.big_map(
+                {
+                    1: 1,
+                    2: 2,
                 }
             ),
-            address_to_balance=sp.big_map(
+            queue_size=2,
+            accounts=sp.big_map(
                 l={
-                    dummy1.address: sp.tez(40),
+                    Addresses.ALICE: sp.record(balance=sp.tez(50), winning_quantity=50, minted=0),
+                    Addresses.BOB: sp.record(balance=sp.tez(80), winning_quantity=40, minted=0),
                 }
             ),
-            nft_contract_address=fa2_nft.address,
-        )
+            quantity_under_bid=90,
+            next_bid_id=2,
+        )
+        scenario += auction
+
+        bids = [
+            sp.record(price=1500000, quantity=20),
+            sp.record(price=3000000, quantity=5),
+            sp.record(price=500000, quantity=10),
+        ]
+
+        # Bidding fails when the sent amount does not cover every bid
+        scenario += auction.place_bids(bids).run(
+            sender=Addresses.JOHN,
+            amount=sp.tez(45),
+            valid=False,
+            exception=Errors.INVALID_TEZ_AMOUNT,
+        )
+
+        # When JOHN bids for 5 NFTs at 3000000 mutez, 20 at 1500000 mutez and 10 at 500000 mutez
+        scenario += auction.place_bids(bids).run(
+            sender=Addresses.JOHN,
+            amount=sp.tez(50),
+        )
+
+        # Then the bid at 3000000 mutez takes the remaining supply, the bid at 1500000 mutez cuts
+        # ALICE's bid by 15 NFTs and the bid at 500000 mutez is left unfilled
+        scenario.verify(auction.data.next_bid_id == 4)
+        scenario.verify(auction.data.bids[3].quantity == 5)
+        scenario.verify(auction.data.bids[4].quantity == 20)
+        scenario.verify(auction.data.bids[1].quantity == 35)
+        scenario.verify(auction.data.accounts[Addresses.ALICE].winning_quantity == 35)
+
+        # The storage is updated correctly
+        scenario.verify(auction.data.queue_size == 4)
+        scenario.verify(auction.data.accounts[Addresses.JOHN].balance == sp.tez(50))
+        scenario.verify(auction.data.accounts[Addresses.JOHN].winning_quantity == 25)
+        scenario.verify(auction.data.quantity_under_bid == 100)
+
+        # Bidding fails when none of the bids can be filled
+        scenario += auction.place_bids([sp.record(price=500000, quantity=10)]).run(
+            sender=Addresses.JOHN,
+            amount=sp.tez(5),
+            valid=False,
+            exception=Errors.BID_PRICE_TOO_LOW,
+        )
+
+    ##############################
+    # cancel_bid and increase_bid
+    ##############################
+
+    @sp.add_test(name="cancel_bid and increase_bid locate the bid through its heap position")
+    def test():
+        scenario = sp.test_scenario()
+
+        auction = BatchAuction()
+        scenario += auction
+
+        scenario += auction.place_bid(price=1000000, quantity=20).run(sender=Addresses.ALICE, amount=sp.tez(20))
+        scenario += auction.place_bid(price=500000, quantity=30).run(sender=Addresses.BOB, amount=sp.tez(15))
+        scenario += auction.place_bid(price=800000, quantity=10).run(sender=Addresses.JOHN, amount=sp.tez(8))
+        scenario += auction.place_bid(price=2000000, quantity=15).run(sender=Addresses.ALICE, amount=sp.tez(30))
+
+        # NOTICE: The queue is [2, 1, 3, 4] and the index maps every bid to its position
+        for index, bid_id in enumerate([2, 1, 3, 4], 1):
+            scenario.verify(auction.data.heap_positions[bid_id] == index)
+
+        # Only the owner of a bid can cancel it
+        scenario += auction.cancel_bid(1).run(
+            sender=Addresses.BOB,
+            valid=False,
+            exception=Errors.NOT_AUTHORIZED,
+        )
+
+        # When ALICE cancels her bid at 1 tez, from the middle of the queue
+        scenario += auction.cancel_bid(1).run(sender=Addresses.ALICE)
+
+        # The last node takes its place and the index follows
+        scenario.verify(auction.data.queue_size == 3)
+        scenario.verify(auction.data.bids_priority_queue[2].bid_id == 4)
+        scenario.verify(auction.data.heap_positions[4] == 2)
+        scenario.verify(~auction.data.heap_positions.contains(1))
+
+        # The bid's quantity is released and its 20 tez refunded
+        scenario.verify(auction.data.quantity_under_bid == 55)
+        scenario.verify(auction.data.accounts[Addresses.ALICE].balance == sp.tez(30))
+        scenario.verify(auction.data.accounts[Addresses.ALICE].winning_quantity == 15)
+        scenario.verify(auction.balance == sp.tez(53))
+
+        # A bid can't be cancelled twice
+        scenario += auction.cancel_bid(1).run(
+            sender=Addresses.ALICE,
+            valid=False,
+            exception=Errors.BID_NOT_IN_QUEUE,
+        )
+
+        # The price of a bid can only go up
+        scenario += auction.increase_bid(bid_id=2, price=400000).run(
+            sender=Addresses.BOB,
+            valid=False,
+            exception=Errors.PRICE_NOT_INCREASED,
+        )
+
+        # The top-up must cover the bid's quantity at the new price
+        scenario += auction.increase_bid(bid_id=2, price=1500000).run(
+            sender=Addresses.BOB,
+            amount=sp.tez(15),
+            valid=False,
+            exception=Errors.INVALID_TEZ_AMOUNT,
+        )
+
+        # When BOB raises his bid from 0.5 tez to 1.5 tez
+        scenario += auction.increase_bid(bid_id=2, price=1500000).run(sender=Addresses.BOB, amount=sp.tez(30))
+
+        # The bid sinks below JOHN's bid, which becomes the lowest one
+        for index, bid_id in enumerate([3, 4, 2], 1):
+            scenario.verify(auction.data.bids_priority_queue[index].bid_id == bid_id)
+            scenario.verify(auction.data.heap_positions[bid_id] == index)
+        scenario.verify(auction.data.bids_priority_queue[3].price == sp.mutez(1500000))
+        scenario.verify(auction.data.bids[2].price == sp.mutez(1500000))
+        scenario.verify(auction.data.accounts[Addresses.BOB].balance == sp.tez(45))
+
+        # Bids can't be modified once bidding is over
+        scenario += auction.cancel_bid(2).run(
+            sender=Addresses.BOB,
+            now=sp.timestamp(10),
+            valid=False,
+            exception=Errors.BIDDING_IS_NOT_ACTIVE,
+        )
+
+    ###############
+    # outbid queue
+    ###############
+
+    @sp.add_test(name="cancel_bid hands the released supply to the best outbid bids")
+    def test():
+        scenario = sp.test_scenario()
+
+        auction = BatchAuction()
+        scenario += auction
+
+        scenario += auction.place_bid(price=1000000, quantity=50).run(sender=Addresses.ALICE, amount=sp.tez(50))
+        scenario += auction.place_bid(price=2000000, quantity=40).run(sender=Addresses.BOB, amount=sp.tez(80))
+
+        # JOHN's bid cuts 20 NFTs from ALICE's bid at 1 tez
+        scenario += auction.place_bid(price=3000000, quantity=30).run(sender=Addresses.JOHN, amount=sp.tez(90))
+
+        # ALICE's bid at 1.5 tez evicts the rest of her bid at 1 tez, and is itself left 10 NFTs short
+        scenario += auction.place_bid(price=1500000, quantity=40).run(sender=Addresses.ALICE, amount=sp.tez(60))
+
+        # NOTICE: The outbid queue holds the three cut quantities, the best one at the root
+        scenario.verify(auction.data.outbid_size == 3)
+        scenario.verify(auction.data.outbid_queue[1] == sp.record(price=sp.mutez(1500000), quantity=10, bid_id=4))
+        scenario.verify(auction.data.accounts[Addresses.ALICE].winning_quantity == 30)
+
+        # When BOB cancels his bid, releasing 40 NFTs
+        scenario += auction.cancel_bid(2).run(sender=Addresses.BOB)
+
+        # The 10 missing NFTs are merged back into ALICE's bid at 1.5 tez
+        scenario.verify(auction.data.bids[4].quantity == 40)
+        scenario.verify(auction.data.bids_priority_queue[auction.data.heap_positions[4]].quantity == 40)
+
+        # The 30 NFTs evicted from ALICE's bid at 1 tez re-enter the queue, at its root
+        scenario.verify(
+            auction.data.bids_priority_queue[1] == sp.record(price=sp.mutez(1000000), quantity=30, bid_id=1)
+        )
+        scenario.verify(auction.data.bids[1].quantity == 30)
+        scenario.verify(auction.data.queue_size == 3)
+
+        # The whole supply is under bid again
+        scenario.verify(auction.data.quantity_under_bid == 100)
+        scenario.verify(auction.data.accounts[Addresses.ALICE].winning_quantity == 70)
+        scenario.verify(auction.data.accounts[Addresses.BOB].winning_quantity == 0)
+        scenario.verify(auction.balance == sp.tez(200))
+
+        # Only the 20 NFTs cut first are left in the outbid queue
+        scenario.verify(auction.data.outbid_size == 1)
+        scenario.verify(auction.data.outbid_queue[1] == sp.record(price=sp.mutez(1000000), quantity=20, bid_id=1))
+
+        # The outbid queue is released by finalize
+        scenario += auction.finalize().run(now=sp.timestamp(10))
+        scenario.verify(auction.data.clearing_price == sp.mutez(1000000))
+        scenario.verify(auction.data.outbid_size == 0)
+        scenario.verify(~auction.data.outbid_queue.contains(1))
+
+    @sp.add_test(name="cancel_bid does not refill a raised bid with quantities paid at its old price")
+    def test():
+        scenario = sp.test_scenario()
+
+        fa2_nft = Fa2_NFT.FA2(
+            Fa2_NFT.FA2_config(),
+            sp.utils.metadata_of_url("https://example/com"),
+            Addresses.ADMIN,
+        )
+        auction = BatchAuction(total_supply=10, nft_contract_address=fa2_nft.address)
+
+        scenario += fa2_nft
+        scenario += auction
+
+        # update admin of the NFT contract for minting
+        scenario += fa2_nft.set_administrator(auction.address).run(sender=Addresses.ADMIN)
+
+        scenario += auction.place_bid(price=2000000, quantity=5).run(sender=Addresses.BOB, amount=sp.tez(10))
+
+        # ALICE's bid only gets 5 NFTs, the 5 others are cut at 1 tez
+        scenario += auction.place_bid(price=1000000, quantity=10).run(sender=Addresses.ALICE, amount=sp.tez(10))
+        scenario.verify(auction.data.outbid_queue[1] == sp.record(price=sp.mutez(1000000), quantity=5, bid_id=2))
+
+        # ALICE raises her bid to 3 tez, topping up the 5 NFTs in the queue only
+        scenario += auction.increase_bid(bid_id=2, price=3000000).run(sender=Addresses.ALICE, amount=sp.tez(10))
+
+        # When BOB cancels his bid, the quantity cut at 1 tez is dropped instead of joining the raised bid
+        scenario += auction.cancel_bid(1).run(sender=Addresses.BOB)
+        scenario.verify(auction.data.outbid_size == 0)
+        scenario.verify(auction.data.bids[2].quantity == 5)
+        scenario.verify(auction.data.quantity_under_bid == 5)
+        scenario.verify(auction.data.accounts[Addresses.ALICE].winning_quantity == 5)
+
+        scenario += auction.finalize().run(now=sp.timestamp(10))
+        scenario.verify(auction.data.clearing_price == sp.tez(3))
+
+        # ALICE's deposit of 20 tez covers her 5 NFTs at 3 tez, and the claim refunds the rest
+        scenario += auction.claim(10).run(sender=Addresses.ALICE, now=sp.timestamp(10))
+        scenario.verify(auction.data.proceeds == sp.tez(15))
+        scenario.verify(auction.balance == sp.tez(15))
+        scenario.verify(~auction.data.accounts.contains(Addresses.ALICE))
+
+    @sp.add_test(name="the outbid queue keeps the best quantities once it is full")
+    def test():
+        scenario = sp.test_scenario()
+
+        auction = BatchAuction(outbid_capacity=2)
+        scenario += auction
+
+        scenario += auction.place_bid(price=1000000, quantity=50).run(sender=Addresses.ALICE, amount=sp.tez(50))
+        scenario += auction.place_bid(price=2000000, quantity=40).run(sender=Addresses.BOB, amount=sp.tez(80))
+        scenario += auction.place_bid(price=3000000, quantity=30).run(sender=Addresses.JOHN, amount=sp.tez(90))
+
+        # When a third quantity is cut from the queue
+        scenario += auction.place_bid(price=1500000, quantity=40).run(sender=Addresses.ALICE, amount=sp.tez(60))
+
+        # It takes the place of the last leaf, the 20 NFTs cut first at 1 tez
+        scenario.verify(auction.data.outbid_size == 2)
+        scenario.verify(auction.data.outbid_queue[1].bid_id == 4)
+        scenario.verify(auction.data.outbid_queue[2] == sp.record(price=sp.mutez(1000000), quantity=30, bid_id=1))
+
+        # ALICE's bid at 1 tez is out of the priority queue, but its 30 NFTs are still in the outbid queue,
+        # so its record is kept for them to be promoted
+        scenario.verify(auction.data.bids.contains(1))
+        scenario.verify(auction.data.outbid_counts[1] == 1)
+        scenario.verify(auction.data.accounts[Addresses.ALICE].balance == sp.tez(110))
+
+        # When JOHN's bid cuts 10 more NFTs from ALICE's bid at 1.5 tez
+        scenario += auction.place_bid(price=4000000, quantity=10).run(sender=Addresses.JOHN, amount=sp.tez(40))
+
+        # The last node of the bid at 1 tez is dropped, and its record is freed with it
+        scenario.verify(auction.data.outbid_size == 2)
+        scenario.verify(~auction.data.outbid_counts.contains(1))
+        scenario.verify(auction.data.outbid_counts[4] == 2)
+        scenario.verify(~auction.data.bids.contains(1))
+
+    @sp.add_test(name="bids dropped by the outbid queue are freed under heavy churn")
+    def test():
+        scenario = sp.test_scenario()
+
+        auction = BatchAuction(total_supply=10, outbid_capacity=2)
+        scenario += auction
+
+        # Every bid takes the whole supply, evicting the previous one
+        bidders = [Addresses.ALICE, Addresses.BOB, Addresses.JOHN]
+        for bid_id in range(1, 11):
+            price = 1000000 + bid_id * 100000
+            scenario += auction.place_bid(price=price, quantity=10).run(
+                sender=bidders[bid_id % 3],
+                amount=sp.mutez(price * 10),
+            )
+
+        # Only the live bid and the two bids kept by the outbid queue still have a record
+        for bid_id in range(1, 8):
+            scenario.verify(~auction.data.bids.contains(bid_id))
+        for bid_id in range(8, 11):
+            scenario.verify(auction.data.bids.contains(bid_id))
+        scenario.verify(auction.data.outbid_queue[1].bid_id == 9)
+        scenario.verify(auction.data.outbid_queue[2].bid_id == 8)
+
+        # The evicted bids are still refunded from the accounts
+        scenario.verify(auction.data.accounts[Addresses.BOB].winning_quantity == 10)
+        scenario.verify(auction.data.accounts[Addresses.ALICE].winning_quantity == 0)
+        scenario.verify(auction.data.accounts[Addresses.ALICE].balance == sp.mutez((1300000 + 1600000 + 1900000) * 10))
+
+        # Report the big_map entries freed, as packed bid id + bid record
+        freed_sizes = [
+            sp.len(sp.pack(sp.nat(bid_id)))
+            + sp.len(
+                sp.pack(
+                    sp.set_type_expr(
+                        sp.record(
+                            quantity=10,
+                            price=sp.mutez(1000000 + bid_id * 100000),
+                            bidder=bidders[bid_id % 3],
+                        ),
+                        AuctionTypes.BID_TYPE,
+                    )
+                )
+            )
+            for bid_id in range(1, 8)
+        ]
+        scenario.h2("Storage freed from bids")
+        scenario.p("7 of the 10 bid records are freed. Packed bytes freed:")
+        scenario.show(sum(freed_sizes[1:], freed_sizes[0]))
+
+    #####################
+    # deferred evictions
+    #####################
+
+    @sp.add_test(name="place_bid defers the evictions beyond its budget to process_evictions")
+    def test():
+        scenario = sp.test_scenario()
+
+        auction = BatchAuction(total_supply=10, max_evictions=3)
+        scenario += auction
+
+        # ALICE fills the supply with 10 single-NFT bids priced from 1 tez to 1.9 tez. The highest
+        # one gets bid id 1 and the lowest one bid id 10.
+        prices = [1000000 + i * 100000 for i in range(10)]
+        scenario += auction.place_bids([sp.record(price=price, quantity=1) for price in prices]).run(
+            sender=Addresses.ALICE,
+            amount=sp.mutez(sum(prices)),
+        )
+
+        # When BOB bids for 8 NFTs at 3 tez, which takes 8 evictions
+        scenario += auction.place_bid(price=3000000, quantity=8).run(sender=Addresses.BOB, amount=sp.tez(24))
+
+        # Only 3 bids are evicted, and the whole bid enters the queue, overcommitting the supply by 5
+        scenario.verify(auction.data.queue_size == 8)
+        scenario.verify(~auction.data.heap_positions.contains(8))
+        scenario.verify(auction.data.heap_positions.contains(7))
+        scenario.verify(auction.data.quantity_under_bid == 15)
+        scenario.verify(auction.data.accounts[Addresses.BOB].winning_quantity == 8)
+        scenario.verify(auction.data.evicting_bid == sp.some(11))
+
+        # A new bid can't clear the pending evictions within its own budget
+        scenario += auction.place_bid(price=2000000, quantity=1).run(
+            sender=Addresses.JOHN,
+            amount=sp.tez(2),
+            valid=False,
+            exception=Errors.EVICTIONS_PENDING,
+        )
+
+        # Bids can't be modified and the auction can't be finalized while evictions are pending
+        scenario += auction.cancel_bid(11).run(
+            sender=Addresses.BOB,
+            valid=False,
+            exception=Errors.EVICTIONS_PENDING,
+        )
+        scenario += auction.finalize().run(
+            now=sp.timestamp(10),
+            valid=False,
+            exception=Errors.EVICTIONS_PENDING,
+        )
+
+        # Anyone can process the pending evictions, over several calls
+        scenario += auction.process_evictions(3).run(sender=Addresses.JOHN)
+        scenario.verify(auction.data.quantity_under_bid == 12)
+        scenario.verify(auction.data.evicting_bid == sp.some(11))
+
+        scenario += auction.process_evictions(3).run(sender=Addresses.JOHN)
+
+        # Only ALICE's two highest bids are left along with BOB's
+        scenario.verify(auction.data.evicting_bid == sp.none)
+        scenario.verify(auction.data.quantity_under_bid == 10)
+        scenario.verify(auction.data.queue_size == 3)
+        scenario.verify(auction.data.bids_priority_queue[1].bid_id == 2)
+        scenario.verify(auction.data.accounts[Addresses.ALICE].winning_quantity == 2)
+
+        # Processing fails once nothing is pending
+        scenario += auction.process_evictions(3).run(
+            sender=Addresses.JOHN,
+            valid=False,
+            exception=Errors.NO_PENDING_EVICTIONS,
+        )
+
+        # Bidding resumes
+        scenario += auction.place_bid(price=2000000, quantity=1).run(sender=Addresses.JOHN, amount=sp.tez(2))
+        scenario.verify(auction.data.bids_priority_queue[1].bid_id == 1)
+
+    @sp.add_test(name="process_evictions cuts the evicting bid once no lower bid is left")
+    def test():
+        scenario = sp.test_scenario()
+
+        auction = BatchAuction(total_supply=10, max_evictions=2)
+        scenario += auction
+
+        scenario += auction.place_bids(
+            [
+                sp.record(price=1000000, quantity=1),
+                sp.record(price=1100000, quantity=1),
+                sp.record(price=1200000, quantity=1),
+            ]
+        ).run(sender=Addresses.ALICE, amount=sp.mutez(3300000))
+        scenario += auction.place_bid(price=2000000, quantity=7).run(sender=Addresses.BOB, amount=sp.tez(14))
+
+        # When JOHN bids for 5 NFTs at 1.5 tez, only 3 NFTs are bid at a lower price
+        scenario += auction.place_bid(price=1500000, quantity=5).run(
+            sender=Addresses.JOHN,
+            amount=sp.mutez(7500000),
+        )
+
+        # The budget runs out with ALICE's bid at 1.2 tez left to evict
+        scenario.verify(auction.data.evicting_bid == sp.some(5))
+        scenario.verify(auction.data.quantity_under_bid == 13)
+
+        # When the last evictions are processed
+        scenario += auction.process_evictions(2).run(sender=Addresses.ALICE)
+
+        # JOHN's bid gets the 3 NFTs that make_room would have given it, and the rest is cut
+        scenario.verify(auction.data.evicting_bid == sp.none)
+        scenario.verify(auction.data.bids[5].quantity == 3)
+        scenario.verify(auction.data.bids_priority_queue[auction.data.heap_positions[5]].quantity == 3)
+        scenario.verify(auction.data.accounts[Addresses.JOHN].winning_quantity == 3)
+        scenario.verify(auction.data.accounts[Addresses.ALICE].winning_quantity == 0)
+        scenario.verify(auction.data.quantity_under_bid == 10)
+
+        # The cut part waits in the outbid queue
+        scenario.verify(auction.data.outbid_queue[1] == sp.record(price=sp.mutez(1500000), quantity=2, bid_id=5))
+
+    ##################
+    # off-chain views
+    ##################
+
+    @sp.add_test(name="off-chain views quote bids and report positions without reading the storage")
+    def test():
+        scenario = sp.test_scenario()
+
+        auction = BatchAuction()
+        scenario += auction
+
+        # No bid yet
+        scenario.verify(auction.current_clearing_price() == sp.mutez(0))
+
+        scenario += auction.place_bid(price=1000000, quantity=50).run(sender=Addresses.ALICE, amount=sp.tez(50))
+        scenario += auction.place_bid(price=2000000, quantity=40).run(sender=Addresses.BOB, amount=sp.tez(80))
+
+        # The clearing price is the lowest bid
+        scenario.verify(auction.current_clearing_price() == sp.mutez(1000000))
+
+        # 10 NFTs are free, and ALICE's 50 NFTs can be outbid at 1.5 tez
+        scenario.verify(auction.quote(price=1500000, quantity=30) == sp.record(fillable=30, amount=sp.tez(45)))
+        scenario.verify(auction.quote(price=500000, quantity=20) == sp.record(fillable=10, amount=sp.tez(10)))
+
+        # JOHN's bid matches its quote
+        scenario.verify(auction.quote(price=3000000, quantity=30).fillable == 30)
+        scenario += auction.place_bid(price=3000000, quantity=30).run(sender=Addresses.JOHN, amount=sp.tez(90))
+
+        # Nothing is free anymore, and 30 NFTs are left in ALICE's bid
+        scenario.verify(auction.quote(price=500000, quantity=20).fillable == 0)
+        scenario.verify(auction.quote(price=1500000, quantity=40) == sp.record(fillable=30, amount=sp.tez(60)))
+
+        # Bids below the minimum price can't be filled
+        scenario.verify(auction.quote(price=50000, quantity=1).fillable == 0)
+
+        # Positions come from the accounts
+        scenario.verify(auction.position_of(Addresses.ALICE) == sp.record(balance=sp.tez(50), winning_quantity=30))
+        scenario.verify(auction.position_of(Addresses.JOHN) == sp.record(balance=sp.tez(90), winning_quantity=30))
+        scenario.verify(auction.position_of(Addresses.ADMIN) == sp.record(balance=sp.mutez(0), winning_quantity=0))
+
+        # Once finalized, the clearing price is the stored one
+        scenario += auction.finalize().run(now=sp.timestamp(10))
+        scenario.verify(auction.current_clearing_price() == sp.mutez(1000000))
+
+    ###########
+    # finalize
+    ###########
+
+    @sp.add_test(name="finalize snapshots the clearing price and releases the priority queue")
+    def test():
+        scenario = sp.test_scenario()
+
+        auction = BatchAuction(
+            bids=sp.big_map(
+                l={
+                    1: sp.record(quantity=40, price=sp.mutez(1000000), bidder=Addresses.ALICE),
+                    2: sp.record(quantity=60, price=sp.mutez(1500000), bidder=Addresses.BOB),
+                }
+            ),
+            bids_priority_queue=sp.big_map(
+                l={
+                    1: sp.record(price=sp.mutez(1000000), quantity=40, bid_id=1),
+                    2: sp.record(price=sp.mutez(1500000), quantity=60, bid_id=2),
+                }
+            ),
+            heap_positions=sp.big_map(
+                {
+                    1: 1,
+                    2: 2,
+                }
+            ),
+            queue_size=2,
+            quantity_under_bid=100,
+        )
+        scenario += auction
+
+        # Finalizing fails while bidding is still active
+        scenario += auction.finalize().run(
+            now=sp.timestamp(5),
+            valid=False,
+            exception=Errors.BIDDING_IS_STILL_ACTIVE,
+        )
+
+        # When the auction is finalized after bidding ends
+        scenario += auction.finalize().run(sender=Addresses.JOHN, now=sp.timestamp(10))
+
+        # The clearing price and the winning quantity are stored
+        scenario.verify(auction.data.clearing_price == sp.mutez(1000000))
+        scenario.verify(auction.data.winning_quantity == 100)
+        scenario.verify(auction.data.settled)
+
+        # The priority queue is emptied
+        scenario.verify(auction.data.queue_size == 0)
+        scenario.verify(~auction.data.bids_priority_queue.contains(1))
+
+        # Finalizing twice fails
+        scenario += auction.finalize().run(
+            now=sp.timestamp(10),
+            valid=False,
+            exception=Errors.AUCTION_ALREADY_SETTLED,
+        )
+
+    @sp.add_test(name="claim fails before the auction is finalized")
+    def test():
+        scenario = sp.test_scenario()
+
+        auction = BatchAuction(
+            accounts=sp.big_map(
+                l={
+                    Addresses.ALICE: sp.record(balance=sp.tez(40), winning_quantity=40, minted=0),
+                }
+            ),
+        )
+        scenario += auction
+
+        scenario += auction.claim(100).run(
+            sender=Addresses.ALICE,
+            now=sp.timestamp(10),
+            valid=False,
+            exception=Errors.AUCTION_NOT_SETTLED,
+        )
+
+    ########
+    # claim
+    ########
+
+    @sp.add_test(name="claim works properly for just one winning bid")
+    def test():
+        scenario = sp.test_scenario()
+
+        dummy1 = Dummy.Dummy()
+        dummy2 = Dummy.Dummy()
+        dummy_admin = Dummy.Dummy()
+        fa2_nft = Fa2_NFT.FA2(
+            Fa2_NFT.FA2_config(),
+            sp.utils.metadata_of_url("https://example/com"),
+            Addresses.ADMIN,
+        )
+        auction = BatchAuction(
+            admin=dummy_admin.address,
+            bids=sp.big_map(
+                l={
+                    1: sp.record(quantity=40, price=sp.mutez(1000000), bidder=dummy1.address),
+                    2: sp.record(quantity=60, price=sp.mutez(1500000), bidder=dummy2.address),
+                }
+            ),
+            bids_priority_queue=sp.big_map(
+                l={
+                    1: sp.record(price=sp.mutez(1000000), quantity=40, bid_id=1),
+                    2: sp.record(price=sp.mutez(1500000), quantity=60, bid_id=2),
+                }
+            ),
+            heap_positions=sp.big_map(
+                {
+                    1: 1,
+                    2: 2,
+                }
+            ),
+            queue_size=2,
+            accounts=sp.big_map(
+                l={
+                    dummy1.address: sp.record(balance=sp.tez(40), winning_quantity=40, minted=0),
+                    dummy2.address: sp.record(balance=sp.tez(90), winning_quantity=60, minted=0),
+                }
+            ),
+            nft_contract_address=fa2_nft.address,
+        )
+
+        auction.set_initial_balance(sp.tez(130))
+
+        scenario += fa2_nft
+        scenario += dummy1
+        scenario += dummy2
+        scenario += dummy_admin
+        scenario += auction
+
+        # update admin of the NFT contract for minting
+        scenario += fa2_nft.set_administrator(auction.address).run(sender=Addresses.ADMIN)
+
+        # NOTICE: Clearing price is 1 tez or 1000000 mutez
+
+        # The auction is finalized once bidding is over
+        scenario += auction.finalize().run(now=sp.timestamp(10))
+
+        # When Dummy 1 claims their NFTs (40)
+        scenario += auction.claim(100).run(sender=dummy1.address, now=sp.timestamp(10))
+
+        # The cost i.e 40 tez is added to the proceeds
+        scenario.verify(auction.data.proceeds == sp.tez(40))
+
+        # The auction contract's balance is unchanged, since Dummy 1 spent all of its bid
+        scenario.verify(auction.balance == sp.tez(130))
+
+        # Dummy 1's account is removed
+        scenario.verify(~auction.data.accounts.contains(dummy1.address))
+
+        # Correct number of NFTs are minted for Dummy1
+        scenario.verify(
+            fa2_nft.data.ledger.contains((dummy1.address, 0)) & fa2_nft.data.ledger.contains((dummy1.address, 39))
+        )
+
+        # When Dummy 2 claims their NFTs (60)
+        scenario += auction.claim(100).run(sender=dummy2.address, now=sp.timestamp(10))
+
+        # The proceeds equal the previous cost + current cost(60 tez) i.e 100 tez
+        scenario.verify(auction.data.proceeds == sp.tez(100))
+
+        # Dummy 2 get a refund of 30 tez  i.e the remaining balance
+        scenario.verify(dummy2.balance == sp.tez(30))
+
+        # Correct number of NFTs are minted for Dummy2
+        scenario.verify(
+            fa2_nft.data.ledger.contains((dummy2.address, 40)) & fa2_nft.data.ledger.contains((dummy2.address, 99))
+        )
+
+        # Only the proceeds are left in the auction contract
+        scenario.verify(auction.balance == sp.tez(100))
+
+        # Dummy 2's account is removed
+        scenario.verify(~auction.data.accounts.contains(dummy2.address))
+
+        # Only the admin can withdraw the proceeds
+        scenario += auction.withdraw_proceeds().run(
+            sender=dummy1.address,
+            valid=False,
+            exception=Errors.NOT_AUTHORIZED,
+        )
+
+        # When the admin withdraws the proceeds
+        scenario += auction.withdraw_proceeds().run(sender=dummy_admin.address)
+
+        # Dummy admin receives 100 tez in a single transfer and the auction contract is emptied
+        scenario.verify(dummy_admin.balance == sp.tez(100))
+        scenario.verify(auction.data.proceeds == sp.tez(0))
+        scenario.verify(auction.balance == sp.tez(0))
+
+        # Withdrawing again fails since there are no proceeds left
+        scenario += auction.withdraw_proceeds().run(
+            sender=dummy_admin.address,
+            valid=False,
+            exception=Errors.NO_PROCEEDS,
+        )
+
+    @sp.add_test(name="claim works properly for zero winning bids and gives full refund")
+    def test():
+        scenario = sp.test_scenario()
+
+        dummy1 = Dummy.Dummy()
+        dummy_admin = Dummy.Dummy()
+        fa2_nft = Fa2_NFT.FA2(
+            Fa2_NFT.FA2_config(),
+            sp.utils.metadata_of_url("https://example/com"),
+            Addresses.ADMIN,
+        )
+        auction = BatchAuction(
+            admin=dummy_admin.address,
+            bids=sp.big_map(
+                l={
+                    1: sp.record(quantity=40, price=sp.mutez(1000000), bidder=dummy1.address),
+                }
+            ),
+            accounts=sp.big_map(
+                l={
+                    dummy1.address: sp.record(balance=sp.tez(40), winning_quantity=0, minted=0),
+                }
+            ),
+            nft_contract_address=fa2_nft.address,
+        )
 
         auction.set_initial_balance(sp.tez(40))
 
@@ -516,8 +2028,11 @@ if __name__ == "__main__":
         # update admin of the NFT contract for minting
         scenario += fa2_nft.set_administrator(auction.address).run(sender=Addresses.ADMIN)
 
+        # The auction is finalized once bidding is over
+        scenario += auction.finalize().run(now=sp.timestamp(10))
+
         # When Dummy 1 calls claim
-        scenario += auction.claim().run(sender=dummy1.address, now=sp.timestamp(10))
+        scenario += auction.claim(100).run(sender=dummy1.address, now=sp.timestamp(10))
 
         # The auction contract's balance is reduced by 40 tez
         scenario.verify(auction.balance == sp.tez(0))
@@ -525,11 +2040,11 @@ if __name__ == "__main__":
         # Dummy 1 gets full refund
         scenario.verify(dummy1.balance == sp.tez(40))
 
-        # Dummy 1 is removed from address_to_balance mapping
-        scenario.verify(~auction.data.address_to_balance.contains(dummy1.address))
+        # Dummy 1's account is removed
+        scenario.verify(~auction.data.accounts.contains(dummy1.address))
 
-        # Dummy admin's balance stays zero
-        scenario.verify(dummy_admin.balance == sp.tez(0))
+        # No proceeds are collected
+        scenario.verify(auction.data.proceeds == sp.tez(0))
 
     @sp.add_test(name="claim works properly for multiple winning bids")
     def test():
@@ -550,15 +2065,22 @@ if __name__ == "__main__":
                     2: sp.record(quantity=60, price=sp.mutez(2000000), bidder=dummy1.address),
                 }
             ),
-            bids_priority_queue=sp.map({1: 1, 2: 2}),
-            owner_to_bids=sp.big_map(
-                l={
-                    dummy1.address: sp.set([1, 2]),
+            bids_priority_queue=sp.big_map(
+                {
+                    1: sp.record(price=sp.mutez(1000000), quantity=40, bid_id=1),
+                    2: sp.record(price=sp.mutez(2000000), quantity=60, bid_id=2),
+                }
+            ),
+            heap_positions=sp.big_map(
+                {
+                    1: 1,
+                    2: 2,
                 }
             ),
-            address_to_balance=sp.big_map(
+            queue_size=2,
+            accounts=sp.big_map(
                 l={
-                    dummy1.address: sp.tez(160),
+                    dummy1.address: sp.record(balance=sp.tez(160), winning_quantity=100, minted=0),
                 }
             ),
             nft_contract_address=fa2_nft.address,
@@ -576,25 +2098,309 @@ if __name__ == "__main__":
 
         # NOTICE: The clearing price is set to 1 tez or 1000000 mutez
 
+        # The auction is finalized once bidding is over
+        scenario += auction.finalize().run(now=sp.timestamp(10))
+
         # When Dummy 1 calls claim
-        scenario += auction.claim().run(sender=dummy1.address, now=sp.timestamp(10))
+        scenario += auction.claim(100).run(sender=dummy1.address, now=sp.timestamp(10))
 
-        # The auction contract's balance is reduced to 0 tez
-        scenario.verify(auction.balance == sp.tez(0))
+        # The auction contract's balance is reduced to the proceeds i.e 100 tez
+        scenario.verify(auction.balance == sp.tez(100))
 
-        # Dummy 1 gets refund of 80 tez
+        # Dummy 1 gets refund of 60 tez
         scenario.verify(dummy1.balance == sp.tez(60))
 
-        # Dummy 1 is removed from address_to_balance mapping
-        scenario.verify(~auction.data.address_to_balance.contains(dummy1.address))
+        # Dummy 1's account is removed
+        scenario.verify(~auction.data.accounts.contains(dummy1.address))
 
         # Correct NFTs are minted for dummy1
         scenario.verify(
             fa2_nft.data.ledger.contains((dummy1.address, 0)) & fa2_nft.data.ledger.contains((dummy1.address, 99))
         )
 
-        # Dummy admin's balance is the cost price
-        scenario.verify(dummy_admin.balance == sp.tez(100))
+        # The proceeds are the cost price
+        scenario.verify(auction.data.proceeds == sp.tez(100))
+
+    @sp.add_test(name="claim mints a large winning allocation through a single mint_batch call")
+    def test():
+        scenario = sp.test_scenario()
+
+        dummy1 = Dummy.Dummy()
+        dummy2 = Dummy.Dummy()
+        dummy_admin = Dummy.Dummy()
+        fa2_nft = Fa2_NFT.FA2(
+            Fa2_NFT.FA2_config(),
+            sp.utils.metadata_of_url("https://example/com"),
+            Addresses.ADMIN,
+        )
+        auction = BatchAuction(
+            admin=dummy_admin.address,
+            bids=sp.big_map(
+                l={
+                    1: sp.record(quantity=40, price=sp.mutez(1000000), bidder=dummy2.address),
+                    2: sp.record(quantity=20, price=sp.mutez(2000000), bidder=dummy1.address),
+                    3: sp.record(quantity=25, price=sp.mutez(1500000), bidder=dummy1.address),
+                    4: sp.record(quantity=15, price=sp.mutez(3000000), bidder=dummy1.address),
+                }
+            ),
+            bids_priority_queue=sp.big_map(
+                {
+                    1: sp.record(price=sp.mutez(1000000), quantity=40, bid_id=1),
+                    2: sp.record(price=sp.mutez(1500000), quantity=25, bid_id=3),
+                    3: sp.record(price=sp.mutez(2000000), quantity=20, bid_id=2),
+                    4: sp.record(price=sp.mutez(3000000), quantity=15, bid_id=4),
+                }
+            ),
+            heap_positions=sp.big_map(
+                {
+                    1: 1,
+                    3: 2,
+                    2: 3,
+                    4: 4,
+                }
+            ),
+            queue_size=4,
+            accounts=sp.big_map(
+                l={
+                    dummy1.address: sp.record(balance=sp.mutez(122500000), winning_quantity=60, minted=0),
+                    dummy2.address: sp.record(balance=sp.tez(40), winning_quantity=40, minted=0),
+                }
+            ),
+            nft_contract_address=fa2_nft.address,
+        )
+
+        auction.set_initial_balance(sp.mutez(162500000))
+
+        scenario += fa2_nft
+        scenario += dummy1
+        scenario += dummy2
+        scenario += dummy_admin
+        scenario += auction
+
+        # update admin of the NFT contract for minting
+        scenario += fa2_nft.set_administrator(auction.address).run(sender=Addresses.ADMIN)
+
+        # NOTICE: The clearing price is 1 tez or 1000000 mutez
+
+        # The auction is finalized once bidding is over
+        scenario += auction.finalize().run(now=sp.timestamp(10))
+
+        # When Dummy 1 claims the 60 NFTs won across three bids
+        scenario += auction.claim(100).run(sender=dummy1.address, now=sp.timestamp(10))
+
+        # All 60 NFTs are minted to Dummy 1 with consecutive token ids
+        scenario.verify(fa2_nft.data.all_tokens == 60)
+        scenario.verify(
+            fa2_nft.data.ledger.contains((dummy1.address, 0)) & fa2_nft.data.ledger.contains((dummy1.address, 59))
+        )
+        scenario.verify(auction.data.mint_index == 60)
+
+        # The cost is added to the proceeds and Dummy 1 gets the remaining 62.5 tez back
+        scenario.verify(auction.data.proceeds == sp.tez(60))
+        scenario.verify(dummy1.balance == sp.mutez(62500000))
+
+    @sp.add_test(name="claim mints a winning allocation over several calls")
+    def test():
+        scenario = sp.test_scenario()
+
+        dummy1 = Dummy.Dummy()
+        dummy_admin = Dummy.Dummy()
+        fa2_nft = Fa2_NFT.FA2(
+            Fa2_NFT.FA2_config(),
+            sp.utils.metadata_of_url("https://example/com"),
+            Addresses.ADMIN,
+        )
+
+        # A finalized auction where Dummy 1 won 50 NFTs at a clearing price of 1 tez
+        auction = BatchAuction(
+            admin=dummy_admin.address,
+            accounts=sp.big_map(
+                l={
+                    dummy1.address: sp.record(balance=sp.tez(60), winning_quantity=50, minted=0),
+                }
+            ),
+            nft_contract_address=fa2_nft.address,
+            clearing_price=sp.tez(1),
+            winning_quantity=50,
+            settled=True,
+        )
+
+        auction.set_initial_balance(sp.tez(60))
+
+        scenario += fa2_nft
+        scenario += dummy1
+        scenario += dummy_admin
+        scenario += auction
+
+        # update admin of the NFT contract for minting
+        scenario += fa2_nft.set_administrator(auction.address).run(sender=Addresses.ADMIN)
+
+        # When Dummy 1 claims 20 NFTs twice
+        scenario += auction.claim(20).run(sender=dummy1.address, now=sp.timestamp(10))
+        scenario += auction.claim(20).run(sender=dummy1.address, now=sp.timestamp(10))
+
+        # Then 40 NFTs are minted and nothing is paid out yet
+        scenario.verify(auction.data.accounts[dummy1.address].minted == 40)
+        scenario.verify(
+            fa2_nft.data.ledger.contains((dummy1.address, 0)) & fa2_nft.data.ledger.contains((dummy1.address, 39))
+        )
+        scenario.verify(auction.data.proceeds == sp.tez(0))
+        scenario.verify(dummy1.balance == sp.tez(0))
+
+        # When Dummy 1 claims the rest
+        scenario += auction.claim(20).run(sender=dummy1.address, now=sp.timestamp(10))
+
+        # Then the last 10 NFTs are minted, 50 tez go to the proceeds and Dummy 1 gets a refund of 10 tez
+        scenario.verify(
+            fa2_nft.data.ledger.contains((dummy1.address, 40)) & fa2_nft.data.ledger.contains((dummy1.address, 49))
+        )
+        scenario.verify(~fa2_nft.data.ledger.contains((dummy1.address, 50)))
+        scenario.verify(auction.data.proceeds == sp.tez(50))
+        scenario.verify(dummy1.balance == sp.tez(10))
+        scenario.verify(~auction.data.accounts.contains(dummy1.address))
+
+    #########
+    # settle
+    #########
+
+    @sp.add_test(name="claim and settle pay out winners who bid exactly the clearing price")
+    def test():
+        scenario = sp.test_scenario()
+
+        fa2_nft = Fa2_NFT.FA2(
+            Fa2_NFT.FA2_config(),
+            sp.utils.metadata_of_url("https://example/com"),
+            Addresses.ADMIN,
+        )
+        auction = BatchAuction(total_supply=10, nft_contract_address=fa2_nft.address)
+
+        scenario += fa2_nft
+        scenario += auction
+
+        # update admin of the NFT contract for minting
+        scenario += fa2_nft.set_administrator(auction.address).run(sender=Addresses.ADMIN)
+
+        # ALICE and JOHN bid the clearing price, BOB bids above it
+        scenario += auction.place_bid(price=1000000, quantity=4).run(sender=Addresses.ALICE, amount=sp.tez(4))
+        scenario += auction.place_bid(price=2000000, quantity=3).run(sender=Addresses.BOB, amount=sp.tez(6))
+        scenario += auction.place_bid(price=1000000, quantity=3).run(sender=Addresses.JOHN, amount=sp.tez(3))
+
+        scenario += auction.finalize().run(now=sp.timestamp(10))
+        scenario.verify(auction.data.clearing_price == sp.tez(1))
+
+        # ALICE's claim has nothing to refund, and no transfer is made
+        scenario += auction.claim(10).run(sender=Addresses.ALICE, now=sp.timestamp(10))
+        scenario.verify(~auction.data.accounts.contains(Addresses.ALICE))
+        scenario.verify(auction.balance == sp.tez(13))
+
+        # settle goes past JOHN's account, which has nothing to refund either
+        scenario += auction.settle(max_accounts=3, max_mints=10).run(sender=Addresses.ADMIN, now=sp.timestamp(10))
+        scenario.verify(auction.data.settlement_cursor == 3)
+        scenario.verify(~auction.data.accounts.contains(Addresses.JOHN))
+
+        # Only BOB got a refund
+        scenario.verify(auction.data.proceeds == sp.tez(10))
+        scenario.verify(auction.balance == sp.tez(10))
+
+    @sp.add_test(name="settle settles pending accounts in batches")
+    def test():
+        scenario = sp.test_scenario()
+
+        dummy1 = Dummy.Dummy()
+        dummy2 = Dummy.Dummy()
+        dummy3 = Dummy.Dummy()
+        dummy_admin = Dummy.Dummy()
+        fa2_nft = Fa2_NFT.FA2(
+            Fa2_NFT.FA2_config(),
+            sp.utils.metadata_of_url("https://example/com"),
+            Addresses.ADMIN,
+        )
+        auction = BatchAuction(
+            admin=dummy_admin.address,
+            nft_contract_address=fa2_nft.address,
+        )
+
+        scenario += fa2_nft
+        scenario += dummy1
+        scenario += dummy2
+        scenario += dummy3
+        scenario += dummy_admin
+        scenario += auction
+
+        # update admin of the NFT contract for minting
+        scenario += fa2_nft.set_administrator(auction.address).run(sender=Addresses.ADMIN)
+
+        # Dummy 1 bids for 40 NFTs at 1 tez, Dummy 2 for 60 NFTs at 1.5 tez and Dummy 3 for 20 NFTs at
+        # 2 tez, which cuts Dummy 1's bid down to 20 NFTs
+        scenario += auction.place_bid(price=1000000, quantity=40).run(sender=dummy1.address, amount=sp.tez(40))
+        scenario += auction.place_bid(price=1500000, quantity=60).run(sender=dummy2.address, amount=sp.tez(90))
+        scenario += auction.place_bid(price=2000000, quantity=20).run(sender=dummy3.address, amount=sp.tez(40))
+
+        # The accounts are indexed in creation order
+        scenario.verify(auction.data.account_count == 3)
+        scenario.verify(auction.data.account_addresses[0] == dummy1.address)
+        scenario.verify(auction.data.account_addresses[1] == dummy2.address)
+        scenario.verify(auction.data.account_addresses[2] == dummy3.address)
+
+        # Settling fails before the auction is finalized
+        scenario += auction.settle(max_accounts=2, max_mints=100).run(
+            sender=Addresses.JOHN,
+            now=sp.timestamp(10),
+            valid=False,
+            exception=Errors.AUCTION_NOT_SETTLED,
+        )
+
+        # NOTICE: The clearing price is 1 tez or 1000000 mutez
+        scenario += auction.finalize().run(now=sp.timestamp(10))
+
+        # When Dummy 2 claims its 60 NFTs by itself
+        scenario += auction.claim(100).run(sender=dummy2.address, now=sp.timestamp(10))
+
+        # and JOHN settles two accounts with a budget of 10 NFTs
+        scenario += auction.settle(max_accounts=2, max_mints=10).run(sender=Addresses.JOHN, now=sp.timestamp(10))
+
+        # Then Dummy 1 gets 10 of its 20 NFTs, and its account is resumed by the next call
+        scenario.verify(auction.data.settlement_cursor == 0)
+        scenario.verify(auction.data.accounts[dummy1.address].minted == 10)
+        scenario.verify(dummy1.balance == sp.tez(0))
+
+        # When JOHN settles two accounts with a budget of 100 NFTs
+        scenario += auction.settle(max_accounts=2, max_mints=100).run(sender=Addresses.JOHN, now=sp.timestamp(10))
+
+        # Then Dummy 1 gets its remaining 10 NFTs and a refund of 20 tez, and Dummy 2 is skipped
+        scenario.verify(auction.data.settlement_cursor == 2)
+        scenario.verify(~auction.data.accounts.contains(dummy1.address))
+        scenario.verify(dummy1.balance == sp.tez(20))
+        scenario.verify(dummy2.balance == sp.tez(30))
+        scenario.verify(
+            fa2_nft.data.ledger.contains((dummy1.address, 60)) & fa2_nft.data.ledger.contains((dummy1.address, 79))
+        )
+
+        # Dummy 3 is still pending
+        scenario.verify(auction.data.accounts.contains(dummy3.address))
+
+        # When JOHN settles up to five more accounts
+        scenario += auction.settle(max_accounts=5, max_mints=100).run(sender=Addresses.JOHN, now=sp.timestamp(10))
+
+        # Then Dummy 3 gets its 20 NFTs and a refund of 20 tez
+        scenario.verify(auction.data.settlement_cursor == 3)
+        scenario.verify(~auction.data.accounts.contains(dummy3.address))
+        scenario.verify(dummy3.balance == sp.tez(20))
+        scenario.verify(
+            fa2_nft.data.ledger.contains((dummy3.address, 80)) & fa2_nft.data.ledger.contains((dummy3.address, 99))
+        )
+
+        # The proceeds hold the cost of the 100 NFTs, which is all that is left in the auction contract
+        scenario.verify(auction.data.proceeds == sp.tez(100))
+        scenario.verify(auction.balance == sp.tez(100))
+
+        # Settling fails once every account is settled
+        scenario += auction.settle(max_accounts=1, max_mints=100).run(
+            sender=Addresses.JOHN,
+            now=sp.timestamp(10),
+            valid=False,
+            exception=Errors.NOTHING_TO_SETTLE,
+        )
 
     #########
     # reveal
@@ -647,5 +2453,57 @@ if __name__ == "__main__":
         scenario.verify_equal(fa2_nft.data.token_metadata[0], metadata[0])
         scenario.verify_equal(fa2_nft.data.token_metadata[1], metadata[1])
 
+    ###################
+    # Lazy entrypoints
+    ###################
+
+    @sp.add_test(name="lazy entrypoints settle the auction like the inlined ones")
+    def test():
+        scenario = sp.test_scenario()
+
+        dummy_admin = Dummy.Dummy()
+        fa2_nft = Fa2_NFT.FA2(
+            Fa2_NFT.FA2_config(),
+            sp.utils.metadata_of_url("https://example/com"),
+            Addresses.ADMIN,
+        )
+        auction = BatchAuction(admin=dummy_admin.address, nft_contract_address=fa2_nft.address, lazy_entry_points=True)
+
+        scenario += fa2_nft
+        scenario += dummy_admin
+        scenario += auction
+
+        # update admin of the NFT contract for minting
+        scenario += fa2_nft.set_administrator(auction.address).run(sender=Addresses.ADMIN)
+
+        # Bids go through the non-lazy entrypoints
+        scenario += auction.place_bid(price=1000000, quantity=40).run(
+            sender=Addresses.ALICE,
+            amount=sp.tez(40),
+            now=sp.timestamp(5),
+        )
+        scenario += auction.place_bid(price=1500000, quantity=60).run(
+            sender=Addresses.BOB,
+            amount=sp.tez(90),
+            now=sp.timestamp(5),
+        )
+
+        # finalize, claim and withdraw_proceeds are loaded from the storage
+        scenario += auction.finalize().run(now=sp.timestamp(10))
+        scenario.verify(auction.data.clearing_price == sp.tez(1))
+
+        scenario += auction.claim(100).run(sender=Addresses.ALICE, now=sp.timestamp(10))
+        scenario += auction.claim(100).run(sender=Addresses.BOB, now=sp.timestamp(10))
+
+        # Both bidders pay the clearing price, BOB gets the rest of its 90 tez back
+        scenario.verify(auction.data.proceeds == sp.tez(100))
+        scenario.verify(auction.balance == sp.tez(100))
+        scenario.verify(
+            fa2_nft.data.ledger.contains((Addresses.ALICE, 0)) & fa2_nft.data.ledger.contains((Addresses.BOB, 99))
+        )
+
+        scenario += auction.withdraw_proceeds().run(sender=dummy_admin.address)
+        scenario.verify(dummy_admin.balance == sp.tez(100))
+
 
 sp.add_compilation_target("batch_auction", BatchAuction())
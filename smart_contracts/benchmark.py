@@ -0,0 +1,191 @@
+import smartpy as sp
+
+Auction = sp.io.import_script_from_url("file:batch_auction.py")
+Addresses = sp.io.import_script_from_url("file:helpers/addresses.py")
+Dummy = sp.io.import_script_from_url("file:helpers/dummy.py")
+Fa2_NFT = sp.io.import_script_from_url("file:helpers/fa2_NFT.py")
+
+#########################
+# Benchmark Fixtures
+#########################
+
+# Number of bids in the pre-populated queue for each benchmark
+QUEUE_SIZES = [10, 100, 1000, 10000]
+
+# Price of the lowest bid in the fixtures, in mutez
+BASE_PRICE = 1000000
+
+# Price increment between consecutive bids, in mutez
+PRICE_STEP = 1000
+
+# Bidders owning the fixture bids, in round robin
+BIDDERS = [Addresses.ALICE, Addresses.BOB, Addresses.JOHN]
+
+# Fan-outs of the bids priority queue compared by the place_bid benchmarks
+HEAP_ARITIES = [2, 4, 8]
+
+
+def bid_price(bid_id):
+    return BASE_PRICE + (bid_id - 1) * PRICE_STEP
+
+
+def make_auction(n, settled=False, **kwargs):
+    # N single-NFT bids with increasing prices that fill the whole supply. Since the bids are created
+    # in increasing price order, mapping queue index i to bid i is a valid min heap of any arity. A
+    # settled fixture is the same auction right after `finalize`.
+    bids = {}
+    quantities = {bidder: 0 for bidder in BIDDERS}
+    balances = {bidder: 0 for bidder in BIDDERS}
+    for bid_id in range(1, n + 1):
+        price = bid_price(bid_id)
+        bidder = BIDDERS[bid_id % len(BIDDERS)]
+        bids[bid_id] = sp.record(quantity=1, price=sp.mutez(price), bidder=bidder)
+        quantities[bidder] += 1
+        balances[bidder] += price
+
+    if settled:
+        kwargs.update(
+            clearing_price=sp.mutez(BASE_PRICE),
+            winning_quantity=n,
+            settled=True,
+        )
+    else:
+        kwargs.update(
+            bids_priority_queue=sp.big_map(
+                {i: sp.record(price=sp.mutez(bid_price(i)), quantity=1, bid_id=i) for i in range(1, n + 1)}
+            ),
+            heap_positions=sp.big_map({i: i for i in range(1, n + 1)}),
+            queue_size=n,
+        )
+
+    return Auction.BatchAuction(
+        next_bid_id=n,
+        bids=sp.big_map(bids),
+        accounts=sp.big_map(
+            {
+                bidder: sp.record(balance=sp.mutez(balances[bidder]), winning_quantity=quantities[bidder], minted=0)
+                for bidder in BIDDERS
+            }
+        ),
+        account_addresses=sp.big_map({i: bidder for i, bidder in enumerate(BIDDERS)}),
+        account_count=len(BIDDERS),
+        quantity_under_bid=n,
+        total_supply=n,
+        **kwargs,
+    )
+
+
+def make_nft():
+    return Fa2_NFT.FA2(
+        Fa2_NFT.FA2_config(),
+        sp.utils.metadata_of_url("https://example.com"),
+        Addresses.ADMIN,
+    )
+
+
+if __name__ == "__main__":
+    ###############################################
+    # Fixture sanity (the calls that get measured)
+    ###############################################
+
+    @sp.add_test(name="benchmark fixture supports the measured calls")
+    def test():
+        scenario = sp.test_scenario()
+
+        n = QUEUE_SIZES[0]
+
+        fa2_nft = make_nft()
+        scenario += fa2_nft
+
+        auction = make_auction(n, nft_contract_address=fa2_nft.address)
+        auction.set_initial_balance(sp.tez(1000))
+        scenario += auction
+
+        # update admin of the NFT contract for minting
+        scenario += fa2_nft.set_administrator(auction.address).run(sender=Addresses.ADMIN)
+
+        # place_bid evicts the lowest bid of a full queue
+        top_price = BASE_PRICE + n * PRICE_STEP
+        scenario += auction.place_bid(price=top_price, quantity=1).run(
+            sender=Addresses.ALICE,
+            amount=sp.utils.nat_to_mutez(top_price),
+            now=sp.timestamp(5),
+        )
+        scenario.verify(auction.data.queue_size == n)
+        scenario.verify(auction.data.quantity_under_bid == n)
+
+        # place_bid barely above the lowest bid swims the new bid up to the root
+        low_price = bid_price(2) + PRICE_STEP // 2
+        scenario += auction.place_bid(price=low_price, quantity=1).run(
+            sender=Addresses.BOB,
+            amount=sp.utils.nat_to_mutez(low_price),
+            now=sp.timestamp(5),
+        )
+        scenario.verify(auction.data.bids_priority_queue[1].bid_id == n + 2)
+
+        # place_bids evicts one of the lowest bids per bid of the list
+        batch_prices = [top_price + (i + 1) * PRICE_STEP for i in range(10)]
+        scenario += auction.place_bids([sp.record(price=price, quantity=1) for price in batch_prices]).run(
+            sender=Addresses.JOHN,
+            amount=sp.utils.nat_to_mutez(sum(batch_prices)),
+            now=sp.timestamp(5),
+        )
+        scenario.verify(auction.data.queue_size == n)
+        scenario.verify(auction.data.next_bid_id == n + 12)
+
+        # increase_bid sinks the lowest of JOHN's bids to the bottom of the queue
+        scenario += auction.increase_bid(bid_id=n + 3, price=top_price + 11 * PRICE_STEP).run(
+            sender=Addresses.JOHN,
+            amount=sp.utils.nat_to_mutez(10 * PRICE_STEP),
+            now=sp.timestamp(5),
+        )
+        scenario.verify(auction.data.heap_positions[n + 3] > 1)
+
+        # cancel_bid removes ALICE's surviving bid from the queue
+        scenario += auction.cancel_bid(n + 1).run(sender=Addresses.ALICE, now=sp.timestamp(5))
+        scenario.verify(~auction.data.heap_positions.contains(n + 1))
+        scenario.verify(auction.data.queue_size == n - 1)
+
+        # finalize snapshots the clearing price
+        scenario += auction.finalize().run(now=sp.timestamp(10))
+
+        # claim settles the claimer's account
+        scenario += auction.claim(n).run(sender=Addresses.ALICE, now=sp.timestamp(10))
+        scenario.verify(~auction.data.accounts.contains(Addresses.ALICE))
+
+        # settle settles the remaining accounts and skips the claimed one
+        scenario += auction.settle(max_accounts=len(BIDDERS), max_mints=n).run(
+            sender=Addresses.ADMIN, now=sp.timestamp(10)
+        )
+        scenario.verify(auction.data.settlement_cursor == len(BIDDERS))
+
+        # reveal_metadata forwards the metadata to the NFT contract
+        scenario += auction.reveal_metadata(
+            [sp.record(token_id=0, token_info={"": sp.utils.bytes_of_string("https://reveal.com")})]
+        ).run(sender=Addresses.ADMIN)
+
+
+#######################################################################
+# Compilation targets measured by benchmarks/run.py (per queue size)
+#######################################################################
+
+sp.add_compilation_target("bench_nft", make_nft())
+
+for n in QUEUE_SIZES:
+    sp.add_compilation_target("bench_auction_%d" % n, make_auction(n))
+    sp.add_compilation_target("bench_settled_%d" % n, make_auction(n, settled=True))
+
+    # The default (binary) heap is measured by bench_auction_N
+    for heap_arity in HEAP_ARITIES[1:]:
+        sp.add_compilation_target(
+            "bench_auction_%d_%dary" % (n, heap_arity),
+            make_auction(n, heap_arity=heap_arity),
+        )
+
+    # SmartPy's default storage layout, to compare against the tuned one
+    sp.add_compilation_target("bench_auction_%d_default_layout" % n, make_auction(n, storage_layout=None))
+    sp.add_compilation_target("bench_settled_%d_default_layout" % n, make_auction(n, settled=True, storage_layout=None))
+
+    # Cold entrypoints stored as lambdas in a big_map
+    sp.add_compilation_target("bench_auction_%d_lazy" % n, make_auction(n, lazy_entry_points=True))
+    sp.add_compilation_target("bench_settled_%d_lazy" % n, make_auction(n, settled=True, lazy_entry_points=True))
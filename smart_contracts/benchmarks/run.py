@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+"""
+Gas and storage scaling benchmarks for the batch auction entrypoints.
+
+The fixtures and compilation targets are defined in `benchmark.py`: one auction per queue size, with
+`bids`, `bids_priority_queue` and `accounts` pre-populated. Every case
+below is simulated with `octez-client run script` in mockup mode, against the compiled Michelson and
+initial storage of the fixture, and reports:
+
+- gas       : Gas consumed by the call, storage deserialization included
+- storage   : Bytes of big_map entries written or removed (binary key + value of every set entry, binary key
+              of every removed one)
+- diffs     : Number of big_map diff entries of any kind (set, removal, allocation, copy, clear)
+- operations: Number of internal operations emitted
+- script    : Size of the binary encoded contract (without the lambdas of lazy entrypoints, which
+              live in the storage and are only deserialized by the entrypoint they implement)
+
+Usage (from the smart_contracts folder):
+
+    $ python3 benchmarks/run.py                    # measure, write the reports and check the baseline
+    $ python3 benchmarks/run.py --update-baseline  # measure and record the new baseline
+"""
+
+import argparse
+import csv
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+
+# Expected location of SmartPy CLI (same as compile.sh)
+SMART_PY_CLI = os.path.expanduser("~/smartpy-cli/SmartPy.sh")
+
+# Octez client used for the simulations
+OCTEZ_CLIENT = os.environ.get("OCTEZ_CLIENT", "octez-client")
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_FILE = os.path.join(BENCH_DIR, "baseline.json")
+
+# Must match benchmark.py
+QUEUE_SIZES = [10, 100, 1000, 10000]
+HEAP_ARITIES = [2, 4, 8]
+
+# Number of bids sent in the place_bids case
+BATCH_SIZE = 10
+
+# Number of NFTs minted in the claim_chunk case (below ALICE's allocation from N = 100 on)
+CLAIM_CHUNK = 10
+
+# Quantity of the place_bid_deferred case, whose single-NFT evictions exceed the eviction budget from
+# N = 100 on (capped by the supply for smaller fixtures)
+DEFERRED_QUANTITY = 100
+
+# ALICE's bid modified by the cancel_bid and increase_bid cases (the fixture bidders take turns, so
+# ALICE owns every third bid)
+MODIFIED_BID = 3
+BASE_PRICE = 1000000
+PRICE_STEP = 1000
+ALICE = "tz1KfEsrtDaA1sX7vdM4qmEPWuSytuqCDp5j"
+ADMIN = "tz1ZczbHu1iLWRa88n9CUiCKDGex5ticp19S"
+NFT_PLACEHOLDER = "tz1VyBpzPZSpYHpqKzvVHWGs8vSuoiBHmZSN"
+
+# Timestamps inside and after the fixtures' bidding period
+DURING_BIDDING = "1970-01-01T00:00:05Z"
+AFTER_BIDDING = "1970-01-01T00:00:10Z"
+
+# Gas limit handed to the simulations (the hard gas limit per operation)
+GAS_LIMIT = 1040000
+
+# Metrics compared against the baseline
+METRICS = ["gas", "storage", "diffs", "operations", "script"]
+
+
+def auction_target(n, heap_arity):
+    if heap_arity == HEAP_ARITIES[0]:
+        return "bench_auction_%d" % n
+    return "bench_auction_%d_%dary" % (n, heap_arity)
+
+
+def cases(n):
+    """Calls measured against the fixture holding n bids."""
+    top_price = BASE_PRICE + n * PRICE_STEP
+    low_price = BASE_PRICE + PRICE_STEP // 2
+
+    place_bid_cases = []
+    for heap_arity in HEAP_ARITIES:
+        suffix = "" if heap_arity == HEAP_ARITIES[0] else "_%dary" % heap_arity
+        place_bid_cases += [
+            # Outbids the lowest bid of the full queue: one eviction (sinking the last node from the
+            # root) plus an insertion that stays at the bottom
+            dict(
+                name="place_bid" + suffix,
+                target=auction_target(n, heap_arity),
+                entrypoint="place_bid",
+                arg="Pair %d 1" % top_price,
+                amount=top_price,
+                source=ALICE,
+                now=DURING_BIDDING,
+            ),
+            # Barely outbids the lowest bid: the new bid swims all the way up to the root
+            dict(
+                name="place_bid_swim" + suffix,
+                target=auction_target(n, heap_arity),
+                entrypoint="place_bid",
+                arg="Pair %d 1" % low_price,
+                amount=low_price,
+                source=ALICE,
+                now=DURING_BIDDING,
+            ),
+        ]
+
+    # The place_bid and claim cases against SmartPy's default storage layout, where the fields sit in a
+    # balanced tree instead of the tuned right comb
+    layout_cases = [
+        dict(place_bid_cases[0], name="place_bid_default_layout", target="bench_auction_%d_default_layout" % n),
+        dict(
+            name="claim_default_layout",
+            target="bench_settled_%d_default_layout" % n,
+            entrypoint="claim",
+            arg="%d" % n,
+            amount=0,
+            source=ALICE,
+            now=AFTER_BIDDING,
+        ),
+    ]
+
+    # Ten single-NFT bids above the whole queue, each one evicting one of the lowest bids
+    batch_prices = [top_price + i * PRICE_STEP for i in range(BATCH_SIZE)]
+
+    measured = (
+        place_bid_cases
+        + layout_cases
+        + [
+            dict(
+                name="place_bids",
+                target=auction_target(n, HEAP_ARITIES[0]),
+                entrypoint="place_bids",
+                arg="{ %s }" % " ; ".join("Pair %d 1" % price for price in batch_prices),
+                amount=sum(batch_prices),
+                source=ALICE,
+                now=DURING_BIDDING,
+            ),
+            # Needs one eviction per NFT: the gas stays bounded by the eviction budget whatever the quantity
+            dict(
+                name="place_bid_deferred",
+                target=auction_target(n, HEAP_ARITIES[0]),
+                entrypoint="place_bid",
+                arg="Pair %d %d" % (top_price, min(n, DEFERRED_QUANTITY)),
+                amount=top_price * min(n, DEFERRED_QUANTITY),
+                source=ALICE,
+                now=DURING_BIDDING,
+            ),
+            # Removes a bid from the third slot of the heap: the last node takes its place and sinks
+            dict(
+                name="cancel_bid",
+                target=auction_target(n, HEAP_ARITIES[0]),
+                entrypoint="cancel_bid",
+                arg="%d" % MODIFIED_BID,
+                amount=0,
+                source=ALICE,
+                now=DURING_BIDDING,
+            ),
+            # Raises a bid above the whole queue: it sinks all the way to the bottom
+            dict(
+                name="increase_bid",
+                target=auction_target(n, HEAP_ARITIES[0]),
+                entrypoint="increase_bid",
+                arg="Pair %d %d" % (MODIFIED_BID, top_price),
+                amount=top_price - (BASE_PRICE + (MODIFIED_BID - 1) * PRICE_STEP),
+                source=ALICE,
+                now=DURING_BIDDING,
+            ),
+            # Snapshots the clearing price and drops the queue
+            dict(
+                name="finalize",
+                target="bench_auction_%d" % n,
+                entrypoint="finalize",
+                arg="Unit",
+                amount=0,
+                source=ADMIN,
+                now=AFTER_BIDDING,
+            ),
+            # Settles ALICE's account, which won n / 3 NFTs
+            dict(
+                name="claim",
+                target="bench_settled_%d" % n,
+                entrypoint="claim",
+                arg="%d" % n,
+                amount=0,
+                source=ALICE,
+                now=AFTER_BIDDING,
+            ),
+            # Mints a chunk of ALICE's NFTs, leaving the account open
+            dict(
+                name="claim_chunk",
+                target="bench_settled_%d" % n,
+                entrypoint="claim",
+                arg="%d" % CLAIM_CHUNK,
+                amount=0,
+                source=ALICE,
+                now=AFTER_BIDDING,
+            ),
+            # Settles the three fixture accounts in one call
+            dict(
+                name="settle",
+                target="bench_settled_%d" % n,
+                entrypoint="settle",
+                arg="Pair 3 %d" % n,
+                amount=0,
+                source=ADMIN,
+                now=AFTER_BIDDING,
+            ),
+            dict(
+                name="reveal_metadata",
+                target="bench_settled_%d" % n,
+                entrypoint="reveal_metadata",
+                arg='{ Pair 0 { Elt "" 0x68747470733a2f2f72657665616c2e636f6d } }',
+                amount=0,
+                source=ADMIN,
+                now=AFTER_BIDDING,
+            ),
+        ]
+    )
+
+    # The place_bid, finalize, claim and reveal_metadata cases with lazy entrypoints: place_bid no longer
+    # deserializes the code of the cold entrypoints, which load theirs from the storage instead
+    lazy_cases = [
+        dict(case, name=case["name"] + "_lazy", target=case["target"] + "_lazy")
+        for case in measured
+        if case["name"] in ("place_bid", "finalize", "claim", "reveal_metadata")
+    ]
+
+    return measured + lazy_cases
+
+
+def run(*args, **kwargs):
+    return subprocess.run(args, check=True, capture_output=True, text=True, **kwargs).stdout
+
+
+class Octez:
+    def __init__(self, base_dir):
+        self.base_dir = base_dir
+
+    def client(self, *args):
+        return run(OCTEZ_CLIENT, "--mode", "mockup", "--base-dir", self.base_dir, *args)
+
+    def binary_size(self, expression, kind="data"):
+        hex_output = self.client("convert", kind, expression, "from", "michelson", "to", "binary")
+        return len(hex_output.strip().replace("0x", "")) // 2
+
+
+def compile_targets(out_dir):
+    run(SMART_PY_CLI, "compile", "benchmark.py", out_dir)
+
+    def read(target, kind):
+        with open(os.path.join(out_dir, target, "step_000_cont_0_%s.tz" % kind)) as f:
+            return f.read()
+
+    return read
+
+
+def parse_gas(trace):
+    # Remaining gas is reported on every trace line, the last one gives the total consumption
+    remaining = re.findall(r"remaining gas: ([0-9.]+)", trace)
+    if remaining:
+        return round(GAS_LIMIT - float(remaining[-1]), 3)
+    return round(sum(float(g) for g in re.findall(r"just consumed gas: ([0-9.]+)", trace)), 3)
+
+
+def parse_output(octez, output):
+    sections = re.split(r"^(storage|emitted operations|big_map diff|trace)$", output, flags=re.M)
+    parts = dict(zip(sections[1::2], sections[2::2]))
+
+    operations = len(re.findall(r"^\s+Internal \w+:?", parts.get("emitted operations", ""), flags=re.M))
+
+    # Every line of the section is a diff entry: "Set map(n)[key] to value", "Unset map(n)[key]", "New map(n) of
+    # type ...", "Copy map(n) to map(m)" or "Clear map(n)"
+    diff_lines = [line.strip() for line in parts.get("big_map diff", "").splitlines() if line.strip()]
+
+    storage = 0
+    for line in diff_lines:
+        set_entry = re.match(r"Set map\(-?\d+\)\[(.+?)\] to (.+)$", line)
+        unset_entry = re.match(r"Unset map\(-?\d+\)\[(.+)\]$", line)
+        if set_entry:
+            storage += octez.binary_size(set_entry.group(1)) + octez.binary_size(set_entry.group(2))
+        elif unset_entry:
+            storage += octez.binary_size(unset_entry.group(1))
+
+    return dict(gas=parse_gas(parts.get("trace", "")), storage=storage, diffs=len(diff_lines), operations=operations)
+
+
+def measure():
+    work_dir = tempfile.mkdtemp(prefix="bench_")
+    try:
+        read = compile_targets(os.path.join(work_dir, "out"))
+
+        octez = Octez(os.path.join(work_dir, "mockup"))
+        octez.client("create", "mockup")
+
+        # The NFT contract has to exist for claim and reveal_metadata to emit their operations
+        octez.client(
+            "originate",
+            "contract",
+            "bench_nft",
+            "transferring",
+            "0",
+            "from",
+            "bootstrap1",
+            "running",
+            read("bench_nft", "contract"),
+            "--init",
+            read("bench_nft", "storage"),
+            "--burn-cap",
+            "10",
+        )
+        nft_address = octez.client("show", "known", "contract", "bench_nft").strip()
+
+        # Large storages exceed the command line limits, the client reads them from a file instead
+        def prepare(target):
+            storage_file = os.path.join(work_dir, "%s_storage.tz" % target)
+            with open(storage_file, "w") as f:
+                f.write(read(target, "storage").replace(NFT_PLACEHOLDER, nft_address))
+            contract_file = os.path.join(work_dir, "out", target, "step_000_cont_0_contract.tz")
+            return contract_file, storage_file, octez.binary_size(contract_file, kind="script")
+
+        results = []
+        for n in QUEUE_SIZES:
+            for case in cases(n):
+                contract_file, storage_file, script_size = prepare(case["target"])
+                output = octez.client(
+                    "run",
+                    "script",
+                    contract_file,
+                    "on",
+                    "storage",
+                    "file:" + storage_file,
+                    "and",
+                    "input",
+                    case["arg"],
+                    "--entrypoint",
+                    case["entrypoint"],
+                    "--amount",
+                    "%.6f" % (case["amount"] / 1000000),
+                    "--balance",
+                    "1000000",
+                    "--source",
+                    case["source"],
+                    "--payer",
+                    case["source"],
+                    "--now",
+                    case["now"],
+                    "--gas",
+                    str(GAS_LIMIT),
+                    "--trace-stack",
+                )
+                row = dict(case=case["name"], queue_size=n, script=script_size)
+                row.update(parse_output(octez, output))
+                results.append(row)
+                print(
+                    "%-24s N=%-6d gas=%-12s storage=%-6d diffs=%-4d operations=%-3d script=%d"
+                    % (row["case"], n, row["gas"], row["storage"], row["diffs"], row["operations"], row["script"])
+                )
+
+        return results
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def write_reports(results, out_prefix):
+    with open(out_prefix + ".json", "w") as f:
+        json.dump(results, f, indent=2)
+
+    with open(out_prefix + ".csv", "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["case", "queue_size"] + METRICS)
+        writer.writeheader()
+        writer.writerows(results)
+
+
+def check_baseline(results, tolerance):
+    # A missing baseline fails the run, otherwise regressions would go unnoticed
+    if not os.path.exists(BASELINE_FILE):
+        print("No baseline at %s, run with --update-baseline to record one and commit it" % BASELINE_FILE)
+        return False
+
+    with open(BASELINE_FILE) as f:
+        baseline = {(row["case"], row["queue_size"]): row for row in json.load(f)}
+
+    ok = True
+    for row in results:
+        base = baseline.get((row["case"], row["queue_size"]))
+        if base is None:
+            ok = False
+            print(
+                "MISSING %s N=%d: not in the baseline, record it with --update-baseline"
+                % (row["case"], row["queue_size"])
+            )
+            continue
+        for metric in METRICS:
+            if metric not in base:
+                ok = False
+                print("MISSING %s N=%d %s: not in the baseline" % (row["case"], row["queue_size"], metric))
+                continue
+            if row[metric] > base[metric] * (1 + tolerance):
+                ok = False
+                print(
+                    "REGRESSION %s N=%d %s: %s -> %s"
+                    % (row["case"], row["queue_size"], metric, base[metric], row[metric])
+                )
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--update-baseline", action="store_true", help="record the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.02, help="relative increase tolerated per metric")
+    parser.add_argument("--out", default=os.path.join(BENCH_DIR, "report"), help="report path, without extension")
+    args = parser.parse_args()
+
+    results = measure()
+    write_reports(results, args.out)
+
+    if args.update_baseline:
+        shutil.copyfile(args.out + ".json", BASELINE_FILE)
+        print("Baseline written to %s" % BASELINE_FILE)
+    elif not check_baseline(results, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
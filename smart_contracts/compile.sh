@@ -16,7 +16,7 @@ OUT_DIR=./test_outputs
 COMP_DIR=./michelson
 
 # Array of files to compile.
-CONTRACTS_ARRAY=(batch_auction)
+CONTRACTS_ARRAY=(batch_auction price_level_auction merkle_auction log_auction linked_list_auction)
 
 # Ensure we have a SmartPy binary.
 if [ ! -f "$SMART_PY_CLI" ]; then
@@ -51,6 +51,14 @@ function processContract {
     echo ">>> [3 / 3] Copying Artifacts"
     cp $OUT_DIR/$CONTRACT_COMPILED $COMP_DIR/$CONTRACT_OUT
     echo ">>> Written to ${CONTRACT_OUT}"
+
+    # TZIP-16 metadata of the contracts exposing off-chain views
+    for METADATA in $OUT_DIR/${CONTRACT_NAME}/step_000_cont_0_metadata.*.json; do
+        if [ -f "$METADATA" ]; then
+            cp $METADATA $COMP_DIR/${CONTRACT_NAME}_metadata.json
+            echo ">>> Written to ${CONTRACT_NAME}_metadata.json"
+        fi
+    done
 }
 
 echo "> [1 / 3] Unit Testing and Compiling Contracts."
@@ -559,6 +559,40 @@ class FA2_mint(FA2_core):
         if self.config.store_total_supply:
             self.data.total_supply[params.token_id] = params.amount + self.data.total_supply.get(params.token_id, default_value = 0)
 
+    # CHANGED: custom entry-point to mint a consecutive range of NFTs (one
+    # token each) to the same owner in a single operation
+    @sp.entry_point
+    def mint_batch(self, params):
+        sp.set_type(params, sp.TRecord(
+                first_token_id=sp.TNat,
+                count=sp.TNat,
+                address=sp.TAddress,
+                metadata=sp.TMap(sp.TString, sp.TBytes),
+            )
+        )
+        sp.verify(self.is_administrator(sp.sender), message = self.error_message.not_admin())
+        if self.config.single_asset:
+            sp.verify((params.first_token_id == 0) & (params.count <= 1), message = "single-asset: token-id <> 0")
+        sp.for token_id in sp.range(params.first_token_id, params.first_token_id + params.count):
+            if self.config.non_fungible:
+                sp.verify(
+                    ~ self.token_id_set.contains(self.data.all_tokens, token_id),
+                    message = "NFT-asset: cannot mint twice same token"
+                )
+            user = self.ledger_key.make(params.address, token_id)
+            sp.if self.data.ledger.contains(user):
+                self.data.ledger[user].balance += 1
+            sp.else:
+                self.data.ledger[user] = Ledger_value.make(1)
+            sp.if ~ self.token_id_set.contains(self.data.all_tokens, token_id):
+                self.token_id_set.add(self.data.all_tokens, token_id)
+                self.data.token_metadata[token_id] = sp.record(
+                    token_id    = token_id,
+                    token_info  = params.metadata
+                )
+            if self.config.store_total_supply:
+                self.data.total_supply[token_id] = 1 + self.data.total_supply.get(token_id, default_value = 0)
+
 class FA2_token_metadata(FA2_core):
     def set_token_metadata_view(self):
         def token_metadata(self, tok):
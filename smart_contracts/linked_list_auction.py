@@ -0,0 +1,395 @@
+import smartpy as sp
+
+SortedBidList = sp.io.import_script_from_url("file:utilities/sorted_bid_list.py")
+Reveal = sp.io.import_script_from_url("file:utilities/reveal.py")
+Proceeds = sp.io.import_script_from_url("file:utilities/proceeds.py")
+Claims = sp.io.import_script_from_url("file:utilities/claims.py")
+AuctionTypes = sp.io.import_script_from_url("file:types/auction.py")
+Errors = sp.io.import_script_from_url("file:types/errors.py")
+Addresses = sp.io.import_script_from_url("file:helpers/addresses.py")
+Dummy = sp.io.import_script_from_url("file:helpers/dummy.py")
+Fa2_NFT = sp.io.import_script_from_url("file:helpers/fa2_NFT.py")
+
+#################
+# Default Values
+#################
+
+# Minimum bid price per NFT
+MIN_BID_PRICE = sp.mutez(100000)
+
+# Timestamp at which bidding starts
+BIDDING_START = sp.timestamp(0)
+
+# Timestamp at which bidding ends
+BIDDING_END = sp.timestamp(10)
+
+# Total supply for the NFTs
+TOTAL_SUPPLY = sp.nat(100)
+
+###########
+# Contract
+###########
+
+
+class LinkedListAuction(sp.Contract, SortedBidList.SortedBidList, Reveal.Reveal, Proceeds.Proceeds, Claims.Claims):
+    def __init__(
+        self,
+        admin=Addresses.ADMIN,
+        bidding_start=BIDDING_START,
+        bidding_end=BIDDING_END,
+        min_bid_price=MIN_BID_PRICE,
+        next_bid_id=sp.nat(0),
+        bids=sp.big_map(
+            l={},
+            tkey=sp.TNat,
+            tvalue=AuctionTypes.BID_TYPE,
+        ),
+        bid_list=sp.big_map(
+            l={},
+            tkey=sp.TNat,
+            tvalue=AuctionTypes.LIST_NODE_TYPE,
+        ),
+        list_head=sp.nat(0),
+        list_tail=sp.nat(0),
+        accounts=sp.big_map(
+            l={},
+            tkey=sp.TAddress,
+            tvalue=AuctionTypes.ACCOUNT_TYPE,
+        ),
+        quantity_under_bid=sp.nat(0),
+        total_supply=TOTAL_SUPPLY,
+        mint_index=sp.nat(0),
+        nft_contract_address=Addresses.NFT,
+        clearing_price=sp.mutez(0),
+        winning_quantity=sp.nat(0),
+        settled=False,
+        proceeds=sp.mutez(0),
+    ):
+        self.init(
+            admin=admin,
+            bidding_start=bidding_start,
+            bidding_end=bidding_end,
+            min_bid_price=min_bid_price,
+            next_bid_id=next_bid_id,
+            bids=bids,
+            bid_list=bid_list,
+            list_head=list_head,
+            list_tail=list_tail,
+            accounts=accounts,
+            quantity_under_bid=quantity_under_bid,
+            total_supply=total_supply,
+            mint_index=mint_index,
+            nft_contract_address=nft_contract_address,
+            clearing_price=clearing_price,
+            winning_quantity=winning_quantity,
+            settled=settled,
+            proceeds=proceeds,
+        )
+
+    @sp.entry_point
+    def place_bid(self, params):
+        sp.set_type(params, sp.TRecord(price=sp.TNat, quantity=sp.TNat, hint=sp.TNat))
+
+        # Verify that bidding period is on-going
+        sp.verify(
+            (sp.now >= self.data.bidding_start) & (sp.now < self.data.bidding_end),
+            Errors.BIDDING_IS_NOT_ACTIVE,
+        )
+
+        # Verify that the price is greater than or equals the minimum bid price
+        sp.verify(sp.utils.nat_to_mutez(params.price) >= self.data.min_bid_price, Errors.BID_PRICE_BELOW_MINIMUM)
+
+        # Verify that the sent tez amount is correct
+        sp.verify(
+            sp.amount == (sp.utils.nat_to_mutez(params.price * params.quantity)),
+            Errors.INVALID_TEZ_AMOUNT,
+        )
+
+        # Track locked funds for the sender
+        with sp.if_(~self.data.accounts.contains(sp.sender)):
+            self.data.accounts[sp.sender] = sp.record(
+                balance=sp.mutez(0),
+                winning_quantity=sp.nat(0),
+                minted=sp.nat(0),
+            )
+        self.data.accounts[sp.sender].balance += sp.amount
+
+        # Supply available for bid
+        available_for_bid = sp.as_nat(self.data.total_supply - self.data.quantity_under_bid)
+
+        # Quantity that would remain unfilled due to limited supply
+        unfilled = sp.local("unfilled", sp.nat(0))
+        with sp.if_(params.quantity > available_for_bid):
+            unfilled.value = sp.as_nat(params.quantity - available_for_bid)
+
+        # If there is unfilled bid quantity, pop the lowest bids from the head of the list until the
+        # current bid is accomodated
+        with sp.if_(unfilled.value > 0):
+            # Allows breaking of loop
+            break_loop = sp.local("break_loop", False)
+            with sp.while_((unfilled.value > 0) & ~break_loop.value):
+                # The list can only run empty if the bid asks for more than the total supply
+                sp.verify(self.data.list_head != 0, Errors.EMPTY_QUEUE)
+
+                # lowest bid
+                head_node = self.data.bid_list[self.data.list_head]
+
+                with sp.if_(head_node.price >= sp.utils.nat_to_mutez(params.price)):
+                    break_loop.value = True
+                with sp.else_():
+                    head_bid = self.data.bids[self.data.list_head]
+                    head_account = self.data.accounts[head_bid.bidder]
+
+                    # If the lowest bid's quantity is less than or equals the unfilled amount,
+                    # delete the entire bid
+                    with sp.if_(head_node.quantity <= unfilled.value):
+                        unfilled.value = sp.as_nat(unfilled.value - head_node.quantity)
+                        self.data.quantity_under_bid = sp.as_nat(self.data.quantity_under_bid - head_node.quantity)
+                        head_account.winning_quantity = sp.as_nat(head_account.winning_quantity - head_node.quantity)
+                        self.pop_head()
+                    # Else reduce the quantity for the lowest bid and set unfilled to zero. The head
+                    # only gets lower, so the list stays sorted.
+                    with sp.else_():
+                        head_node.quantity = sp.as_nat(head_node.quantity - unfilled.value)
+                        head_bid.quantity = sp.as_nat(head_bid.quantity - unfilled.value)
+                        head_account.winning_quantity = sp.as_nat(head_account.winning_quantity - unfilled.value)
+                        self.data.quantity_under_bid = sp.as_nat(self.data.quantity_under_bid - unfilled.value)
+                        unfilled.value = 0
+
+        # Verify that at least one bid slot is fillable i.e unfilled != quantity
+        sp.verify(unfilled.value != params.quantity, Errors.BID_PRICE_TOO_LOW)
+
+        # Quantity of the bid that enters the list
+        filled = sp.local("filled", sp.as_nat(params.quantity - unfilled.value))
+
+        self.data.next_bid_id += 1
+        self.data.bids[self.data.next_bid_id] = sp.record(
+            quantity=filled.value,
+            price=sp.utils.nat_to_mutez(params.price),
+            bidder=sp.sender,
+        )
+
+        self.insert_after(params.hint, self.data.next_bid_id, sp.utils.nat_to_mutez(params.price), filled.value)
+
+        self.data.accounts[sp.sender].winning_quantity += filled.value
+        self.data.quantity_under_bid += filled.value
+
+    @sp.entry_point
+    def finalize(self):
+        # Verify that the bidding period is over
+        sp.verify(sp.now >= self.data.bidding_end, Errors.BIDDING_IS_STILL_ACTIVE)
+
+        # Verify that the auction has not been finalized already
+        sp.verify(~self.data.settled, Errors.AUCTION_ALREADY_SETTLED)
+
+        # Snapshot the clearing price i.e the bid at the head of the list
+        with sp.if_(self.data.list_head != 0):
+            self.data.clearing_price = self.data.bid_list[self.data.list_head].price
+
+        self.data.winning_quantity = self.data.quantity_under_bid
+        self.data.settled = True
+
+        # The list is not needed anymore, dropping it releases its storage
+        self.data.bid_list = sp.big_map(tkey=sp.TNat, tvalue=AuctionTypes.LIST_NODE_TYPE)
+        self.data.list_head = 0
+        self.data.list_tail = 0
+
+    @sp.entry_point
+    def claim(self, max_mints):
+        sp.set_type(max_mints, sp.TNat)
+
+        # Verify that the auction has been finalized
+        sp.verify(self.data.settled, Errors.AUCTION_NOT_SETTLED)
+
+        # Verify that claiming is possible for the sender
+        sp.verify(self.data.accounts.contains(sp.sender), Errors.CANNOT_CLAIM)
+
+        self.settle_account(sp.sender, self.nft_minter(), max_mints)
+
+
+if __name__ == "__main__":
+    ############
+    # place_bid
+    ############
+
+    @sp.add_test(name="place_bid inserts bids after the hinted bid")
+    def test():
+        scenario = sp.test_scenario()
+
+        auction = LinkedListAuction()
+        scenario += auction
+
+        # When ALICE places a bid for 20 NFTs at 1 tez in the empty list
+        scenario += auction.place_bid(price=1000000, quantity=20, hint=0).run(
+            sender=Addresses.ALICE,
+            amount=sp.tez(20),
+        )
+        scenario.verify((auction.data.list_head == 1) & (auction.data.list_tail == 1))
+
+        # When BOB places a lower bid at the head of the list
+        scenario += auction.place_bid(price=500000, quantity=30, hint=0).run(
+            sender=Addresses.BOB,
+            amount=sp.tez(15),
+        )
+        scenario.verify((auction.data.list_head == 2) & (auction.data.list_tail == 1))
+
+        # A bid priced between the two can't go at the head, nor after the highest bid
+        scenario += auction.place_bid(price=800000, quantity=10, hint=0).run(
+            sender=Addresses.JOHN,
+            amount=sp.tez(8),
+            valid=False,
+            exception=Errors.INVALID_HINT,
+        )
+        scenario += auction.place_bid(price=800000, quantity=10, hint=1).run(
+            sender=Addresses.JOHN,
+            amount=sp.tez(8),
+            valid=False,
+            exception=Errors.INVALID_HINT,
+        )
+
+        # Hints must be bids in the list
+        scenario += auction.place_bid(price=800000, quantity=10, hint=9).run(
+            sender=Addresses.JOHN,
+            amount=sp.tez(8),
+            valid=False,
+            exception=Errors.INVALID_HINT,
+        )
+
+        # When JOHN places the bid after BOB's
+        scenario += auction.place_bid(price=800000, quantity=10, hint=2).run(
+            sender=Addresses.JOHN,
+            amount=sp.tez(8),
+        )
+
+        # The list is 2 -> 3 -> 1
+        scenario.verify((auction.data.bid_list[2].prev == 0) & (auction.data.bid_list[2].next == 3))
+        scenario.verify((auction.data.bid_list[3].prev == 2) & (auction.data.bid_list[3].next == 1))
+        scenario.verify((auction.data.bid_list[1].prev == 3) & (auction.data.bid_list[1].next == 0))
+        scenario.verify(auction.data.quantity_under_bid == 60)
+
+        # An exact tie goes before the older bid
+        scenario += auction.place_bid(price=800000, quantity=10, hint=3).run(
+            sender=Addresses.ALICE,
+            amount=sp.tez(8),
+            valid=False,
+            exception=Errors.INVALID_HINT,
+        )
+        scenario += auction.place_bid(price=800000, quantity=10, hint=2).run(
+            sender=Addresses.ALICE,
+            amount=sp.tez(8),
+        )
+        scenario.verify((auction.data.bid_list[2].next == 4) & (auction.data.bid_list[4].next == 3))
+
+    ##########################################
+    # place_bid (unfilled), finalize, claim
+    ##########################################
+
+    @sp.add_test(name="place_bid pops the lowest bids from the head and claim pays the clearing price")
+    def test():
+        scenario = sp.test_scenario()
+
+        dummy1 = Dummy.Dummy()
+        dummy2 = Dummy.Dummy()
+        fa2_nft = Fa2_NFT.FA2(
+            Fa2_NFT.FA2_config(),
+            sp.utils.metadata_of_url("https://example/com"),
+            Addresses.ADMIN,
+        )
+        auction = LinkedListAuction(nft_contract_address=fa2_nft.address)
+
+        scenario += fa2_nft
+        scenario += dummy1
+        scenario += dummy2
+        scenario += auction
+
+        # update admin of the NFT contract for minting
+        scenario += fa2_nft.set_administrator(auction.address).run(sender=Addresses.ADMIN)
+
+        scenario += auction.place_bid(price=1000000, quantity=50, hint=0).run(
+            sender=dummy1.address,
+            amount=sp.tez(50),
+        )
+        scenario += auction.place_bid(price=2000000, quantity=40, hint=1).run(
+            sender=Addresses.BOB,
+            amount=sp.tez(80),
+        )
+
+        # When Dummy 2 bids for 30 NFTs at 1.5 tez, the head bid is reduced to 30 NFTs and the new
+        # bid goes after it
+        scenario += auction.place_bid(price=1500000, quantity=30, hint=1).run(
+            sender=dummy2.address,
+            amount=sp.tez(45),
+        )
+        scenario.verify(auction.data.bid_list[1].quantity == 30)
+        scenario.verify((auction.data.bid_list[1].next == 3) & (auction.data.bid_list[3].next == 2))
+        scenario.verify(auction.data.accounts[dummy1.address].winning_quantity == 30)
+
+        # When Dummy 1 bids for 40 NFTs at 3 tez, the head bid is popped and Dummy 2's bid is reduced
+        scenario += auction.place_bid(price=3000000, quantity=40, hint=2).run(
+            sender=dummy1.address,
+            amount=sp.tez(120),
+        )
+        scenario.verify(~auction.data.bid_list.contains(1))
+        scenario.verify(auction.data.list_head == 3)
+        scenario.verify(auction.data.bid_list[3].prev == 0)
+        scenario.verify(auction.data.bid_list[3].quantity == 20)
+        scenario.verify(auction.data.list_tail == 4)
+        scenario.verify(auction.data.accounts[dummy1.address].winning_quantity == 40)
+        scenario.verify(auction.data.accounts[dummy2.address].winning_quantity == 20)
+        scenario.verify(auction.data.quantity_under_bid == 100)
+
+        # When the auction is finalized, the clearing price is the head bid's price i.e 1.5 tez
+        scenario += auction.finalize().run(now=sp.timestamp(10))
+        scenario.verify(auction.data.clearing_price == sp.mutez(1500000))
+        scenario.verify(auction.data.list_head == 0)
+
+        # When Dummy 2 claims, 20 NFTs are minted and 15 tez are refunded
+        scenario += auction.claim(20).run(sender=dummy2.address, now=sp.timestamp(10))
+        scenario.verify(
+            fa2_nft.data.ledger.contains((dummy2.address, 0)) & fa2_nft.data.ledger.contains((dummy2.address, 19))
+        )
+        scenario.verify(dummy2.balance == sp.tez(15))
+
+        # When Dummy 1 claims, 40 NFTs are minted and 110 tez are refunded
+        scenario += auction.claim(40).run(sender=dummy1.address, now=sp.timestamp(10))
+        scenario.verify(
+            fa2_nft.data.ledger.contains((dummy1.address, 20)) & fa2_nft.data.ledger.contains((dummy1.address, 59))
+        )
+        scenario.verify(dummy1.balance == sp.tez(110))
+        scenario.verify(auction.data.proceeds == sp.tez(90))
+
+    @sp.add_test(name="place_bid fails with EMPTY_QUEUE when a bid asks for more than the total supply")
+    def test():
+        scenario = sp.test_scenario()
+
+        dummy1 = Dummy.Dummy()
+        auction = LinkedListAuction()
+
+        scenario += dummy1
+        scenario += auction
+
+        # A bid over the total supply can't be accommodated by an empty list
+        scenario += auction.place_bid(price=1000000, quantity=101, hint=0).run(
+            sender=dummy1.address,
+            amount=sp.tez(101),
+            valid=False,
+            exception=Errors.EMPTY_QUEUE,
+        )
+
+        scenario += auction.place_bid(price=1000000, quantity=50, hint=0).run(
+            sender=dummy1.address,
+            amount=sp.tez(50),
+        )
+
+        # Nor once every lower bid has been popped
+        scenario += auction.place_bid(price=2000000, quantity=120, hint=1).run(
+            sender=Addresses.BOB,
+            amount=sp.tez(240),
+            valid=False,
+            exception=Errors.EMPTY_QUEUE,
+        )
+        scenario.verify(auction.data.list_head == 1)
+        scenario.verify(auction.data.quantity_under_bid == 50)
+
+
+sp.add_compilation_target("linked_list_auction", LinkedListAuction())
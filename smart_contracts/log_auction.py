@@ -0,0 +1,438 @@
+import smartpy as sp
+
+BidLog = sp.io.import_script_from_url("file:utilities/bid_log.py")
+Reveal = sp.io.import_script_from_url("file:utilities/reveal.py")
+Proceeds = sp.io.import_script_from_url("file:utilities/proceeds.py")
+Claims = sp.io.import_script_from_url("file:utilities/claims.py")
+AuctionTypes = sp.io.import_script_from_url("file:types/auction.py")
+Errors = sp.io.import_script_from_url("file:types/errors.py")
+Addresses = sp.io.import_script_from_url("file:helpers/addresses.py")
+Dummy = sp.io.import_script_from_url("file:helpers/dummy.py")
+Fa2_NFT = sp.io.import_script_from_url("file:helpers/fa2_NFT.py")
+
+#################
+# Default Values
+#################
+
+# Minimum bid price per NFT
+MIN_BID_PRICE = sp.mutez(100000)
+
+# Timestamp at which bidding starts
+BIDDING_START = sp.timestamp(0)
+
+# Timestamp at which bidding ends
+BIDDING_END = sp.timestamp(10)
+
+# Total supply for the NFTs
+TOTAL_SUPPLY = sp.nat(100)
+
+# Seconds after the end of bidding by which the whole log must be ranked, refunds opening otherwise
+SETTLEMENT_PERIOD = sp.int(7 * 86400)
+
+###########
+# Contract
+###########
+
+
+class LogAuction(sp.Contract, BidLog.BidLog, Reveal.Reveal, Proceeds.Proceeds, Claims.Claims):
+    def __init__(
+        self,
+        admin=Addresses.ADMIN,
+        bidding_start=BIDDING_START,
+        bidding_end=BIDDING_END,
+        min_bid_price=MIN_BID_PRICE,
+        next_bid_id=sp.nat(0),
+        bids=sp.big_map(
+            l={},
+            tkey=sp.TNat,
+            tvalue=AuctionTypes.BID_TYPE,
+        ),
+        deposits=sp.big_map(
+            l={},
+            tkey=sp.TAddress,
+            tvalue=sp.TMutez,
+        ),
+        allocations=sp.big_map(
+            l={},
+            tkey=sp.TAddress,
+            tvalue=sp.TNat,
+        ),
+        sorted_count=sp.nat(0),
+        last_sorted=sp.nat(0),
+        winning_quantity=sp.nat(0),
+        total_supply=TOTAL_SUPPLY,
+        mint_index=sp.nat(0),
+        nft_contract_address=Addresses.NFT,
+        clearing_price=sp.mutez(0),
+        settled=False,
+        settlement_period=SETTLEMENT_PERIOD,
+        proceeds=sp.mutez(0),
+    ):
+        self.init(
+            admin=admin,
+            bidding_start=bidding_start,
+            bidding_end=bidding_end,
+            min_bid_price=min_bid_price,
+            next_bid_id=next_bid_id,
+            bids=bids,
+            deposits=deposits,
+            allocations=allocations,
+            sorted_count=sorted_count,
+            last_sorted=last_sorted,
+            winning_quantity=winning_quantity,
+            total_supply=total_supply,
+            mint_index=mint_index,
+            nft_contract_address=nft_contract_address,
+            clearing_price=clearing_price,
+            settled=settled,
+            settlement_period=settlement_period,
+            proceeds=proceeds,
+        )
+
+    def settlement_deadline(self):
+        return self.data.bidding_end.add_seconds(self.data.settlement_period)
+
+    def ranks_before(self, bid_1, bid_id_1, bid_2, bid_id_2):
+        # Ranking of the bids priority queue, best bid first: highest price, then highest quantity,
+        # then the oldest bid
+        return (bid_1.price > bid_2.price) | (
+            (bid_1.price == bid_2.price)
+            & ((bid_1.quantity > bid_2.quantity) | ((bid_1.quantity == bid_2.quantity) & (bid_id_1 < bid_id_2)))
+        )
+
+    @sp.entry_point
+    def submit_sorted(self, bid_ids):
+        sp.set_type(bid_ids, sp.TList(sp.TNat))
+
+        # Verify that the sender is the admin. A chunk is only verified to rank after the previous one, so
+        # a chunk skipping bids would leave them unrankable and the auction refund-only.
+        sp.verify(sp.sender == self.data.admin, Errors.NOT_AUTHORIZED)
+
+        # Verify that the bidding period is over, and that refunds haven't opened yet
+        sp.verify(sp.now >= self.data.bidding_end, Errors.BIDDING_IS_STILL_ACTIVE)
+        sp.verify(sp.now < self.settlement_deadline(), Errors.SETTLEMENT_DEADLINE_PASSED)
+
+        # Verify that the whole log has not been submitted yet
+        sp.verify(~self.data.settled, Errors.AUCTION_ALREADY_SETTLED)
+
+        # Last bid of the previous chunks, that the chunk must continue from
+        last_id = sp.local("last_id", self.data.last_sorted)
+        last_bid = sp.local(
+            "last_bid",
+            sp.set_type_expr(
+                sp.record(quantity=sp.nat(0), price=sp.mutez(0), bidder=self.data.admin),
+                AuctionTypes.BID_TYPE,
+            ),
+        )
+        with sp.if_(self.data.sorted_count > 0):
+            last_bid.value = self.data.bids[last_id.value]
+
+        with sp.for_("bid_id", bid_ids) as bid_id:
+            bid = sp.local("bid", self.data.bids.get(bid_id, message=Errors.INVALID_BID_ORDER))
+
+            # Verify that the bid strictly ranks after the previous one. Since the ranking is a total
+            # order, this also rules out submitting a bid twice.
+            with sp.if_(self.data.sorted_count > 0):
+                sp.verify(
+                    self.ranks_before(last_bid.value, last_id.value, bid.value, bid_id),
+                    Errors.INVALID_BID_ORDER,
+                )
+
+            # Allocate the supply left down the ranking. The bid exhausting it is the boundary bid,
+            # and sets the clearing price. Bids after it only have their order verified.
+            filled = sp.local(
+                "filled",
+                sp.min(bid.value.quantity, sp.as_nat(self.data.total_supply - self.data.winning_quantity)),
+            )
+            with sp.if_(filled.value > 0):
+                self.data.allocations[bid.value.bidder] = (
+                    self.data.allocations.get(bid.value.bidder, sp.nat(0)) + filled.value
+                )
+                self.data.winning_quantity += filled.value
+                self.data.clearing_price = bid.value.price
+
+            last_id.value = bid_id
+            last_bid.value = bid.value
+            self.data.sorted_count += 1
+
+        self.data.last_sorted = last_id.value
+
+        # Every logged bid has been ranked once the count is reached
+        with sp.if_(self.data.sorted_count == self.data.next_bid_id):
+            self.data.settled = True
+
+    @sp.entry_point
+    def claim(self):
+        # Verify that the whole log has been submitted
+        sp.verify(self.data.settled, Errors.AUCTION_NOT_SETTLED)
+
+        # Verify that claiming is possible for the sender
+        sp.verify(self.data.deposits.contains(sp.sender), Errors.CANNOT_CLAIM)
+
+        # NFTs won across the sender's bids
+        quantity = sp.local("quantity", self.data.allocations.get(sp.sender, sp.nat(0)))
+
+        # Mint all the won NFTs in a single operation
+        self.mint_nfts(self.nft_minter(), sp.sender, quantity.value)
+
+        # Total cost of bought NFTs
+        cost = sp.local("cost", quantity.value * sp.utils.mutez_to_nat(self.data.clearing_price))
+
+        # Add price cost to the proceeds and return left over funds to bid owner
+        self.pay_out(sp.sender, self.data.deposits[sp.sender], sp.utils.nat_to_mutez(cost.value))
+
+        # Delete owner's deposit and allocation
+        del self.data.deposits[sp.sender]
+        del self.data.allocations[sp.sender]
+
+    @sp.entry_point
+    def refund(self):
+        # Verify that the settlement deadline is over without the whole log ranked
+        sp.verify(sp.now >= self.settlement_deadline(), Errors.SETTLEMENT_DEADLINE_NOT_PASSED)
+        sp.verify(~self.data.settled, Errors.AUCTION_ALREADY_SETTLED)
+
+        # Verify that claiming is possible for the sender
+        sp.verify(self.data.deposits.contains(sp.sender), Errors.CANNOT_CLAIM)
+
+        # Return the whole deposit, whatever was allocated by the chunks submitted so far
+        self.send_tez(sp.sender, self.data.deposits[sp.sender])
+        del self.data.deposits[sp.sender]
+
+
+if __name__ == "__main__":
+    ################
+    # submit_sorted
+    ################
+
+    @sp.add_test(name="submit_sorted verifies the ranking and allocates the supply across chunks")
+    def test():
+        scenario = sp.test_scenario()
+
+        dummy1 = Dummy.Dummy()
+        dummy2 = Dummy.Dummy()
+        dummy3 = Dummy.Dummy()
+        dummy_admin = Dummy.Dummy()
+        fa2_nft = Fa2_NFT.FA2(
+            Fa2_NFT.FA2_config(),
+            sp.utils.metadata_of_url("https://example/com"),
+            Addresses.ADMIN,
+        )
+        auction = LogAuction(
+            admin=dummy_admin.address,
+            nft_contract_address=fa2_nft.address,
+        )
+
+        scenario += fa2_nft
+        scenario += dummy1
+        scenario += dummy2
+        scenario += dummy3
+        scenario += dummy_admin
+        scenario += auction
+
+        # update admin of the NFT contract for minting
+        scenario += fa2_nft.set_administrator(auction.address).run(sender=Addresses.ADMIN)
+
+        # The sample auction of the README, bids are only logged
+        scenario += auction.place_bid(price=1000000, quantity=20).run(sender=dummy1.address, amount=sp.tez(20))
+        scenario += auction.place_bid(price=1500000, quantity=40).run(sender=dummy2.address, amount=sp.tez(60))
+        scenario += auction.place_bid(price=2000000, quantity=15).run(sender=dummy3.address, amount=sp.tez(30))
+        scenario += auction.place_bid(price=1500000, quantity=25).run(sender=dummy1.address, amount=sp.mutez(37500000))
+        scenario += auction.place_bid(price=2500000, quantity=10).run(sender=dummy2.address, amount=sp.tez(25))
+        scenario += auction.place_bid(price=1500000, quantity=45).run(sender=dummy3.address, amount=sp.mutez(67500000))
+
+        # NOTICE: Ranking is 5 (2.5 tez), 3 (2 tez), 6 (1.5 tez x 45), 2 (1.5 tez x 40), 4 (1.5 tez x 25), 1 (1 tez)
+
+        # The log can't be submitted during bidding
+        scenario += auction.submit_sorted([5, 3]).run(
+            sender=dummy_admin.address,
+            now=sp.timestamp(5),
+            valid=False,
+            exception=Errors.BIDDING_IS_STILL_ACTIVE,
+        )
+
+        # Only the admin can submit the log, so that no one can skip bids to block the settlement
+        scenario += auction.submit_sorted([5, 1]).run(
+            sender=dummy1.address,
+            now=sp.timestamp(10),
+            valid=False,
+            exception=Errors.NOT_AUTHORIZED,
+        )
+
+        # Chunks out of order are rejected
+        scenario += auction.submit_sorted([3, 5]).run(
+            sender=dummy_admin.address,
+            now=sp.timestamp(10),
+            valid=False,
+            exception=Errors.INVALID_BID_ORDER,
+        )
+
+        # When the admin submits the first chunk
+        scenario += auction.submit_sorted([5, 3]).run(sender=dummy_admin.address, now=sp.timestamp(10))
+
+        # The two best bids are entirely filled
+        scenario.verify(auction.data.winning_quantity == 25)
+        scenario.verify(auction.data.allocations[dummy2.address] == 10)
+        scenario.verify(auction.data.allocations[dummy3.address] == 15)
+
+        # A chunk must continue from the previous one, so a bid can't be submitted twice
+        scenario += auction.submit_sorted([3, 6]).run(
+            sender=dummy_admin.address,
+            now=sp.timestamp(10),
+            valid=False,
+            exception=Errors.INVALID_BID_ORDER,
+        )
+
+        # When the admin submits the second chunk
+        scenario += auction.submit_sorted([6, 2]).run(sender=dummy_admin.address, now=sp.timestamp(10))
+
+        # Bid 2 is the boundary bid, cut down to 30 NFTs
+        scenario.verify(auction.data.winning_quantity == 100)
+        scenario.verify(auction.data.allocations[dummy2.address] == 40)
+        scenario.verify(auction.data.allocations[dummy3.address] == 60)
+        scenario.verify(auction.data.clearing_price == sp.mutez(1500000))
+
+        # Claims fail until every logged bid is ranked
+        scenario += auction.claim().run(
+            sender=dummy2.address,
+            now=sp.timestamp(10),
+            valid=False,
+            exception=Errors.AUCTION_NOT_SETTLED,
+        )
+
+        # When the admin submits the losing bids
+        scenario += auction.submit_sorted([4, 1]).run(sender=dummy_admin.address, now=sp.timestamp(10))
+
+        # The auction is settled without allocating them
+        scenario.verify(auction.data.settled)
+        scenario.verify(~auction.data.allocations.contains(dummy1.address))
+
+        scenario += auction.submit_sorted([]).run(
+            sender=dummy_admin.address,
+            now=sp.timestamp(10),
+            valid=False,
+            exception=Errors.AUCTION_ALREADY_SETTLED,
+        )
+
+        # When Dummy 1 claims, the whole deposit is refunded
+        scenario += auction.claim().run(sender=dummy1.address, now=sp.timestamp(10))
+        scenario.verify(dummy1.balance == sp.mutez(57500000))
+
+        # When Dummy 2 claims, 40 NFTs are minted at 1.5 tez and 25 tez are refunded
+        scenario += auction.claim().run(sender=dummy2.address, now=sp.timestamp(10))
+        scenario.verify(
+            fa2_nft.data.ledger.contains((dummy2.address, 0)) & fa2_nft.data.ledger.contains((dummy2.address, 39))
+        )
+        scenario.verify(dummy2.balance == sp.tez(25))
+
+        # When Dummy 3 claims, 60 NFTs are minted at 1.5 tez and 7.5 tez are refunded
+        scenario += auction.claim().run(sender=dummy3.address, now=sp.timestamp(10))
+        scenario.verify(
+            fa2_nft.data.ledger.contains((dummy3.address, 40)) & fa2_nft.data.ledger.contains((dummy3.address, 99))
+        )
+        scenario.verify(dummy3.balance == sp.mutez(7500000))
+
+        # Only the proceeds are left in the contract
+        scenario.verify(auction.data.proceeds == sp.tez(150))
+        scenario.verify(auction.balance == sp.tez(150))
+
+    @sp.add_test(name="submit_sorted settles an undersubscribed auction with every bid winning")
+    def test():
+        scenario = sp.test_scenario()
+
+        dummy1 = Dummy.Dummy()
+        dummy_admin = Dummy.Dummy()
+        auction = LogAuction(admin=dummy_admin.address)
+
+        scenario += dummy1
+        scenario += dummy_admin
+        scenario += auction
+
+        scenario += auction.place_bid(price=1000000, quantity=20).run(sender=dummy1.address, amount=sp.tez(20))
+        scenario += auction.place_bid(price=2000000, quantity=30).run(sender=dummy1.address, amount=sp.tez(60))
+
+        # Unknown bid ids are rejected
+        scenario += auction.submit_sorted([2, 3]).run(
+            sender=dummy_admin.address,
+            now=sp.timestamp(10),
+            valid=False,
+            exception=Errors.INVALID_BID_ORDER,
+        )
+
+        scenario += auction.submit_sorted([2, 1]).run(sender=dummy_admin.address, now=sp.timestamp(10))
+
+        # Both bids win, the clearing price being the lowest of them
+        scenario.verify(auction.data.settled)
+        scenario.verify(auction.data.winning_quantity == 50)
+        scenario.verify(auction.data.allocations[dummy1.address] == 50)
+        scenario.verify(auction.data.clearing_price == sp.tez(1))
+
+    #########
+    # refund
+    #########
+
+    @sp.add_test(name="refund returns the deposits once the settlement deadline passes without the whole log ranked")
+    def test():
+        scenario = sp.test_scenario()
+
+        dummy1 = Dummy.Dummy()
+        dummy2 = Dummy.Dummy()
+        dummy_admin = Dummy.Dummy()
+        auction = LogAuction(
+            admin=dummy_admin.address,
+            total_supply=sp.nat(50),
+            settlement_period=sp.int(200),
+        )
+
+        scenario += dummy1
+        scenario += dummy2
+        scenario += dummy_admin
+        scenario += auction
+
+        scenario += auction.place_bid(price=1000000, quantity=40).run(sender=dummy1.address, amount=sp.tez(40))
+        scenario += auction.place_bid(price=1500000, quantity=30).run(sender=dummy2.address, amount=sp.tez(45))
+
+        # The admin only submits the first chunk, allocating the best bid
+        scenario += auction.submit_sorted([2]).run(sender=dummy_admin.address, now=sp.timestamp(10))
+        scenario.verify(auction.data.allocations[dummy2.address] == 30)
+
+        # Refunds only open at the settlement deadline
+        scenario += auction.refund().run(
+            sender=dummy1.address,
+            now=sp.timestamp(150),
+            valid=False,
+            exception=Errors.SETTLEMENT_DEADLINE_NOT_PASSED,
+        )
+
+        # The log can't be ranked any further once refunds have opened
+        scenario += auction.submit_sorted([1]).run(
+            sender=dummy_admin.address,
+            now=sp.timestamp(210),
+            valid=False,
+            exception=Errors.SETTLEMENT_DEADLINE_PASSED,
+        )
+
+        # When both bidders ask for a refund, their whole deposits are returned
+        scenario += auction.refund().run(sender=dummy1.address, now=sp.timestamp(210))
+        scenario += auction.refund().run(sender=dummy2.address, now=sp.timestamp(210))
+        scenario.verify(dummy1.balance == sp.tez(40))
+        scenario.verify(dummy2.balance == sp.tez(45))
+        scenario.verify(auction.balance == sp.tez(0))
+
+        # A deposit is only returned once
+        scenario += auction.refund().run(
+            sender=dummy1.address,
+            now=sp.timestamp(210),
+            valid=False,
+            exception=Errors.CANNOT_CLAIM,
+        )
+
+        # And nothing is left to claim
+        scenario += auction.claim().run(
+            sender=dummy2.address,
+            now=sp.timestamp(210),
+            valid=False,
+            exception=Errors.AUCTION_NOT_SETTLED,
+        )
+
+
+sp.add_compilation_target("log_auction", LogAuction())
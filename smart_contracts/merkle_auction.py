@@ -0,0 +1,644 @@
+import smartpy as sp
+
+BidLog = sp.io.import_script_from_url("file:utilities/bid_log.py")
+MerkleProof = sp.io.import_script_from_url("file:utilities/merkle_proof.py")
+Reveal = sp.io.import_script_from_url("file:utilities/reveal.py")
+Proceeds = sp.io.import_script_from_url("file:utilities/proceeds.py")
+Claims = sp.io.import_script_from_url("file:utilities/claims.py")
+AuctionTypes = sp.io.import_script_from_url("file:types/auction.py")
+Errors = sp.io.import_script_from_url("file:types/errors.py")
+Addresses = sp.io.import_script_from_url("file:helpers/addresses.py")
+Dummy = sp.io.import_script_from_url("file:helpers/dummy.py")
+Fa2_NFT = sp.io.import_script_from_url("file:helpers/fa2_NFT.py")
+
+#################
+# Default Values
+#################
+
+# Minimum bid price per NFT
+MIN_BID_PRICE = sp.mutez(100000)
+
+# Timestamp at which bidding starts
+BIDDING_START = sp.timestamp(0)
+
+# Timestamp at which bidding ends
+BIDDING_END = sp.timestamp(10)
+
+# Total supply for the NFTs
+TOTAL_SUPPLY = sp.nat(100)
+
+# Seconds during which a posted settlement root can be disputed and replaced before claims open
+CHALLENGE_PERIOD = sp.int(86400)
+
+# Seconds after the end of bidding by which a root must be final. Bidders get their whole deposit back
+# past this deadline if none is.
+SETTLEMENT_PERIOD = sp.int(7 * 86400)
+
+###########
+# Contract
+###########
+
+
+class MerkleAuction(
+    sp.Contract, BidLog.BidLog, MerkleProof.MerkleProof, Reveal.Reveal, Proceeds.Proceeds, Claims.Claims
+):
+    def __init__(
+        self,
+        admin=Addresses.ADMIN,
+        bidding_start=BIDDING_START,
+        bidding_end=BIDDING_END,
+        min_bid_price=MIN_BID_PRICE,
+        next_bid_id=sp.nat(0),
+        bids=sp.big_map(
+            l={},
+            tkey=sp.TNat,
+            tvalue=AuctionTypes.BID_TYPE,
+        ),
+        deposits=sp.big_map(
+            l={},
+            tkey=sp.TAddress,
+            tvalue=sp.TMutez,
+        ),
+        total_supply=TOTAL_SUPPLY,
+        mint_index=sp.nat(0),
+        nft_contract_address=Addresses.NFT,
+        merkle_root=sp.none,
+        clearing_price=sp.mutez(0),
+        root_posted_at=sp.timestamp(0),
+        challenge_period=CHALLENGE_PERIOD,
+        settlement_period=SETTLEMENT_PERIOD,
+        proceeds=sp.mutez(0),
+    ):
+        self.init(
+            admin=admin,
+            bidding_start=bidding_start,
+            bidding_end=bidding_end,
+            min_bid_price=min_bid_price,
+            next_bid_id=next_bid_id,
+            bids=bids,
+            deposits=deposits,
+            total_supply=total_supply,
+            mint_index=mint_index,
+            nft_contract_address=nft_contract_address,
+            merkle_root=merkle_root,
+            clearing_price=clearing_price,
+            root_posted_at=root_posted_at,
+            challenge_period=challenge_period,
+            settlement_period=settlement_period,
+            proceeds=proceeds,
+        )
+
+    def settlement_deadline(self):
+        return self.data.bidding_end.add_seconds(self.data.settlement_period)
+
+    def challenge_end(self):
+        return self.data.root_posted_at.add_seconds(self.data.challenge_period)
+
+    def leaf_of(self, address, quantity, refund):
+        # Hash of a settlement leaf, as computed by auction_tools.merkle
+        return sp.blake2b(
+            sp.pack(
+                sp.set_type_expr(
+                    sp.record(address=address, quantity=quantity, refund=refund),
+                    AuctionTypes.MERKLE_LEAF_TYPE,
+                )
+            )
+        )
+
+    def settlement_cost(self, quantity):
+        # Total cost of `quantity` NFTs at the clearing price
+        return sp.utils.nat_to_mutez(quantity * sp.utils.mutez_to_nat(self.data.clearing_price))
+
+    @sp.entry_point
+    def post_root(self, params):
+        sp.set_type(params, sp.TRecord(root=sp.TBytes, clearing_price=sp.TMutez))
+
+        # Verify that the sender is the admin
+        sp.verify(sp.sender == self.data.admin, Errors.NOT_AUTHORIZED)
+
+        # Verify that the bidding period is over
+        sp.verify(sp.now >= self.data.bidding_end, Errors.BIDDING_IS_STILL_ACTIVE)
+
+        # A posted root can only be replaced while it is being challenged
+        with sp.if_(self.data.merkle_root.is_some()):
+            sp.verify(sp.now < self.challenge_end(), Errors.ROOT_ALREADY_FINAL)
+
+        # Verify that the root can become final before the settlement deadline, past which refunds open
+        sp.verify(
+            sp.now.add_seconds(self.data.challenge_period) <= self.settlement_deadline(),
+            Errors.SETTLEMENT_DEADLINE_PASSED,
+        )
+
+        # Posting (or replacing) the root restarts the challenge window
+        self.data.merkle_root = sp.some(params.root)
+        self.data.clearing_price = params.clearing_price
+        self.data.root_posted_at = sp.now
+
+    @sp.entry_point
+    def claim(self, params):
+        sp.set_type(
+            params,
+            sp.TRecord(
+                quantity=sp.TNat,
+                refund=sp.TMutez,
+                proof=sp.TList(sp.TBytes),
+            ),
+        )
+
+        # Verify that the settlement root is posted and no longer challengeable
+        root = sp.local("root", self.data.merkle_root.open_some(Errors.ROOT_NOT_POSTED))
+        sp.verify(sp.now >= self.challenge_end(), Errors.CHALLENGE_WINDOW_OPEN)
+
+        # Verify that claiming is possible for the sender
+        sp.verify(self.data.deposits.contains(sp.sender), Errors.CANNOT_CLAIM)
+
+        # Verify that the sender's settlement is a leaf of the posted tree
+        leaf = self.leaf_of(sp.sender, params.quantity, params.refund)
+        sp.verify(self.merkle_root_of(leaf, params.proof).value == root.value, Errors.INVALID_PROOF)
+
+        # Total cost of bought NFTs
+        cost = sp.local("cost", self.settlement_cost(params.quantity))
+
+        # Whatever the posted root says, a bidder never gets back more than the deposit and the
+        # supply is never exceeded
+        sp.verify(cost.value + params.refund == self.data.deposits[sp.sender], Errors.INVALID_SETTLEMENT)
+        sp.verify(self.data.mint_index + params.quantity <= self.data.total_supply, Errors.INVALID_SETTLEMENT)
+
+        # Mint all the won NFTs in a single operation
+        self.mint_nfts(self.nft_minter(), sp.sender, params.quantity)
+
+        # Add price cost to the proceeds and return left over funds to bid owner, i.e the refund of the leaf
+        self.pay_out(sp.sender, self.data.deposits[sp.sender], cost.value)
+
+        # Delete owner's deposit
+        del self.data.deposits[sp.sender]
+
+    @sp.entry_point
+    def dispute_root(self, params):
+        sp.set_type(
+            params,
+            sp.TRecord(
+                address=sp.TAddress,
+                quantity=sp.TNat,
+                refund=sp.TMutez,
+                proof=sp.TList(sp.TBytes),
+            ),
+        )
+
+        # Verify that the root is posted and still being challenged
+        root = sp.local("root", self.data.merkle_root.open_some(Errors.ROOT_NOT_POSTED))
+        sp.verify(sp.now < self.challenge_end(), Errors.ROOT_ALREADY_FINAL)
+
+        # Verify that the disputed settlement is a leaf of the posted tree
+        leaf = self.leaf_of(params.address, params.quantity, params.refund)
+        sp.verify(self.merkle_root_of(leaf, params.proof).value == root.value, Errors.INVALID_PROOF)
+
+        # Anyone can dispute a leaf that could never be claimed: one of an address without a deposit,
+        # one that doesn't add up to the deposit at the clearing price, or one exceeding the total supply
+        invalid = sp.local("invalid", ~self.data.deposits.contains(params.address))
+        with sp.if_(~invalid.value):
+            invalid.value = (
+                self.settlement_cost(params.quantity) + params.refund != self.data.deposits[params.address]
+            ) | (params.quantity > self.data.total_supply)
+        sp.verify(invalid.value, Errors.SETTLEMENT_IS_VALID)
+
+        # The root is voided, and has to be posted again before the settlement deadline
+        self.data.merkle_root = sp.none
+
+    @sp.entry_point
+    def refund(self):
+        # Verify that the settlement deadline is over. Whatever the root, a deposit still unclaimed by then
+        # can be refunded, as a root leaving its depositor out can't be disputed.
+        sp.verify(sp.now >= self.settlement_deadline(), Errors.SETTLEMENT_DEADLINE_NOT_PASSED)
+
+        # Verify that claiming is possible for the sender
+        sp.verify(self.data.deposits.contains(sp.sender), Errors.CANNOT_CLAIM)
+
+        # Return the whole deposit
+        self.send_tez(sp.sender, self.data.deposits[sp.sender])
+        del self.data.deposits[sp.sender]
+
+
+if __name__ == "__main__":
+
+    def leaf_hash(scenario, address, quantity, refund):
+        return scenario.compute(
+            sp.blake2b(
+                sp.pack(
+                    sp.set_type_expr(
+                        sp.record(address=address, quantity=quantity, refund=refund),
+                        AuctionTypes.MERKLE_LEAF_TYPE,
+                    )
+                )
+            )
+        )
+
+    ############
+    # place_bid
+    ############
+
+    @sp.add_test(name="place_bid appends bids to the log without allocating the supply")
+    def test():
+        scenario = sp.test_scenario()
+
+        dummy1 = Dummy.Dummy()
+        dummy2 = Dummy.Dummy()
+        auction = MerkleAuction()
+
+        scenario += dummy1
+        scenario += dummy2
+        scenario += auction
+
+        # Bids asking for more than the total supply are all accepted
+        scenario += auction.place_bid(price=1000000, quantity=80).run(sender=dummy1.address, amount=sp.tez(80))
+        scenario += auction.place_bid(price=2000000, quantity=80).run(sender=dummy2.address, amount=sp.tez(160))
+        scenario += auction.place_bid(price=1000000, quantity=10).run(sender=dummy1.address, amount=sp.tez(10))
+
+        # Bids are logged in placement order
+        scenario.verify(auction.data.next_bid_id == 3)
+        scenario.verify(auction.data.bids[1].quantity == 80)
+        scenario.verify(auction.data.bids[2].price == sp.tez(2))
+        scenario.verify(auction.data.bids[3].bidder == dummy1.address)
+
+        # Deposits sum up the tez sent by each bidder
+        scenario.verify(auction.data.deposits[dummy1.address] == sp.tez(90))
+        scenario.verify(auction.data.deposits[dummy2.address] == sp.tez(160))
+
+        # Empty bids are rejected
+        scenario += auction.place_bid(price=1000000, quantity=0).run(
+            sender=dummy1.address,
+            valid=False,
+            exception=Errors.INVALID_QUANTITY,
+        )
+
+        # Bids with the wrong amount are rejected
+        scenario += auction.place_bid(price=1000000, quantity=1).run(
+            sender=dummy1.address,
+            amount=sp.tez(2),
+            valid=False,
+            exception=Errors.INVALID_TEZ_AMOUNT,
+        )
+
+        # Bids after the bidding period are rejected
+        scenario += auction.place_bid(price=1000000, quantity=1).run(
+            sender=dummy1.address,
+            amount=sp.tez(1),
+            now=sp.timestamp(10),
+            valid=False,
+            exception=Errors.BIDDING_IS_NOT_ACTIVE,
+        )
+
+    ################################
+    # post_root and claim (success)
+    ################################
+
+    @sp.add_test(name="claim verifies a Merkle proof once the challenge window is over")
+    def test():
+        scenario = sp.test_scenario()
+
+        dummy1 = Dummy.Dummy()
+        dummy2 = Dummy.Dummy()
+        dummy_admin = Dummy.Dummy()
+        fa2_nft = Fa2_NFT.FA2(
+            Fa2_NFT.FA2_config(),
+            sp.utils.metadata_of_url("https://example/com"),
+            Addresses.ADMIN,
+        )
+        auction = MerkleAuction(
+            admin=dummy_admin.address,
+            nft_contract_address=fa2_nft.address,
+            challenge_period=sp.int(100),
+        )
+
+        scenario += fa2_nft
+        scenario += dummy1
+        scenario += dummy2
+        scenario += dummy_admin
+        scenario += auction
+
+        # update admin of the NFT contract for minting
+        scenario += fa2_nft.set_administrator(auction.address).run(sender=Addresses.ADMIN)
+
+        scenario += auction.place_bid(price=1000000, quantity=40).run(sender=dummy1.address, amount=sp.tez(40))
+        scenario += auction.place_bid(price=1500000, quantity=80).run(sender=dummy2.address, amount=sp.tez(120))
+
+        # NOTICE: Off-chain clearing cuts Dummy 1's bid down to 20 NFTs at a clearing price of 1 tez
+
+        # Settlement tree with two leaves, each one being the proof of the other
+        leaf1 = leaf_hash(scenario, dummy1.address, 20, sp.tez(20))
+        leaf2 = leaf_hash(scenario, dummy2.address, 80, sp.tez(40))
+        root = scenario.compute(sp.blake2b(sp.concat([sp.min(leaf1, leaf2), sp.max(leaf1, leaf2)])))
+
+        # Claims fail until a root is posted
+        scenario += auction.claim(quantity=20, refund=sp.tez(20), proof=[leaf2]).run(
+            sender=dummy1.address,
+            now=sp.timestamp(10),
+            valid=False,
+            exception=Errors.ROOT_NOT_POSTED,
+        )
+
+        # The root can't be posted during bidding
+        scenario += auction.post_root(root=root, clearing_price=sp.tez(1)).run(
+            sender=dummy_admin.address,
+            now=sp.timestamp(5),
+            valid=False,
+            exception=Errors.BIDDING_IS_STILL_ACTIVE,
+        )
+
+        # Only the admin can post the root
+        scenario += auction.post_root(root=root, clearing_price=sp.tez(1)).run(
+            sender=dummy1.address,
+            now=sp.timestamp(10),
+            valid=False,
+            exception=Errors.NOT_AUTHORIZED,
+        )
+
+        # When the admin posts a wrong root
+        scenario += auction.post_root(root=leaf1, clearing_price=sp.tez(1)).run(
+            sender=dummy_admin.address,
+            now=sp.timestamp(10),
+        )
+
+        # Claims fail during the challenge window
+        scenario += auction.claim(quantity=20, refund=sp.tez(20), proof=[leaf2]).run(
+            sender=dummy1.address,
+            now=sp.timestamp(50),
+            valid=False,
+            exception=Errors.CHALLENGE_WINDOW_OPEN,
+        )
+
+        # When the admin replaces it within the window, the window restarts
+        scenario += auction.post_root(root=root, clearing_price=sp.tez(1)).run(
+            sender=dummy_admin.address,
+            now=sp.timestamp(60),
+        )
+        scenario += auction.claim(quantity=20, refund=sp.tez(20), proof=[leaf2]).run(
+            sender=dummy1.address,
+            now=sp.timestamp(120),
+            valid=False,
+            exception=Errors.CHALLENGE_WINDOW_OPEN,
+        )
+
+        # Claims with a settlement that is not in the tree fail
+        scenario += auction.claim(quantity=20, refund=sp.tez(25), proof=[leaf2]).run(
+            sender=dummy1.address,
+            now=sp.timestamp(160),
+            valid=False,
+            exception=Errors.INVALID_PROOF,
+        )
+
+        # When Dummy 1 claims
+        scenario += auction.claim(quantity=20, refund=sp.tez(20), proof=[leaf2]).run(
+            sender=dummy1.address,
+            now=sp.timestamp(160),
+        )
+
+        # 20 NFTs are minted and 20 tez are refunded
+        scenario.verify(
+            fa2_nft.data.ledger.contains((dummy1.address, 0)) & fa2_nft.data.ledger.contains((dummy1.address, 19))
+        )
+        scenario.verify(dummy1.balance == sp.tez(20))
+        scenario.verify(auction.data.proceeds == sp.tez(20))
+
+        # Dummy 1 can't claim twice
+        scenario += auction.claim(quantity=20, refund=sp.tez(20), proof=[leaf2]).run(
+            sender=dummy1.address,
+            now=sp.timestamp(160),
+            valid=False,
+            exception=Errors.CANNOT_CLAIM,
+        )
+
+        # When Dummy 2 claims
+        scenario += auction.claim(quantity=80, refund=sp.tez(40), proof=[leaf1]).run(
+            sender=dummy2.address,
+            now=sp.timestamp(160),
+        )
+
+        # 80 NFTs are minted and 40 tez are refunded
+        scenario.verify(
+            fa2_nft.data.ledger.contains((dummy2.address, 20)) & fa2_nft.data.ledger.contains((dummy2.address, 99))
+        )
+        scenario.verify(dummy2.balance == sp.tez(40))
+        scenario.verify(auction.data.proceeds == sp.tez(100))
+
+        # The root can't be replaced once final
+        scenario += auction.post_root(root=leaf1, clearing_price=sp.tez(1)).run(
+            sender=dummy_admin.address,
+            now=sp.timestamp(160),
+            valid=False,
+            exception=Errors.ROOT_ALREADY_FINAL,
+        )
+
+        # When the admin withdraws the proceeds
+        scenario += auction.withdraw_proceeds().run(sender=dummy_admin.address)
+
+        # Only the proceeds were left in the contract
+        scenario.verify(dummy_admin.balance == sp.tez(100))
+        scenario.verify(auction.balance == sp.tez(0))
+
+    ###########################
+    # claim (invalid settlement)
+    ###########################
+
+    @sp.add_test(name="claim rejects settlements inconsistent with the deposit or supply")
+    def test():
+        scenario = sp.test_scenario()
+
+        dummy1 = Dummy.Dummy()
+        dummy_admin = Dummy.Dummy()
+        auction = MerkleAuction(
+            admin=dummy_admin.address,
+            challenge_period=sp.int(0),
+        )
+
+        scenario += dummy1
+        scenario += dummy_admin
+        scenario += auction
+
+        scenario += auction.place_bid(price=1000000, quantity=40).run(sender=dummy1.address, amount=sp.tez(40))
+
+        # Single leaf trees, the root being the leaf and the proof empty
+
+        # The refund exceeds the deposit left after paying for the NFTs
+        leaf = leaf_hash(scenario, dummy1.address, 20, sp.tez(30))
+        scenario += auction.post_root(root=leaf, clearing_price=sp.tez(1)).run(
+            sender=dummy_admin.address,
+            now=sp.timestamp(10),
+        )
+        scenario += auction.claim(quantity=20, refund=sp.tez(30), proof=[]).run(
+            sender=dummy1.address,
+            now=sp.timestamp(10),
+            valid=False,
+            exception=Errors.INVALID_SETTLEMENT,
+        )
+
+        # The quantity exceeds the total supply
+        auction_2 = MerkleAuction(
+            admin=dummy_admin.address,
+            challenge_period=sp.int(0),
+            total_supply=sp.nat(10),
+        )
+        scenario += auction_2
+        scenario += auction_2.place_bid(price=1000000, quantity=40).run(sender=dummy1.address, amount=sp.tez(40))
+
+        leaf = leaf_hash(scenario, dummy1.address, 20, sp.tez(20))
+        scenario += auction_2.post_root(root=leaf, clearing_price=sp.tez(1)).run(
+            sender=dummy_admin.address,
+            now=sp.timestamp(10),
+        )
+        scenario += auction_2.claim(quantity=20, refund=sp.tez(20), proof=[]).run(
+            sender=dummy1.address,
+            now=sp.timestamp(10),
+            valid=False,
+            exception=Errors.INVALID_SETTLEMENT,
+        )
+
+    ##########################
+    # dispute_root and refund
+    ##########################
+
+    @sp.add_test(name="dispute_root voids a root holding a leaf that can't be claimed")
+    def test():
+        scenario = sp.test_scenario()
+
+        dummy1 = Dummy.Dummy()
+        dummy2 = Dummy.Dummy()
+        dummy_admin = Dummy.Dummy()
+        auction = MerkleAuction(
+            admin=dummy_admin.address,
+            challenge_period=sp.int(100),
+            settlement_period=sp.int(200),
+        )
+
+        scenario += dummy1
+        scenario += dummy2
+        scenario += dummy_admin
+        scenario += auction
+
+        scenario += auction.place_bid(price=1000000, quantity=40).run(sender=dummy1.address, amount=sp.tez(40))
+        scenario += auction.place_bid(price=1500000, quantity=80).run(sender=dummy2.address, amount=sp.tez(120))
+
+        # The admin posts a root that keeps 10 tez of Dummy 2's deposit
+        leaf1 = leaf_hash(scenario, dummy1.address, 20, sp.tez(20))
+        bad_leaf2 = leaf_hash(scenario, dummy2.address, 80, sp.tez(30))
+        bad_root = scenario.compute(sp.blake2b(sp.concat([sp.min(leaf1, bad_leaf2), sp.max(leaf1, bad_leaf2)])))
+        scenario += auction.post_root(root=bad_root, clearing_price=sp.tez(1)).run(
+            sender=dummy_admin.address,
+            now=sp.timestamp(10),
+        )
+
+        # A consistent leaf can't be disputed
+        scenario += auction.dispute_root(address=dummy1.address, quantity=20, refund=sp.tez(20), proof=[bad_leaf2]).run(
+            sender=dummy2.address,
+            now=sp.timestamp(50),
+            valid=False,
+            exception=Errors.SETTLEMENT_IS_VALID,
+        )
+
+        # Nor can a settlement that is not in the tree
+        scenario += auction.dispute_root(address=dummy1.address, quantity=20, refund=sp.tez(25), proof=[bad_leaf2]).run(
+            sender=dummy2.address,
+            now=sp.timestamp(50),
+            valid=False,
+            exception=Errors.INVALID_PROOF,
+        )
+
+        # When Dummy 1 disputes Dummy 2's leaf, which doesn't add up to the deposit
+        scenario += auction.dispute_root(address=dummy2.address, quantity=80, refund=sp.tez(30), proof=[leaf1]).run(
+            sender=dummy1.address,
+            now=sp.timestamp(50),
+        )
+
+        # The root is voided, and claims are closed again
+        scenario.verify(auction.data.merkle_root.is_none())
+        scenario += auction.claim(quantity=20, refund=sp.tez(20), proof=[bad_leaf2]).run(
+            sender=dummy1.address,
+            now=sp.timestamp(150),
+            valid=False,
+            exception=Errors.ROOT_NOT_POSTED,
+        )
+
+        # A root posted too late to become final before the settlement deadline is rejected
+        scenario += auction.post_root(root=bad_root, clearing_price=sp.tez(1)).run(
+            sender=dummy_admin.address,
+            now=sp.timestamp(150),
+            valid=False,
+            exception=Errors.SETTLEMENT_DEADLINE_PASSED,
+        )
+
+    @sp.add_test(name="refund returns the deposits still unclaimed once the settlement deadline passes")
+    def test():
+        scenario = sp.test_scenario()
+
+        dummy1 = Dummy.Dummy()
+        dummy_admin = Dummy.Dummy()
+        auction = MerkleAuction(
+            admin=dummy_admin.address,
+            challenge_period=sp.int(100),
+            settlement_period=sp.int(200),
+        )
+
+        scenario += dummy1
+        scenario += dummy_admin
+        scenario += auction
+
+        scenario += auction.place_bid(price=1000000, quantity=40).run(sender=dummy1.address, amount=sp.tez(40))
+
+        # Refunds are closed until the settlement deadline
+        scenario += auction.refund().run(
+            sender=dummy1.address,
+            now=sp.timestamp(150),
+            valid=False,
+            exception=Errors.SETTLEMENT_DEADLINE_NOT_PASSED,
+        )
+
+        # When Dummy 1 asks for a refund once the deadline is over, the whole deposit is returned
+        scenario += auction.refund().run(sender=dummy1.address, now=sp.timestamp(210))
+        scenario.verify(dummy1.balance == sp.tez(40))
+        scenario.verify(~auction.data.deposits.contains(dummy1.address))
+        scenario.verify(auction.balance == sp.tez(0))
+
+        # A final root leaving a depositor out can't be disputed, and the deposit is refunded past the deadline
+        dummy2 = Dummy.Dummy()
+        auction_2 = MerkleAuction(
+            admin=dummy_admin.address,
+            challenge_period=sp.int(100),
+            settlement_period=sp.int(200),
+        )
+        scenario += dummy2
+        scenario += auction_2
+        scenario += auction_2.place_bid(price=1000000, quantity=40).run(sender=dummy1.address, amount=sp.tez(40))
+        scenario += auction_2.place_bid(price=1500000, quantity=20).run(sender=dummy2.address, amount=sp.tez(30))
+
+        # The root only holds Dummy 1's leaf, a losing one
+        leaf = leaf_hash(scenario, dummy1.address, 0, sp.tez(40))
+        scenario += auction_2.post_root(root=leaf, clearing_price=sp.tez(1)).run(
+            sender=dummy_admin.address,
+            now=sp.timestamp(10),
+        )
+        scenario += auction_2.claim(quantity=0, refund=sp.tez(40), proof=[]).run(
+            sender=dummy1.address,
+            now=sp.timestamp(150),
+        )
+
+        # Dummy 2 has no leaf to claim or dispute, and gets the whole deposit back at the deadline
+        scenario += auction_2.refund().run(
+            sender=dummy2.address,
+            now=sp.timestamp(150),
+            valid=False,
+            exception=Errors.SETTLEMENT_DEADLINE_NOT_PASSED,
+        )
+        scenario += auction_2.refund().run(sender=dummy2.address, now=sp.timestamp(210))
+        scenario.verify(dummy2.balance == sp.tez(30))
+
+        # A claimed deposit can't be refunded on top
+        scenario += auction_2.refund().run(
+            sender=dummy1.address,
+            now=sp.timestamp(210),
+            valid=False,
+            exception=Errors.CANNOT_CLAIM,
+        )
+        scenario.verify(auction_2.balance == sp.tez(0))
+
+
+sp.add_compilation_target("merkle_auction", MerkleAuction())
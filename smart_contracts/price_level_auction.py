@@ -0,0 +1,376 @@
+import smartpy as sp
+
+PriceLevelQueue = sp.io.import_script_from_url("file:utilities/price_level_queue.py")
+Reveal = sp.io.import_script_from_url("file:utilities/reveal.py")
+Claims = sp.io.import_script_from_url("file:utilities/claims.py")
+AuctionTypes = sp.io.import_script_from_url("file:types/auction.py")
+Errors = sp.io.import_script_from_url("file:types/errors.py")
+Addresses = sp.io.import_script_from_url("file:helpers/addresses.py")
+Dummy = sp.io.import_script_from_url("file:helpers/dummy.py")
+Fa2_NFT = sp.io.import_script_from_url("file:helpers/fa2_NFT.py")
+
+#################
+# Default Values
+#################
+
+# Minimum bid price per NFT
+MIN_BID_PRICE = sp.mutez(100000)
+
+# Bid prices must be a multiple of the tick above the minimum bid price (1 mutez i.e no restriction)
+TICK_SIZE = sp.mutez(1)
+
+# Timestamp at which bidding starts
+BIDDING_START = sp.timestamp(0)
+
+# Timestamp at which bidding ends
+BIDDING_END = sp.timestamp(10)
+
+# Total supply for the NFTs
+TOTAL_SUPPLY = sp.nat(100)
+
+###########
+# Contract
+###########
+
+
+class PriceLevelAuction(sp.Contract, PriceLevelQueue.PriceLevelQueue, Reveal.Reveal, Claims.Claims):
+    def __init__(
+        self,
+        admin=Addresses.ADMIN,
+        bidding_start=BIDDING_START,
+        bidding_end=BIDDING_END,
+        min_bid_price=MIN_BID_PRICE,
+        tick_size=TICK_SIZE,
+        next_bid_id=sp.nat(0),
+        bids=sp.big_map(
+            l={},
+            tkey=sp.TNat,
+            tvalue=AuctionTypes.BID_TYPE,
+        ),
+        price_heap=sp.big_map(
+            l={},
+            tkey=sp.TNat,
+            tvalue=sp.TMutez,
+        ),
+        heap_size=sp.nat(0),
+        price_levels=sp.big_map(
+            l={},
+            tkey=sp.TMutez,
+            tvalue=AuctionTypes.PRICE_LEVEL_TYPE,
+        ),
+        level_prev=sp.big_map(
+            l={},
+            tkey=sp.TNat,
+            tvalue=sp.TNat,
+        ),
+        owner_to_bids=sp.big_map(
+            l={},
+            tkey=sp.TAddress,
+            tvalue=sp.TSet(sp.TNat),
+        ),
+        address_to_balance=sp.big_map(
+            l={},
+            tkey=sp.TAddress,
+            tvalue=sp.TMutez,
+        ),
+        quantity_under_bid=sp.nat(0),
+        total_supply=TOTAL_SUPPLY,
+        mint_index=sp.nat(0),
+        nft_contract_address=Addresses.NFT,
+    ):
+        self.init(
+            admin=admin,
+            bidding_start=bidding_start,
+            bidding_end=bidding_end,
+            min_bid_price=min_bid_price,
+            tick_size=tick_size,
+            next_bid_id=next_bid_id,
+            bids=bids,
+            price_heap=price_heap,
+            heap_size=heap_size,
+            price_levels=price_levels,
+            level_prev=level_prev,
+            owner_to_bids=owner_to_bids,
+            address_to_balance=address_to_balance,
+            quantity_under_bid=quantity_under_bid,
+            total_supply=total_supply,
+            mint_index=mint_index,
+            nft_contract_address=nft_contract_address,
+        )
+
+    @sp.entry_point
+    def place_bid(self, params):
+        sp.set_type(params, sp.TRecord(price=sp.TNat, quantity=sp.TNat))
+
+        # Verify that bidding period is on-going
+        sp.verify(
+            (sp.now >= self.data.bidding_start) & (sp.now < self.data.bidding_end),
+            Errors.BIDDING_IS_NOT_ACTIVE,
+        )
+
+        # Verify that the price is greater than or equals the minimum bid price
+        sp.verify(sp.utils.nat_to_mutez(params.price) >= self.data.min_bid_price, Errors.BID_PRICE_BELOW_MINIMUM)
+
+        # Verify that the price sits on a tick above the minimum bid price
+        sp.verify(
+            sp.as_nat(params.price - sp.utils.mutez_to_nat(self.data.min_bid_price))
+            % sp.utils.mutez_to_nat(self.data.tick_size)
+            == 0,
+            Errors.INVALID_PRICE_TICK,
+        )
+
+        # Verify that the sent tez amount is correct
+        sp.verify(
+            sp.amount == (sp.utils.nat_to_mutez(params.price * params.quantity)),
+            Errors.INVALID_TEZ_AMOUNT,
+        )
+
+        # Track locked funds for the sender
+        with sp.if_(~self.data.address_to_balance.contains(sp.sender)):
+            self.data.address_to_balance[sp.sender] = sp.mutez(0)
+        self.data.address_to_balance[sp.sender] += sp.amount
+
+        # Supply available for bid
+        available_for_bid = sp.as_nat(self.data.total_supply - self.data.quantity_under_bid)
+
+        # Quantity that would remain unfilled due to limited supply
+        unfilled = sp.local("unfilled", sp.nat(0))
+        with sp.if_(params.quantity > available_for_bid):
+            unfilled.value = sp.as_nat(params.quantity - available_for_bid)
+
+        # If there is unfilled bid quantity, cut the lowest price levels to accomodate the current bid.
+        # Every iteration removes a whole level, except the last one which trims a single level.
+        with sp.if_(unfilled.value > 0):
+            # Allows breaking of loop
+            break_loop = sp.local("break_loop", False)
+            with sp.while_((unfilled.value > 0) & ~break_loop.value & (self.data.heap_size > 0)):
+                # lowest price level
+                lowest_price = sp.local("lowest_price", self.data.price_heap[1])
+                level = self.data.price_levels[lowest_price.value]
+
+                with sp.if_(lowest_price.value >= sp.utils.nat_to_mutez(params.price)):
+                    break_loop.value = True
+                with sp.else_():
+                    # If the level's quantity is less than or equals the unfilled amount, evict the
+                    # entire level
+                    with sp.if_(level.quantity <= unfilled.value):
+                        unfilled.value = sp.as_nat(unfilled.value - level.quantity)
+                        self.data.quantity_under_bid = sp.as_nat(self.data.quantity_under_bid - level.quantity)
+                        self.delete_level()
+                    # Else cut the unfilled amount from the most recent bids of the level and set unfilled to zero
+                    with sp.else_():
+                        self.trim_level(lowest_price.value, unfilled.value)
+                        self.data.quantity_under_bid = sp.as_nat(self.data.quantity_under_bid - unfilled.value)
+                        unfilled.value = 0
+
+        # Verify that at least one bid slot is fillable i.e unfilled != quantity
+        sp.verify(unfilled.value != params.quantity, Errors.BID_PRICE_TOO_LOW)
+
+        self.data.next_bid_id += 1
+        self.data.bids[self.data.next_bid_id] = sp.record(
+            quantity=sp.as_nat(params.quantity - unfilled.value),
+            price=sp.utils.nat_to_mutez(params.price),
+            bidder=sp.sender,
+        )
+
+        self.add_to_level(self.data.next_bid_id)
+
+        self.data.quantity_under_bid += sp.as_nat(params.quantity - unfilled.value)
+
+    @sp.entry_point
+    def claim(self):
+        # Verify that the bidding period is over
+        sp.verify(sp.now >= self.data.bidding_end, Errors.BIDDING_IS_STILL_ACTIVE)
+
+        # Verify that claiming is possible for the sender
+        sp.verify(self.data.address_to_balance.contains(sp.sender), Errors.CANNOT_CLAIM)
+
+        # Total cost of bought NFTs
+        cost = sp.local("cost", sp.nat(0))
+
+        # Total quantity of NFTs won across the sender's live bids
+        quantity = sp.local("quantity", sp.nat(0))
+        with sp.for_("bid_id", self.data.owner_to_bids[sp.sender].elements()) as bid_id:
+            quantity.value += self.filled_quantity(bid_id)
+
+        # Clearing price is the lowest live price level
+        with sp.if_(quantity.value > 0):
+            cost.value = quantity.value * sp.utils.mutez_to_nat(self.data.price_heap[1])
+
+        # Mint all the won NFTs in a single operation
+        self.mint_nfts(self.nft_minter(), sp.sender, quantity.value)
+
+        # Send price cost to admin, if any
+        self.send_tez(self.data.admin, sp.utils.nat_to_mutez(cost.value))
+
+        # Return left over funds to bid owner, if any
+        self.send_tez(sp.sender, self.data.address_to_balance[sp.sender] - sp.utils.nat_to_mutez(cost.value))
+
+        # Delete owner from balances big map
+        del self.data.address_to_balance[sp.sender]
+
+
+if __name__ == "__main__":
+    ############
+    # place_bid
+    ############
+
+    @sp.add_test(name="place_bid aggregates bids at the same price into a single level")
+    def test():
+        scenario = sp.test_scenario()
+
+        auction = PriceLevelAuction()
+        scenario += auction
+
+        # When ALICE and BOB both bid at 1500000 mutez
+        scenario += auction.place_bid(price=1500000, quantity=20).run(
+            sender=Addresses.ALICE,
+            amount=sp.tez(30),
+        )
+        scenario += auction.place_bid(price=1500000, quantity=30).run(
+            sender=Addresses.BOB,
+            amount=sp.tez(45),
+        )
+
+        # Then a single price level holds both bids, BOB's on top
+        scenario.verify(auction.data.heap_size == 1)
+        scenario.verify(auction.data.price_heap[1] == sp.mutez(1500000))
+        scenario.verify(auction.data.price_levels[sp.mutez(1500000)] == sp.record(quantity=50, first=1, last=2))
+        scenario.verify(auction.data.level_prev[2] == 1)
+
+        # When JOHN bids at a lower price
+        scenario += auction.place_bid(price=1000000, quantity=10).run(
+            sender=Addresses.JOHN,
+            amount=sp.tez(10),
+        )
+
+        # Then his level takes up the minimal position in the heap
+        scenario.verify(auction.data.heap_size == 2)
+        scenario.verify(auction.data.price_heap[1] == sp.mutez(1000000))
+        scenario.verify(auction.data.price_heap[2] == sp.mutez(1500000))
+        scenario.verify(auction.data.quantity_under_bid == 60)
+
+    @sp.add_test(name="place_bid rejects prices off the tick size")
+    def test():
+        scenario = sp.test_scenario()
+
+        auction = PriceLevelAuction(tick_size=sp.mutez(100000))
+        scenario += auction
+
+        # A price on the tick is accepted
+        scenario += auction.place_bid(price=1500000, quantity=1).run(
+            sender=Addresses.ALICE,
+            amount=sp.mutez(1500000),
+        )
+
+        # A price off the tick is rejected
+        scenario += auction.place_bid(price=1550000, quantity=1).run(
+            sender=Addresses.BOB,
+            amount=sp.mutez(1550000),
+            valid=False,
+            exception=Errors.INVALID_PRICE_TICK,
+        )
+
+    @sp.add_test(name="place_bid evicts whole price levels and trims the most recent bids of the next one")
+    def test():
+        scenario = sp.test_scenario()
+
+        auction = PriceLevelAuction()
+        scenario += auction
+
+        # Three bids at 1 tez, one at 2 tez, filling 90 of 100 NFTs
+        scenario += auction.place_bid(price=1000000, quantity=20).run(sender=Addresses.ALICE, amount=sp.tez(20))
+        scenario += auction.place_bid(price=1000000, quantity=20).run(sender=Addresses.BOB, amount=sp.tez(20))
+        scenario += auction.place_bid(price=1000000, quantity=10).run(sender=Addresses.ALICE, amount=sp.tez(10))
+        scenario += auction.place_bid(price=2000000, quantity=40).run(sender=Addresses.BOB, amount=sp.tez(80))
+
+        # When JOHN bids for 35 NFTs at 1500000 mutez
+        scenario += auction.place_bid(price=1500000, quantity=35).run(
+            sender=Addresses.JOHN,
+            amount=sp.mutez(52500000),
+        )
+
+        # Then 25 NFTs are cut from the 1 tez level, most recent bids first as in batch_auction.py: ALICE's
+        # second bid and 15 from BOB's bid. ALICE's first bid is left untouched.
+        scenario.verify(auction.data.price_levels[sp.mutez(1000000)] == sp.record(quantity=25, first=1, last=2))
+        scenario.verify(auction.data.bids[3].quantity == 0)
+        scenario.verify(auction.data.bids[2].quantity == 5)
+        scenario.verify(auction.data.bids[1].quantity == 20)
+        scenario.verify(~auction.data.level_prev.contains(3))
+        scenario.verify(auction.data.quantity_under_bid == 100)
+
+        # When JOHN bids for 30 NFTs at 3 tez
+        scenario += auction.place_bid(price=3000000, quantity=30).run(
+            sender=Addresses.JOHN,
+            amount=sp.tez(90),
+        )
+
+        # Then the whole 1 tez level is evicted and the 1.5 tez level is trimmed by 5
+        scenario.verify(~auction.data.price_levels.contains(sp.mutez(1000000)))
+        scenario.verify(auction.data.price_heap[1] == sp.mutez(1500000))
+        scenario.verify(auction.data.heap_size == 3)
+        scenario.verify(auction.data.price_levels[sp.mutez(1500000)] == sp.record(quantity=30, first=5, last=5))
+        scenario.verify(auction.data.bids[5].quantity == 30)
+        scenario.verify(auction.data.quantity_under_bid == 100)
+
+    ########
+    # claim
+    ########
+
+    @sp.add_test(name="claim mints live bids and refunds evicted and trimmed quantities")
+    def test():
+        scenario = sp.test_scenario()
+
+        dummy1 = Dummy.Dummy()
+        dummy2 = Dummy.Dummy()
+        dummy_admin = Dummy.Dummy()
+        fa2_nft = Fa2_NFT.FA2(
+            Fa2_NFT.FA2_config(),
+            sp.utils.metadata_of_url("https://example/com"),
+            Addresses.ADMIN,
+        )
+        auction = PriceLevelAuction(
+            admin=dummy_admin.address,
+            nft_contract_address=fa2_nft.address,
+        )
+
+        scenario += fa2_nft
+        scenario += dummy1
+        scenario += dummy2
+        scenario += dummy_admin
+        scenario += auction
+
+        # update admin of the NFT contract for minting
+        scenario += fa2_nft.set_administrator(auction.address).run(sender=Addresses.ADMIN)
+
+        # Dummy 1 bids twice at 1 tez, Dummy 2 outbids part of it at 2 tez
+        scenario += auction.place_bid(price=1000000, quantity=50).run(sender=dummy1.address, amount=sp.tez(50))
+        scenario += auction.place_bid(price=1000000, quantity=30).run(sender=dummy1.address, amount=sp.tez(30))
+        scenario += auction.place_bid(price=2000000, quantity=60).run(sender=dummy2.address, amount=sp.tez(120))
+
+        # NOTICE: Dummy 1's second bid is evicted and the first one cut down to 40 NFTs, the clearing price
+        # is 1 tez
+
+        # When Dummy 1 claims
+        scenario += auction.claim().run(sender=dummy1.address, now=sp.timestamp(10))
+
+        # 40 NFTs are minted and 40 tez are refunded
+        scenario.verify(
+            fa2_nft.data.ledger.contains((dummy1.address, 0)) & fa2_nft.data.ledger.contains((dummy1.address, 39))
+        )
+        scenario.verify(dummy1.balance == sp.tez(40))
+        scenario.verify(dummy_admin.balance == sp.tez(40))
+
+        # When Dummy 2 claims
+        scenario += auction.claim().run(sender=dummy2.address, now=sp.timestamp(10))
+
+        # 60 NFTs are minted at the clearing price and 60 tez are refunded
+        scenario.verify(
+            fa2_nft.data.ledger.contains((dummy2.address, 40)) & fa2_nft.data.ledger.contains((dummy2.address, 99))
+        )
+        scenario.verify(dummy2.balance == sp.tez(60))
+        scenario.verify(dummy_admin.balance == sp.tez(100))
+        scenario.verify(auction.balance == sp.tez(0))
+
+
+sp.add_compilation_target("price_level_auction", PriceLevelAuction())
@@ -8,3 +8,89 @@ BID_TYPE = sp.TRecord(
     price=sp.TMutez,
     bidder=sp.TAddress,
 ).layout(("quantity", ("price", "bidder")))
+
+# price    : The price of each NFT in mutez
+# quantity : Number of NFTs
+# bid_id   : Key of the bid in `bids`
+HEAP_NODE_TYPE = sp.TRecord(
+    price=sp.TMutez,
+    quantity=sp.TNat,
+    bid_id=sp.TNat,
+).layout(("price", ("quantity", "bid_id")))
+
+# balance          : Total tez locked by the bidder
+# winning_quantity : Quantity of NFTs currently won across the bidder's bids
+# minted           : Quantity of won NFTs already minted by a partial claim
+ACCOUNT_TYPE = sp.TRecord(
+    balance=sp.TMutez,
+    winning_quantity=sp.TNat,
+    minted=sp.TNat,
+).layout(("balance", ("winning_quantity", "minted")))
+
+# quantity : Aggregate NFT quantity of the live bids at the price level
+# first    : Id of the oldest bid of the level
+# last     : Id of the most recent bid of the level still holding a quantity (the next bid to be cut)
+PRICE_LEVEL_TYPE = sp.TRecord(
+    quantity=sp.TNat,
+    first=sp.TNat,
+    last=sp.TNat,
+).layout(("quantity", ("first", "last")))
+
+# address  : Wallet address of the bidder
+# quantity : Number of NFTs won by the bidder
+# refund   : Part of the bidder's deposit returned on claim
+MERKLE_LEAF_TYPE = sp.TRecord(
+    address=sp.TAddress,
+    quantity=sp.TNat,
+    refund=sp.TMutez,
+).layout(("address", ("quantity", "refund")))
+
+# price    : The price of each NFT in mutez
+# quantity : Quantity of NFTs currently held by the bid
+# prev     : Bid id of the previous node, evicted before this one (0 at the head)
+# next     : Bid id of the next node, evicted after this one (0 at the tail)
+LIST_NODE_TYPE = sp.TRecord(
+    price=sp.TMutez,
+    quantity=sp.TNat,
+    prev=sp.TNat,
+    next=sp.TNat,
+).layout(("price", ("quantity", ("prev", "next"))))
+
+#########
+# Events
+#########
+
+# bid_id   : Key of the bid in `bids`
+# bidder   : Wallet address of the bidder
+# price    : The price of each NFT in mutez
+# quantity : Quantity of NFTs that entered the queue
+BID_PLACED_EVENT_TYPE = sp.TRecord(
+    bid_id=sp.TNat,
+    bidder=sp.TAddress,
+    price=sp.TMutez,
+    quantity=sp.TNat,
+).layout(("bid_id", ("bidder", ("price", "quantity"))))
+
+# bid_id   : Key of the bid in `bids`
+# quantity : Quantity of NFTs held by the bid in the queue after the change (bid_reduced, bid_refilled),
+#            or taken out of the queue with it (bid_evicted, bid_cancelled)
+BID_QUANTITY_EVENT_TYPE = sp.TRecord(
+    bid_id=sp.TNat,
+    quantity=sp.TNat,
+).layout(("bid_id", "quantity"))
+
+# bid_id : Key of the bid in `bids`
+# price  : The new price of each NFT in mutez
+BID_INCREASED_EVENT_TYPE = sp.TRecord(
+    bid_id=sp.TNat,
+    price=sp.TMutez,
+).layout(("bid_id", "price"))
+
+# bidder   : Wallet address of the settled account
+# quantity : Number of NFTs won by the account
+# refund   : Part of the locked balance returned to the bidder
+CLAIMED_EVENT_TYPE = sp.TRecord(
+    bidder=sp.TAddress,
+    quantity=sp.TNat,
+    refund=sp.TMutez,
+).layout(("bidder", ("quantity", "refund")))
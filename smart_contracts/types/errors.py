@@ -10,6 +10,48 @@ BIDDING_IS_STILL_ACTIVE = "BIDDING_IS_STILL_ACTIVE"
 
 CANNOT_CLAIM = "CANNOT_CLAIM"
 
+AUCTION_ALREADY_SETTLED = "AUCTION_ALREADY_SETTLED"
+
+AUCTION_NOT_SETTLED = "AUCTION_NOT_SETTLED"
+
+NOTHING_TO_SETTLE = "NOTHING_TO_SETTLE"
+
+NO_PROCEEDS = "NO_PROCEEDS"
+
+BID_NOT_IN_QUEUE = "BID_NOT_IN_QUEUE"
+
+PRICE_NOT_INCREASED = "PRICE_NOT_INCREASED"
+
+INVALID_QUANTITY = "INVALID_QUANTITY"
+
+ROOT_NOT_POSTED = "ROOT_NOT_POSTED"
+
+ROOT_ALREADY_FINAL = "ROOT_ALREADY_FINAL"
+
+CHALLENGE_WINDOW_OPEN = "CHALLENGE_WINDOW_OPEN"
+
+INVALID_PROOF = "INVALID_PROOF"
+
+INVALID_SETTLEMENT = "INVALID_SETTLEMENT"
+
+SETTLEMENT_IS_VALID = "SETTLEMENT_IS_VALID"
+
+SETTLEMENT_DEADLINE_PASSED = "SETTLEMENT_DEADLINE_PASSED"
+
+SETTLEMENT_DEADLINE_NOT_PASSED = "SETTLEMENT_DEADLINE_NOT_PASSED"
+
+INVALID_BID_ORDER = "INVALID_BID_ORDER"
+
+INVALID_HINT = "INVALID_HINT"
+
+EMPTY_QUEUE = "EMPTY_QUEUE"
+
+EVICTIONS_PENDING = "EVICTIONS_PENDING"
+
+NO_PENDING_EVICTIONS = "NO_PENDING_EVICTIONS"
+
 INVALID_NFT_CONTRACT = "INVALID_NFT_CONTRACT"
 
 NOT_AUTHORIZED = "NOT_AUTHORIZED"
+
+INVALID_PRICE_TICK = "INVALID_PRICE_TICK"
@@ -0,0 +1,47 @@
+import smartpy as sp
+
+Errors = sp.io.import_script_from_url("file:types/errors.py")
+
+
+##############################################################
+# Utility to record bids in an append-only log during bidding
+##############################################################
+
+
+class BidLog:
+    # Bids are only appended to `bids` and their tez added to the bidder's deposit. Allocating the
+    # supply among them is left to the settlement of the contract using the log.
+
+    @sp.entry_point
+    def place_bid(self, params):
+        sp.set_type(params, sp.TRecord(price=sp.TNat, quantity=sp.TNat))
+
+        # Verify that bidding period is on-going
+        sp.verify(
+            (sp.now >= self.data.bidding_start) & (sp.now < self.data.bidding_end),
+            Errors.BIDDING_IS_NOT_ACTIVE,
+        )
+
+        # Verify that the price is greater than or equals the minimum bid price
+        sp.verify(sp.utils.nat_to_mutez(params.price) >= self.data.min_bid_price, Errors.BID_PRICE_BELOW_MINIMUM)
+
+        # Verify that at least one NFT is asked for
+        sp.verify(params.quantity > 0, Errors.INVALID_QUANTITY)
+
+        # Verify that the sent tez amount is correct
+        sp.verify(
+            sp.amount == (sp.utils.nat_to_mutez(params.price * params.quantity)),
+            Errors.INVALID_TEZ_AMOUNT,
+        )
+
+        # Track locked funds for the sender
+        with sp.if_(~self.data.deposits.contains(sp.sender)):
+            self.data.deposits[sp.sender] = sp.mutez(0)
+        self.data.deposits[sp.sender] += sp.amount
+
+        self.data.next_bid_id += 1
+        self.data.bids[self.data.next_bid_id] = sp.record(
+            quantity=params.quantity,
+            price=sp.utils.nat_to_mutez(params.price),
+            bidder=sp.sender,
+        )
@@ -0,0 +1,83 @@
+import smartpy as sp
+
+Errors = sp.io.import_script_from_url("file:types/errors.py")
+
+
+#####################################################################
+# Utility to mint the NFTs won by a bidder and pay out the tez locked
+#####################################################################
+
+
+class Claims:
+    def nft_minter(self):
+        # NFT contract instance
+        return sp.contract(
+            sp.TRecord(
+                first_token_id=sp.TNat,
+                count=sp.TNat,
+                address=sp.TAddress,
+                metadata=sp.TMap(sp.TString, sp.TBytes),
+            ),
+            self.data.nft_contract_address,
+            "mint_batch",
+        ).open_some(Errors.INVALID_NFT_CONTRACT)
+
+    def mint_nfts(self, minter, address, count):
+        # Mints `count` NFTs to `address` in a single operation, from the next token id
+        with sp.if_(count > 0):
+            sp.transfer(
+                sp.record(
+                    first_token_id=self.data.mint_index,
+                    count=count,
+                    address=address,
+                    metadata={"": sp.utils.bytes_of_string("https://example.com")},
+                ),
+                sp.tez(0),
+                minter,
+            )
+            self.data.mint_index += count
+
+    def send_tez(self, address, amount):
+        # Nothing is sent for a zero amount, since a zero tez transfer to an implicit account fails
+        with sp.if_(amount > sp.mutez(0)):
+            sp.send(address, amount)
+
+    def pay_out(self, address, balance, cost):
+        # Adds the cost of the NFTs won to the proceeds, withdrawn by the admin at once, and returns the
+        # rest of the tez locked by `address`. Returns the refund.
+        self.data.proceeds += cost
+        refund = sp.local("refund", balance - cost)
+        self.send_tez(address, refund.value)
+        return refund
+
+    def settle_account(self, address, minter, max_mints):
+        # Mints up to `max_mints` of the NFTs won by `address` in `accounts`. Once all of them are minted,
+        # pays their cost to the proceeds, refunds the rest of the locked balance and deletes the account.
+        # Returns the number of NFTs minted.
+        account = self.data.accounts[address]
+
+        # NFTs won across the account's bids that are left to mint
+        remaining = sp.local("remaining", sp.as_nat(account.winning_quantity - account.minted))
+
+        # Mint the next chunk of NFTs in a single operation
+        count = sp.local("count", sp.min(remaining.value, max_mints))
+        self.mint_nfts(minter, address, count.value)
+        account.minted += count.value
+
+        # Pay out once every NFT of the account is minted
+        with sp.if_(count.value == remaining.value):
+            # Total cost of bought NFTs
+            cost = sp.local("cost", account.winning_quantity * sp.utils.mutez_to_nat(self.data.clearing_price))
+
+            # Add price cost to the proceeds and return left over funds to bid owner
+            refund = self.pay_out(address, account.balance, sp.utils.nat_to_mutez(cost.value))
+            self.account_settled(address, account.winning_quantity, refund.value)
+
+            # Delete owner's account
+            del self.data.accounts[address]
+
+        return count
+
+    def account_settled(self, address, quantity, refund):
+        # Called by settle_account once an account is paid out, before it is deleted
+        pass
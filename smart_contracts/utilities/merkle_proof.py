@@ -0,0 +1,19 @@
+import smartpy as sp
+
+###########################################
+# Utility to verify Merkle inclusion proofs
+###########################################
+
+
+class MerkleProof:
+    # Parent nodes are the blake2b hash of their two children concatenated in ascending order, so a
+    # proof is just the list of sibling hashes from the leaf up to the root.
+
+    def merkle_root_of(self, leaf, proof):
+        node = sp.local("node", leaf)
+        with sp.for_("sibling", proof) as sibling:
+            with sp.if_(node.value < sibling):
+                node.value = sp.blake2b(sp.concat([node.value, sibling]))
+            with sp.else_():
+                node.value = sp.blake2b(sp.concat([sibling, node.value]))
+        return node
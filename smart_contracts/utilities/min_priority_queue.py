@@ -4,73 +4,140 @@ import smartpy as sp
 # Implementation of a min priority queue
 #########################################
 
+# The queue lives in a big_map (index -> heap node) so that an operation only loads the heap slots it
+# actually reads. big_maps do not support sp.len, hence the number of nodes is tracked in `queue_size`.
+
+# Every node carries the comparison key of its bid (see HEAP_NODE_TYPE), so sifting never reads the
+# `bids` big_map.
+
+# The heap is d-ary, d being `self.heap_arity` (2 for a binary heap). Indices start at 1: the children
+# of node k are d * (k - 1) + 2 ... d * k + 1 and its parent is (k - 2) // d + 1. A wider heap is
+# shallower, trading fewer levels for more child comparisons per level on the way down.
+
+# Sifting moves a hole instead of swapping nodes: every level costs one write, and the sifted node is
+# written once at its final position.
+
+# `heap_positions` maps the bid id of every node to its index in the queue, and is kept in sync by every
+# write to the queue (see `set_node`). It lets any bid be located and removed or re-keyed in O(log n).
+
 
 class MinPriorityQueue:
-    def swap(self, i, j):
+    def is_greater(self, node_1, node_2):
+        # Lowest price goes first, then lowest quantity. Exact ties put the most recent bid first, so
+        # that it is the first one to be evicted.
+        return (node_1.price > node_2.price) | (
+            (node_1.price == node_2.price)
+            & (
+                (node_1.quantity > node_2.quantity)
+                | ((node_1.quantity == node_2.quantity) & (node_1.bid_id < node_2.bid_id))
+            )
+        )
+
+    def parent_index(self, k):
+        # (k - 2) // d + 1, kept in nat arithmetic (k > 1)
+        return (k + (self.heap_arity - 2)) // self.heap_arity
+
+    def first_child_index(self, k):
+        return sp.as_nat(self.heap_arity * k - (self.heap_arity - 2))
+
+    def set_node(self, k, node):
+        self.data.bids_priority_queue[k] = node
+        self.data.heap_positions[node.bid_id] = k
+
+    def sift_up(self, hole, node):
+        # Parents greater than `node` move down into the hole
         bids_pq = self.data.bids_priority_queue
-        bids_pq[i] = bids_pq[i] + bids_pq[j]
-        bids_pq[j] = sp.as_nat(bids_pq[i] - bids_pq[j])
-        bids_pq[i] = sp.as_nat(bids_pq[i] - bids_pq[j])
 
-    @sp.sub_entry_point
-    def insert(self, bid_id):
-        bids = self.data.bids
+        sifting_up = sp.local("sifting_up", True)
+        with sp.while_(sifting_up.value):
+            with sp.if_(hole.value == 1):
+                sifting_up.value = False
+            with sp.else_():
+                parent = sp.local("parent", self.parent_index(hole.value))
+                parent_node = sp.local("parent_node", bids_pq[parent.value])
+                with sp.if_(self.is_greater(parent_node.value, node)):
+                    self.set_node(hole.value, parent_node.value)
+                    hole.value = parent.value
+                with sp.else_():
+                    sifting_up.value = False
+
+    def sift_down(self, hole, node):
+        # The smallest child moves up into the hole while it is lower than `node`
         bids_pq = self.data.bids_priority_queue
 
-        k = sp.local("k", sp.len(bids_pq) + 1)
-        bids_pq[sp.len(bids_pq) + 1] = bid_id
-
-        # Swim newly inserted value
-        with sp.while_(k.value > 1):
-            bid_1 = self.data.bids[bids_pq[k.value // 2]]
-            bid_2 = self.data.bids[bids_pq[k.value]]
-            with sp.if_(
-                (bid_1.price > bid_2.price) | ((bid_1.price == bid_2.price) & (bid_1.quantity > bid_2.quantity))
-            ):
-                self.swap(k.value // 2, k.value)
-                k.value = k.value // 2
+        sifting_down = sp.local("sifting_down", True)
+        with sp.while_(sifting_down.value):
+            first_child = sp.local("first_child", self.first_child_index(hole.value))
+            with sp.if_(first_child.value > self.data.queue_size):
+                sifting_down.value = False
             with sp.else_():
-                k.value = 0
+                min_child = sp.local("min_child", first_child.value)
+                min_node = sp.local("min_node", bids_pq[first_child.value])
+
+                # Unrolled scan over the remaining children of the hole
+                for offset in range(1, self.heap_arity):
+                    with sp.if_(first_child.value + offset <= self.data.queue_size):
+                        child_node = sp.local("child_node", bids_pq[first_child.value + offset])
+                        with sp.if_(self.is_greater(min_node.value, child_node.value)):
+                            min_child.value = first_child.value + offset
+                            min_node.value = child_node.value
 
-        # Map the bid id to owner's address
-        with sp.if_(~self.data.owner_to_bids.contains(bids[bid_id].bidder)):
-            self.data.owner_to_bids[bids[bid_id].bidder] = sp.set()
-        self.data.owner_to_bids[bids[bid_id].bidder].add(bid_id)
+                with sp.if_(self.is_greater(node, min_node.value)):
+                    self.set_node(hole.value, min_node.value)
+                    hole.value = min_child.value
+                with sp.else_():
+                    sifting_down.value = False
 
     @sp.sub_entry_point
-    def delete(self):
-        bids = self.data.bids
+    def insert(self, node):
+        self.data.queue_size += 1
+        hole = sp.local("hole", self.data.queue_size)
+
+        self.sift_up(hole, node)
+        self.set_node(hole.value, node)
+
+    @sp.sub_entry_point
+    def remove(self, k):
+        # Removes the node at index k, the root for an eviction
         bids_pq = self.data.bids_priority_queue
 
-        last_index = sp.len(bids_pq)
-        root_index = 1
-
-        # Remove smallest bid from its owner's mapping
-        min_id = bids_pq[root_index]
-        self.data.owner_to_bids[bids[min_id].bidder].remove(min_id)
-
-        self.swap(last_index, root_index)
-        del bids_pq[last_index]
-
-        k = sp.local("k", 1)
-        j = sp.local("j", 2 * k.value)
-
-        # Sink the root
-        with sp.while_((2 * k.value) <= sp.len(bids_pq)):
-            with sp.if_(j.value < sp.len(bids_pq)):
-                child_1 = bids[bids_pq[j.value]]
-                child_2 = bids[bids_pq[j.value + 1]]
-                with sp.if_(
-                    (child_1.price > child_2.price)
-                    | ((child_1.price == child_2.price) & (child_1.quantity > child_2.quantity))
-                ):
-                    j.value = j.value + 1
-                parent = bids[bids_pq[k.value]]
-                child = bids[bids_pq[j.value]]
-            with sp.if_(
-                (parent.price > child.price) | ((parent.price == child.price) & (parent.quantity > child.quantity))
-            ):
-                self.swap(j.value, k.value)
+        del self.data.heap_positions[bids_pq[k].bid_id]
+
+        # The last node fills the removed node's place
+        last_node = sp.local("last_node", bids_pq[self.data.queue_size])
+        del bids_pq[self.data.queue_size]
+        self.data.queue_size = sp.as_nat(self.data.queue_size - 1)
+
+        # Nothing to fill when the removed node was the last one
+        with sp.if_(k <= self.data.queue_size):
+            hole = sp.local("hole", k)
+
+            # The last node comes from another subtree, so it may belong above the hole as well as below
+            moves_up = sp.local("moves_up", False)
+            with sp.if_(k > 1):
+                moves_up.value = self.is_greater(bids_pq[self.parent_index(k)], last_node.value)
+
+            with sp.if_(moves_up.value):
+                self.sift_up(hole, last_node.value)
             with sp.else_():
-                # Inflate k so that the loop breaks
-                k.value = sp.len(bids_pq)
+                self.sift_down(hole, last_node.value)
+
+            self.set_node(hole.value, last_node.value)
+
+    @sp.sub_entry_point
+    def increase_key(self, node):
+        # Replaces the node of the same bid by `node`, whose key must not be lower, and moves it down to
+        # its place
+        hole = sp.local("hole", self.data.heap_positions[node.bid_id])
+
+        self.sift_down(hole, node)
+        self.set_node(hole.value, node)
+
+    @sp.sub_entry_point
+    def decrease_key(self, node):
+        # Replaces the node of the same bid by `node`, whose key must not be greater, and moves it up to
+        # its place
+        hole = sp.local("hole", self.data.heap_positions[node.bid_id])
+
+        self.sift_up(hole, node)
+        self.set_node(hole.value, node)
@@ -0,0 +1,107 @@
+import smartpy as sp
+
+###################################################
+# Implementation of a bounded queue of outbid bids
+###################################################
+
+# Quantities cut from the bids priority queue (evicted bids, reduced bids and the unfilled part of new
+# bids) are kept in a binary max heap, so that supply freed later on can be handed back to the best of
+# them in O(log n). Like the bids priority queue, it lives in a big_map (index -> heap node) with indices
+# starting at 1, and its size is tracked in `outbid_size`.
+
+# Nodes are ranked with MinPriorityQueue.is_greater: the root is the node that the bids priority queue
+# would evict last. A bid can have several nodes in the queue, one per cut, and `outbid_counts` maps each
+# bid with nodes in the queue to their number.
+
+# The queue holds at most `self.outbid_capacity` nodes. Once it is full, a new node takes the place of the
+# last leaf if it outranks it, and is dropped otherwise. A leaf ranks below all of its ancestors, though
+# not necessarily below every node of the heap, which keeps the bound O(log n). Every dropped node is
+# handed to `self.release_outbid` once uncounted, for the contract to free what it was keeping for the node.
+
+
+class OutbidQueue:
+    def set_outbid_node(self, k, node):
+        self.data.outbid_queue[k] = node
+
+    def count_outbid(self, bid_id):
+        self.data.outbid_counts[bid_id] = self.data.outbid_counts.get(bid_id, sp.nat(0)) + 1
+
+    def uncount_outbid(self, bid_id):
+        with sp.if_(self.data.outbid_counts[bid_id] == 1):
+            del self.data.outbid_counts[bid_id]
+        with sp.else_():
+            self.data.outbid_counts[bid_id] = sp.as_nat(self.data.outbid_counts[bid_id] - 1)
+
+    @sp.sub_entry_point
+    def push_outbid(self, node):
+        outbid_queue = self.data.outbid_queue
+
+        pushed = sp.local("pushed", True)
+        with sp.if_(self.data.outbid_size < self.outbid_capacity):
+            self.data.outbid_size += 1
+            self.count_outbid(node.bid_id)
+        with sp.else_():
+            # Either the last leaf or `node` is dropped. `node` is counted first, as the leaf may be a
+            # node of the same bid.
+            outbid_leaf = sp.local("outbid_leaf", outbid_queue[self.data.outbid_size])
+            with sp.if_(self.is_greater(node, outbid_leaf.value)):
+                self.count_outbid(node.bid_id)
+                self.uncount_outbid(outbid_leaf.value.bid_id)
+                self.release_outbid(outbid_leaf.value)
+            with sp.else_():
+                pushed.value = False
+                self.release_outbid(node)
+
+        with sp.if_(pushed.value):
+            outbid_hole = sp.local("outbid_hole", self.data.outbid_size)
+
+            # Parents ranked below `node` move down into the hole
+            rising = sp.local("rising", True)
+            with sp.while_(rising.value):
+                with sp.if_(outbid_hole.value == 1):
+                    rising.value = False
+                with sp.else_():
+                    outbid_parent = sp.local("outbid_parent", outbid_hole.value // 2)
+                    outbid_parent_node = sp.local("outbid_parent_node", outbid_queue[outbid_parent.value])
+                    with sp.if_(self.is_greater(node, outbid_parent_node.value)):
+                        self.set_outbid_node(outbid_hole.value, outbid_parent_node.value)
+                        outbid_hole.value = outbid_parent.value
+                    with sp.else_():
+                        rising.value = False
+
+            self.set_outbid_node(outbid_hole.value, node)
+
+    def pop_outbid(self):
+        # Removes the root. The caller reads it beforehand.
+        outbid_queue = self.data.outbid_queue
+
+        self.uncount_outbid(outbid_queue[1].bid_id)
+
+        # The last node fills the root's place
+        outbid_last = sp.local("outbid_last", outbid_queue[self.data.outbid_size])
+        del outbid_queue[self.data.outbid_size]
+        self.data.outbid_size = sp.as_nat(self.data.outbid_size - 1)
+
+        with sp.if_(self.data.outbid_size > 0):
+            outbid_hole = sp.local("outbid_hole", sp.nat(1))
+
+            # The best child moves up into the hole while it outranks the last node
+            sinking = sp.local("sinking", True)
+            with sp.while_(sinking.value):
+                outbid_child = sp.local("outbid_child", 2 * outbid_hole.value)
+                with sp.if_(outbid_child.value > self.data.outbid_size):
+                    sinking.value = False
+                with sp.else_():
+                    outbid_child_node = sp.local("outbid_child_node", outbid_queue[outbid_child.value])
+                    with sp.if_(outbid_child.value + 1 <= self.data.outbid_size):
+                        with sp.if_(self.is_greater(outbid_queue[outbid_child.value + 1], outbid_child_node.value)):
+                            outbid_child.value += 1
+                            outbid_child_node.value = outbid_queue[outbid_child.value]
+
+                    with sp.if_(self.is_greater(outbid_child_node.value, outbid_last.value)):
+                        self.set_outbid_node(outbid_hole.value, outbid_child_node.value)
+                        outbid_hole.value = outbid_child.value
+                    with sp.else_():
+                        sinking.value = False
+
+            self.set_outbid_node(outbid_hole.value, outbid_last.value)
@@ -0,0 +1,119 @@
+import smartpy as sp
+
+##############################################################
+# Implementation of a price level order book (min heap of prices)
+##############################################################
+
+# Bids at the same price are aggregated into a single level. The heap (index -> price) only holds
+# distinct prices, while each level keeps the total quantity of its live bids and a stack of bid ids
+# linked from the most recent one through `level_prev`. Like in batch_auction.py, the most recent bid
+# of a level is cut first. Cuts are applied to the bid records, and a bid belongs to a live level as
+# long as its id is at or after the level's `first` pointer, so a whole level is evicted without
+# visiting its bids.
+
+
+class PriceLevelQueue:
+    @sp.sub_entry_point
+    def insert_level(self, price):
+        heap = self.data.price_heap
+
+        self.data.heap_size += 1
+        k = sp.local("k", self.data.heap_size)
+        done = sp.local("done", False)
+
+        # Swim the hole up until the new price fits
+        with sp.while_((k.value > 1) & ~done.value):
+            parent_price = heap[k.value // 2]
+            with sp.if_(parent_price > price):
+                heap[k.value] = parent_price
+                k.value = k.value // 2
+            with sp.else_():
+                done.value = True
+
+        heap[k.value] = price
+
+    @sp.sub_entry_point
+    def delete_level(self):
+        heap = self.data.price_heap
+
+        # Drop the lowest level along with its aggregate. The `level_prev` links of its bids are left in
+        # place: deleting them would visit every bid of the level, and they are unreachable by design, as
+        # links are only followed from the `last` bid of a live level and a reopened level starts from a
+        # new bid.
+        del self.data.price_levels[heap[1]]
+
+        last_price = sp.local("last_price", heap[self.data.heap_size])
+        del heap[self.data.heap_size]
+        self.data.heap_size = sp.as_nat(self.data.heap_size - 1)
+
+        with sp.if_(self.data.heap_size > 0):
+            k = sp.local("k", 1)
+            j = sp.local("j", 2)
+            done = sp.local("done", False)
+
+            # Sink the hole from the root until the last price fits
+            with sp.while_(~done.value & ((2 * k.value) <= self.data.heap_size)):
+                j.value = 2 * k.value
+                with sp.if_(j.value < self.data.heap_size):
+                    with sp.if_(heap[j.value + 1] < heap[j.value]):
+                        j.value += 1
+                with sp.if_(heap[j.value] < last_price.value):
+                    heap[k.value] = heap[j.value]
+                    k.value = j.value
+                with sp.else_():
+                    done.value = True
+
+            heap[k.value] = last_price.value
+
+    def add_to_level(self, bid_id):
+        bid = self.data.bids[bid_id]
+
+        # Push the bid on top of its price level, opening the level if required
+        with sp.if_(self.data.price_levels.contains(bid.price)):
+            level = self.data.price_levels[bid.price]
+            self.data.level_prev[bid_id] = level.last
+            level.last = bid_id
+            level.quantity += bid.quantity
+        with sp.else_():
+            self.data.price_levels[bid.price] = sp.record(
+                quantity=bid.quantity,
+                first=bid_id,
+                last=bid_id,
+            )
+            self.insert_level(bid.price)
+
+        # Map the bid id to owner's address
+        with sp.if_(~self.data.owner_to_bids.contains(bid.bidder)):
+            self.data.owner_to_bids[bid.bidder] = sp.set()
+        self.data.owner_to_bids[bid.bidder].add(bid_id)
+
+    def trim_level(self, price, quantity):
+        level = self.data.price_levels[price]
+        level.quantity = sp.as_nat(level.quantity - quantity)
+
+        # Cut the quantity from the most recent bids, unlinking the ones that are completely consumed. The
+        # level holds more than `quantity`, so the cut never goes past its oldest bid.
+        remaining = sp.local("remaining", quantity)
+        with sp.while_(remaining.value > 0):
+            last_bid = self.data.bids[level.last]
+            with sp.if_(last_bid.quantity <= remaining.value):
+                remaining.value = sp.as_nat(remaining.value - last_bid.quantity)
+                last_bid.quantity = 0
+                prev_id = sp.local("prev_id", self.data.level_prev[level.last])
+                del self.data.level_prev[level.last]
+                level.last = prev_id.value
+            with sp.else_():
+                last_bid.quantity = sp.as_nat(last_bid.quantity - remaining.value)
+                remaining.value = 0
+
+    def filled_quantity(self, bid_id):
+        bid = self.data.bids[bid_id]
+        filled = sp.local("filled", sp.nat(0))
+
+        # A bid is live only if its level still exists and was not reopened after the bid was evicted with
+        # it. The record holds what is left of the bid after cuts.
+        with sp.if_(self.data.price_levels.contains(bid.price)):
+            with sp.if_(bid_id >= self.data.price_levels[bid.price].first):
+                filled.value = bid.quantity
+
+        return filled.value
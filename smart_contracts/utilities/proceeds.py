@@ -0,0 +1,21 @@
+import smartpy as sp
+
+Errors = sp.io.import_script_from_url("file:types/errors.py")
+
+
+###################################################
+# Utility to withdraw the sale income of an auction
+###################################################
+
+
+class Proceeds:
+    @sp.entry_point
+    def withdraw_proceeds(self):
+        # Verify that the sender is the admin
+        sp.verify(sp.sender == self.data.admin, Errors.NOT_AUTHORIZED)
+
+        # Verify that there are proceeds to withdraw
+        sp.verify(self.data.proceeds > sp.mutez(0), Errors.NO_PROCEEDS)
+
+        sp.send(self.data.admin, self.data.proceeds)
+        self.data.proceeds = sp.mutez(0)
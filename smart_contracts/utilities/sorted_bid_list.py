@@ -0,0 +1,63 @@
+import smartpy as sp
+
+Errors = sp.io.import_script_from_url("file:types/errors.py")
+
+#################################################
+# Implementation of a sorted doubly linked list
+#################################################
+
+# The list lives in a big_map (bid id -> list node) and is sorted in eviction order: `list_head` is the
+# lowest bid, evicted first, and `list_tail` the highest one. Nodes are ranked like the nodes of
+# MinPriorityQueue, and link to their neighbours by bid id (0 standing for none).
+
+# Instead of searching for the position of a new bid, the caller passes a hint: the id of the bid
+# that must precede it (0 to insert at the head), computed off-chain. Checking the hint only takes
+# the two comparisons with the new neighbours, so insertion and eviction are both O(1). A hint made
+# stale by another operation fails with INVALID_HINT, and the caller retries with a fresh one.
+
+
+class SortedBidList:
+    def precedes(self, node_1, bid_id_1, node_2, bid_id_2):
+        # Lowest price goes first, then lowest quantity. Exact ties put the most recent bid first, so
+        # that it is the first one to be evicted.
+        return (node_1.price < node_2.price) | (
+            (node_1.price == node_2.price)
+            & ((node_1.quantity < node_2.quantity) | ((node_1.quantity == node_2.quantity) & (bid_id_1 > bid_id_2)))
+        )
+
+    def insert_after(self, hint, bid_id, price, quantity):
+        bid_list = self.data.bid_list
+        node = sp.record(price=price, quantity=quantity)
+
+        # Verify that the hint precedes the new node, and that the hint's successor follows it
+        next_id = sp.local("next_id", self.data.list_head)
+        with sp.if_(hint != 0):
+            hint_node = sp.local("hint_node", bid_list.get(hint, message=Errors.INVALID_HINT))
+            sp.verify(self.precedes(hint_node.value, hint, node, bid_id), Errors.INVALID_HINT)
+            next_id.value = hint_node.value.next
+        with sp.if_(next_id.value != 0):
+            sp.verify(self.precedes(node, bid_id, bid_list[next_id.value], next_id.value), Errors.INVALID_HINT)
+
+        bid_list[bid_id] = sp.record(price=price, quantity=quantity, prev=hint, next=next_id.value)
+
+        # Link the neighbours to the new node
+        with sp.if_(hint == 0):
+            self.data.list_head = bid_id
+        with sp.else_():
+            bid_list[hint].next = bid_id
+        with sp.if_(next_id.value == 0):
+            self.data.list_tail = bid_id
+        with sp.else_():
+            bid_list[next_id.value].prev = bid_id
+
+    def pop_head(self):
+        bid_list = self.data.bid_list
+
+        next_id = sp.local("next_id", bid_list[self.data.list_head].next)
+        del bid_list[self.data.list_head]
+
+        self.data.list_head = next_id.value
+        with sp.if_(next_id.value == 0):
+            self.data.list_tail = 0
+        with sp.else_():
+            bid_list[next_id.value].prev = 0